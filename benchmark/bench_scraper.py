@@ -0,0 +1,416 @@
+"""Offline throughput benchmark for the scraper
+
+Serves the pages in benchmark/fixtures from a local HTTP server standing in for
+pro-football-reference.com, then runs Scraper.scrape_site against it once for every
+combination of num_jobs and HTML parser. Each run happens in its own process, so the
+CPU time and peak RSS reported belong to that run alone.
+
+The fixtures are shaped like the site's pages. The player list is built per letter from
+player_list_entry.html, so every letter has players_per_letter distinct players; every
+profile request gets the same profile page, and every gamelog request the same gamelog page,
+moved to the season requested. For the boxscore crawl, every season has the same schedule of
+SCHEDULE games between TEAMS, and each boxscore lists the players of both teams who were active
+that season.
+
+Usage:
+    python benchmark/bench_scraper.py --num-jobs 1 4 16 --parsers html.parser lxml --latency 0.1
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import random
+import re
+import resource
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, 'fixtures')
+SCRAPER_PATH = os.path.join(os.path.dirname(BENCHMARK_DIR), 'scrape-nfl-stats.py')
+
+POSITIONS = ['QB', 'RB', 'WR', 'TE', 'K', 'DE', 'LB', 'CB']
+
+# Teams of the mock schedule: their code in the site's URLs, abbreviation and name
+TEAMS = [('nwe', 'NWE', 'New England Patriots'), ('kan', 'KAN', 'Kansas City Chiefs'),
+         ('nor', 'NOR', 'New Orleans Saints'), ('tam', 'TAM', 'Tampa Bay Buccaneers')]
+
+# Games of every season of the mock schedule: the week, the visiting and home teams by index in
+# TEAMS, and whether it is at a neutral site. Games after PLAYED_WEEKS have no boxscore yet.
+SCHEDULE = [(1, 1, 0, False), (1, 3, 2, False), (2, 0, 2, False), (2, 1, 3, True), (3, 2, 1, False),
+            (3, 0, 3, False)]
+PLAYED_WEEKS = 2
+
+
+def load_scraper_module():
+    """Import scrape-nfl-stats.py, which can't be imported by name because of the dashes
+
+        It is only imported once per process, since pickling the parse functions needs them to be
+        the ones registered in sys.modules.
+    """
+    if 'scrape_nfl_stats' in sys.modules:
+        return sys.modules['scrape_nfl_stats']
+    spec = importlib.util.spec_from_file_location('scrape_nfl_stats', SCRAPER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so the parse worker processes can unpickle the parse functions
+    sys.modules['scrape_nfl_stats'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def fill(template, **values):
+    """Put values into a fixture's {name} placeholders, leaving any other braces alone"""
+    for name, value in values.items():
+        template = template.replace('{' + name + '}', str(value))
+    return template
+
+
+class MockSite():
+    """Local stand-in for the site, with configurable latency, jitter and injected failures"""
+
+    def __init__(self, players_per_letter=50, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1, seed=0):
+        """
+            Args:
+                - players_per_letter (int): Number of players on each letter's player list
+                - latency (float): Seconds every response is delayed by
+                - jitter (float): Up to this many seconds are randomly added to the latency
+                - error_rate (float): Fraction of requests answered with a 500
+                - throttle_rate (float): Fraction of requests answered with a 429
+                - retry_after (int): Seconds sent in the Retry-After header of a 429
+                - seed (int): Seed for the jitter and failure injection
+
+            Returns:
+                None
+        """
+        self.players_per_letter = players_per_letter
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.fixtures = {}
+        for name in ('player_list', 'player_list_entry', 'profile', 'gamelog', 'schedule', 'schedule_game',
+                     'boxscore', 'boxscore_player'):
+            with open(os.path.join(FIXTURE_DIR, '{}.html'.format(name)), 'r') as fin:
+                self.fixtures[name] = fin.read()
+        self.server = None
+
+    def player_list_page(self, letter):
+        """Build a letter's player list with players_per_letter players"""
+        entries = []
+        for number in range(self.players_per_letter):
+            entries.append(self.fixtures['player_list_entry'].format(
+                letter=letter,
+                slug='{}Play{:02d}'.format(letter, number),
+                name='Player{} {}'.format(number, letter),
+                position=POSITIONS[number % len(POSITIONS)],
+                first_year=1950 + number % 60,
+                last_year=1955 + number % 60))
+        return self.fixtures['player_list'].replace('{letter}', letter).replace('{players}', '\n'.join(entries))
+
+    @staticmethod
+    def schedule_games(year):
+        """The games of a season of the mock schedule
+
+            Returns:
+                - games (dict[]): The game ID, week, date, teams by index in TEAMS, neutral site
+                  flag, scores, and whether it has been played, of every game in SCHEDULE
+        """
+        games = []
+        for number, (week, visitor, home, neutral) in enumerate(SCHEDULE):
+            date = datetime.date(year, 9, 7) + datetime.timedelta(weeks=week - 1)
+            games.append({
+                'game_id': '{:%Y%m%d}0{}'.format(date, TEAMS[home][0]),
+                'number': number,
+                'week': week,
+                'date': date,
+                'visitor': visitor,
+                'home': home,
+                'neutral': neutral,
+                # Visitors win every other game
+                'visitor_score': 20 + number if number % 2 else 10 + number,
+                'home_score': 14 + number,
+                'played': week <= PLAYED_WEEKS
+            })
+        return games
+
+    def game_players(self, year, game):
+        """The players of both teams in a game: every mock player active that season plays for one team
+
+            Returns:
+                - players (tuple[]): The letter, number and team index of each player
+        """
+        players = []
+        for letter in string.ascii_uppercase:
+            for number in range(self.players_per_letter):
+                team = (ord(letter) + number) % len(TEAMS)
+                if 1950 + number % 60 <= year <= 1955 + number % 60 and team in (game['visitor'], game['home']):
+                    players.append((letter, number, team))
+        return players
+
+    def schedule_page(self, year):
+        """Build a season's schedule, with a boxscore link for every game that has been played"""
+        rows = []
+        for game in self.schedule_games(year):
+            winner, loser = game['home'], game['visitor']
+            if game['visitor_score'] > game['home_score']:
+                winner, loser = loser, winner
+            rows.append(fill(
+                self.fixtures['schedule_game'], week=game['week'], date=game['date'].isoformat(), year=year,
+                winner_code=TEAMS[winner][0], winner_name=TEAMS[winner][2], loser_code=TEAMS[loser][0],
+                loser_name=TEAMS[loser][2],
+                location='N' if game['neutral'] else ('@' if winner == game['visitor'] else ''),
+                boxscore_href='/boxscores/{}.htm'.format(game['game_id']) if game['played'] else '/preview.htm',
+                boxscore_word='boxscore' if game['played'] else 'preview',
+                winner_score=max(game['visitor_score'], game['home_score']) if game['played'] else '',
+                loser_score=min(game['visitor_score'], game['home_score']) if game['played'] else ''))
+        return fill(self.fixtures['schedule'], year=year, games='\n'.join(rows))
+
+    def boxscore_page(self, game_id):
+        """Build the boxscore of a game of the mock schedule, or None if there is no such game"""
+        year = int(game_id[:4])
+        games = [game for game in self.schedule_games(year) if game['game_id'] == game_id and game['played']]
+        if not games:
+            return None
+        game = games[0]
+        rows = []
+        for letter, number, team in self.game_players(year, game):
+            rows.append(fill(
+                self.fixtures['boxscore_player'], letter=letter, slug='{}Play{:02d}'.format(letter, number),
+                name='Player{} {}'.format(number, letter), team=TEAMS[team][1], rushing_attempts=5 + number,
+                rushing_yards=10 * game['week'] + number, rushing_touchdowns=number % 2,
+                receiving_yards=15 + game['week']))
+        values = {'year': year, 'date': game['date'].isoformat(), 'players': '\n'.join(rows)}
+        for side in ('visitor', 'home'):
+            team = TEAMS[game[side]]
+            values.update({
+                side + '_code': team[0],
+                side + '_abbreviation': team[1],
+                side + '_name': team[2],
+                side + '_score': game[side + '_score'],
+                side + '_first_downs': 18 + game['number'],
+                side + '_passing': '{}-{}-{}-1-0'.format(20 + game['number'], 30 + game['number'], 200 + game['number']),
+                side + '_total_yards': 300 + game['number'],
+            })
+        # The first game's visitors lost yards rushing
+        values['visitor_rushing'] = '18--3-0' if game['number'] == 0 else '{}-{}-0'.format(18 + game['number'],
+                                                                                           50 + game['number'])
+        values['home_rushing'] = '{}-{}-1'.format(25 + game['number'], 100 + game['number'])
+        values['visitor_possession'] = '28:36'
+        values['home_possession'] = '31:24'
+        return fill(self.fixtures['boxscore'], **values)
+
+    def page_for(self, path):
+        """Pick the fixture for a request path, or None if the site has no such page"""
+        gamelog_match = re.search(r'/gamelog/(\d{4})', path)
+        if gamelog_match is not None:
+            # The fixture is a 2017 gamelog, moved to the season asked for so every season has its own games
+            return self.fixtures['gamelog'].replace('2017', gamelog_match.group(1))
+        if '/gamelog/' in path:
+            return self.fixtures['gamelog']
+        boxscore_match = re.match(r'^/boxscores/(\d{8}0[a-z]{3})\.htm$', path)
+        if boxscore_match is not None:
+            return self.boxscore_page(boxscore_match.group(1))
+        schedule_match = re.match(r'^/years/(\d{4})/games\.htm$', path)
+        if schedule_match is not None:
+            return self.schedule_page(int(schedule_match.group(1)))
+        if re.match(r'^/players/[A-Z]/[^/]+\.htm$', path):
+            return self.fixtures['profile']
+        list_match = re.match(r'^/players/([A-Z])/?$', path)
+        if list_match is not None:
+            return self.player_list_page(list_match.group(1))
+        return None
+
+    def draw(self):
+        """Draw the delay and the injected status for one request"""
+        with self.random_lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+        if roll < self.error_rate:
+            return delay, 500
+        if roll < self.error_rate + self.throttle_rate:
+            return delay, 429
+        return delay, 200
+
+    def start(self):
+        """Serve the site from a background thread on a free local port
+
+            Returns:
+                - site_url (str): Root URL of the running site
+        """
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                delay, status = site.draw()
+                time.sleep(delay)
+                page = site.page_for(self.path) if status == 200 else None
+                if status == 200 and page is None:
+                    status = 404
+                body = (page or 'error {}'.format(status)).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if status == 429:
+                    self.send_header('Retry-After', str(site.retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def stop(self):
+        """Shut the site down"""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_once(site_url, letters, num_jobs, parse_jobs, html_parser, retry_backoff, adaptive=False):
+    """Scrape the mock site once in a scratch directory and measure it
+
+        Only seasons that were really scraped count towards the rows, and requests that
+        failed, players that failed and a scrape that crashed are all reported as such.
+
+        Returns:
+            - result (dict): Throughput, CPU, memory and error figures for the run
+    """
+    scraper_module = load_scraper_module()
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        os.chdir(scratch_dir)
+        try:
+            scraper = scraper_module.Scraper(letters_to_scrape=letters, num_jobs=num_jobs, parse_jobs=parse_jobs,
+                                             site_url=site_url, html_parser=html_parser, metrics_path=None,
+                                             metrics_interval=3600, retry_backoff=retry_backoff,
+                                             adaptive_concurrency=adaptive)
+            usage_start = resource.getrusage(resource.RUSAGE_SELF)
+            start = time.time()
+            crash = None
+            try:
+                scraper.scrape_site()
+            except Exception as e:
+                crash = repr(e)
+            elapsed = time.time() - start
+            player_statuses = dict(scraper.work_queue.connect().execute(
+                'SELECT status, COUNT(*) FROM players GROUP BY status').fetchall())
+            usage_end = resource.getrusage(resource.RUSAGE_SELF)
+            usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        finally:
+            os.chdir(working_dir)
+
+    metrics = scraper.metrics.snapshot()
+    pages = sum(fetch['count'] for fetch in metrics['fetches'].values())
+    fetch_errors = sum(error['count'] for error in metrics['errors'] if error['stage'] == 'fetch')
+    rows = sum(parse['rows'] for page_type, parse in metrics['parses'].items() if page_type == 'gamelog')
+    cpu_seconds = (usage_end.ru_utime - usage_start.ru_utime + usage_end.ru_stime - usage_start.ru_stime
+                   + usage_children.ru_utime + usage_children.ru_stime)
+    return {
+        'num_jobs': num_jobs,
+        'parse_jobs': parse_jobs,
+        'html_parser': html_parser,
+        'seconds': elapsed,
+        'pages': pages,
+        'rows': rows,
+        'pages_per_second': pages / elapsed,
+        'rows_per_second': rows / elapsed,
+        'cpu_ms_per_page': 1000 * cpu_seconds / max(pages, 1),
+        'peak_rss_mb': max(usage_end.ru_maxrss, usage_children.ru_maxrss) / 1024,
+        'fetch_errors': fetch_errors,
+        'retries': sum(fetch['retries'] for fetch in metrics['fetches'].values()),
+        'players_done': player_statuses.get('done', 0),
+        'players_failed': player_statuses.get('failed', 0),
+        'concurrency_limit': metrics['concurrency']['limit'],
+        'crash': crash
+    }
+
+
+def parser_available(html_parser):
+    """Check whether BeautifulSoup can use a parser in this environment"""
+    from bs4 import BeautifulSoup, FeatureNotFound
+    try:
+        BeautifulSoup('<p></p>', html_parser)
+    except FeatureNotFound:
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-jobs', type=int, nargs='+', default=[1, 4, 16], help='num_jobs values to try')
+    parser.add_argument('--parse-jobs', type=int, default=0, help='Parse worker processes for every run')
+    parser.add_argument('--parsers', nargs='+', default=['html.parser', 'lxml'], help='BeautifulSoup parsers to try')
+    parser.add_argument('--letters', default='ABC', help='Letters of the player list to scrape')
+    parser.add_argument('--players-per-letter', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Up to this many seconds of random extra latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of responses that are 500s')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of responses that are 429s')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with every 429')
+    parser.add_argument('--retry-backoff', type=float, default=0.1, help='Scraper backoff before its first retry')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Tune the requests in flight up to each num_jobs, instead of always using all of them')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        # A single measured run, started by the parent below
+        run_args = json.loads(args.run)
+        print(json.dumps(run_once(**run_args)))
+        sys.exit(0)
+
+    site = MockSite(players_per_letter=args.players_per_letter, latency=args.latency, jitter=args.jitter,
+                    error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    site_url = site.start()
+    results = []
+    try:
+        for html_parser in args.parsers:
+            if not parser_available(html_parser):
+                print('Skipping {}, it is not installed'.format(html_parser))
+                continue
+            for num_jobs in args.num_jobs:
+                run_args = {
+                    'site_url': site_url,
+                    'letters': [letter for letter in args.letters.upper() if letter in string.ascii_uppercase],
+                    'num_jobs': num_jobs,
+                    'parse_jobs': args.parse_jobs,
+                    'html_parser': html_parser,
+                    'retry_backoff': args.retry_backoff,
+                    'adaptive': args.adaptive
+                }
+                output = subprocess.run([sys.executable, __file__, '--run', json.dumps(run_args)],
+                                        stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        site.stop()
+
+    print('{:<12} {:>8} {:>10} {:>9} {:>10} {:>12} {:>12} {:>12} {:>8} {:>8} {:>7}'.format(
+        'parser', 'num_jobs', 'parse_jobs', 'pages/s', 'rows/s', 'cpu ms/page', 'peak RSS MB', 'fetch errors',
+        'retries', 'done', 'failed'))
+    for result in results:
+        print('{html_parser:<12} {num_jobs:>8} {parse_jobs:>10} {pages_per_second:>9.1f} {rows_per_second:>10.1f} '
+              '{cpu_ms_per_page:>12.2f} {peak_rss_mb:>12.1f} {fetch_errors:>12} {retries:>8} {players_done:>8} '
+              '{players_failed:>7}'.format(**result))
+        if result['concurrency_limit'] is not None:
+            print('  ended with a concurrency limit of {}'.format(result['concurrency_limit']))
+        if result['crash'] is not None:
+            print('  the scrape crashed: {}'.format(result['crash']))
+    if args.output is not None:
+        with open(args.output, 'w') as fout:
+            json.dump(results, fout, indent=2)
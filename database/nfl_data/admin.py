@@ -1,3 +1,120 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .models import Game, Profile
+
+# Tables with fewer rows than this are still counted exactly
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+def prefix_range(prefix):
+    """The range of strings that start with prefix, as (lowest, first string past the range)
+
+        A LIKE 'prefix%' can't use a plain index on SQLite, where LIKE is case-insensitive, or on
+        PostgreSQL outside the C locale, but a range can, on every backend. The range is
+        case-sensitive, and ends at the prefix with its last character incremented.
+
+        Args:
+            - prefix (str): A non-empty prefix
+
+        Returns:
+            - bounds (tuple): The lower bound, included, and the upper bound, excluded
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def estimate_row_count(model):
+    """Number of rows in a model's table according to the database's statistics, without counting them
+
+        Args:
+            - model (Model): The model whose table to look up
+
+        Returns:
+            - row_count (int): The estimate, or None if the database has no statistics for the table
+    """
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        query = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'mysql':
+        query = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s'
+    elif connection.vendor == 'sqlite':
+        # Only there once ANALYZE has been run. The row count is the first number of every stat.
+        query = 'SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the row count of an unfiltered, large table from the database's statistics
+
+    A COUNT(*) over every game takes seconds and runs on every changelist page. Filtered
+    changelists are still counted exactly, since the filters narrow the count down to an index.
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimate_row_count(self.object_list.model)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class SeasonListFilter(admin.SimpleListFilter):
+    """Filter games by season, listing the seasons from the year index instead of with SELECT DISTINCT"""
+    title = 'season'
+    parameter_name = 'year'
+
+    def lookups(self, request, model_admin):
+        years = Game.objects.aggregate(first=Min('year'), last=Max('year'))
+        if years['first'] is None:
+            return []
+        return [(year, year) for year in range(years['last'], years['first'] - 1, -1)]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(year=self.value())
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ('player_id', 'name', 'position', 'current_team', 'draft_year')
+    search_fields = ('^name',)
+    ordering = ('player_id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # One match anchored at the start of the name for the whole term, instead of one per word,
+        # so that searching 'Tom Brady' works. It is a range, so it is a seek on the name index.
+        if not search_term:
+            return queryset, False
+        lowest, past_last = prefix_range(search_term)
+        return queryset.filter(name__gte=lowest, name__lt=past_last), False
+
+
+@admin.register(Game)
+class GameAdmin(admin.ModelAdmin):
+    list_display = ('game_id', 'date', 'player_id', 'team', 'opponent', 'game_location', 'game_won',
+                    'player_team_score', 'opponent_score')
+    list_filter = (SeasonListFilter,)
+    list_select_related = ('player_id',)
+    autocomplete_fields = ('player_id',)
+    search_fields = ('=game_id',)
+    # Backed by nfl_data_game_date_idx, and by nfl_data_game_year_date_idx within a season
+    ordering = ('-date', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
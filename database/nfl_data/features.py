@@ -0,0 +1,174 @@
+"""Model features derived from the game stats, kept in PlayerGameFeatures and OpponentPositionFeatures
+
+Every player's games get their fantasy points and the player's rolling averages over the 3, 5
+and 10 games before them. Every team gets the fantasy points its defense allowed to each
+position in each game, with the same rolling averages. Features are computed with pandas, a
+batch of players or a team at a time.
+
+A player's rolling averages only depend on their own games, and what a defense allowed only on
+the games of the players who faced it, so update_features only recomputes the players given to
+it, and the teams and positions they played against from the first date that changed.
+
+Usage:
+    from nfl_data import features
+    features.update_features([player_id, ...])
+"""
+import collections
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Sum
+
+from .models import Game, OpponentPositionFeatures, PlayerGameFeatures, Profile
+
+ROLLING_WINDOWS = (3, 5, 10)
+ROLLING_STATS = ('fantasy_points', 'passing_yards', 'rushing_yards', 'receiving_yards', 'receiving_targets')
+
+# Standard scoring, without receptions. Override it with the NFL_DATA_FANTASY_POINTS setting,
+# i.e. to add {'receiving_receptions': 1} for PPR, then rebuild the features.
+FANTASY_POINTS = dict({
+    'passing_yards': 0.04,
+    'passing_touchdowns': 4,
+    'passing_interceptions': -2,
+    'rushing_yards': 0.1,
+    'rushing_touchdowns': 6,
+    'receiving_yards': 0.1,
+    'receiving_touchdowns': 6,
+    'kick_return_touchdowns': 6,
+    'punt_return_touchdowns': 6
+}, **getattr(settings, 'NFL_DATA_FANTASY_POINTS', {}))
+
+# Number of players whose games are loaded and computed at once
+PLAYER_BATCH_SIZE = 1000
+
+
+def update_features(player_ids=None, batch_size=PLAYER_BATCH_SIZE):
+    """Recompute the features of some players, and of the defenses they played against
+
+        Call it after loading changes to those players' games or profiles. The features of
+        players whose games were all removed are removed too.
+
+        Args:
+            - player_ids (int[]): The players whose games changed. None to rebuild every feature.
+            - batch_size (int): Number of players computed at once
+
+        Returns:
+            - counts (dict): Number of player games and defense games whose features were written
+    """
+    counts = {'player_games': 0, 'defense_games': 0}
+    with transaction.atomic():
+        if player_ids is None:
+            PlayerGameFeatures.objects.all().delete()
+            OpponentPositionFeatures.objects.all().delete()
+            player_ids = list(Profile.objects.values_list('player_id', flat=True))
+        player_ids = sorted(set(player_ids))
+        # First date that changed for each team and position, from the old features and the new
+        changed_defenses = {}
+        for start in range(0, len(player_ids), batch_size):
+            batch = player_ids[start:start + batch_size]
+            add_changed_defenses(changed_defenses, PlayerGameFeatures.objects.filter(player_id__in=batch))
+            PlayerGameFeatures.objects.filter(player_id__in=batch).delete()
+            player_features = compute_player_features(batch)
+            PlayerGameFeatures.objects.bulk_create([PlayerGameFeatures(**row) for row in to_records(player_features)])
+            add_changed_defenses(changed_defenses, PlayerGameFeatures.objects.filter(player_id__in=batch))
+            counts['player_games'] += len(player_features)
+
+        teams = collections.defaultdict(dict)
+        for (team, position), first_date in changed_defenses.items():
+            teams[team][position] = first_date
+        for team, first_dates in teams.items():
+            counts['defense_games'] += update_defense_features(team, first_dates)
+    return counts
+
+
+def add_changed_defenses(changed_defenses, player_features):
+    """Record the first date of the player features for each opponent and position they played"""
+    for opponent, position, first_date in player_features.exclude(position=None).values_list(
+            'opponent', 'position').annotate(first_date=Min('date')).order_by():
+        key = (opponent, position)
+        if key not in changed_defenses or first_date < changed_defenses[key]:
+            changed_defenses[key] = first_date
+
+
+def compute_player_features(player_ids):
+    """Compute the features of every game of some players
+
+        Returns:
+            - features (DataFrame): One row per game, with the columns of PlayerGameFeatures
+    """
+    import pandas
+    stats = list(FANTASY_POINTS) + [stat for stat in ROLLING_STATS if stat != 'fantasy_points']
+    games = pandas.DataFrame.from_records(
+        list(Game.objects.filter(player_id__in=player_ids).order_by('player_id', 'date')
+             .values_list('player_id', 'game_id', 'date', 'year', 'team', 'opponent', 'player_id__position',
+                          *sorted(set(stats)))),
+        columns=['player_id', 'game_id', 'date', 'year', 'team', 'opponent', 'position'] + sorted(set(stats)))
+    games['fantasy_points'] = fantasy_points(games)
+    features = games[['player_id', 'game_id', 'date', 'year', 'team', 'opponent', 'position', 'fantasy_points']]
+    return pandas.concat([features, rolling_averages(games, 'player_id', ROLLING_STATS)], axis=1)
+
+
+def update_defense_features(team, first_dates):
+    """Recompute what a team's defense allowed to some positions, from the first date that changed
+
+        The averages need the games before that date, so the team's whole history of each
+        position is computed, but only the rows from that date on are written.
+
+        Args:
+            - team (str): The team's code
+            - first_dates (dict): First date that changed for each position
+
+        Returns:
+            - num_rows (int): Number of rows written
+    """
+    import pandas
+    allowed = pandas.DataFrame.from_records(
+        list(PlayerGameFeatures.objects.filter(opponent=team, position__in=list(first_dates))
+             .values('position', 'game_id', 'date', 'year').annotate(points_allowed=Sum('fantasy_points'))
+             .order_by('position', 'date', 'game_id')),
+        columns=['position', 'game_id', 'date', 'year', 'points_allowed'])
+    allowed = pandas.concat([allowed, rolling_averages(allowed, 'position', ['points_allowed'])], axis=1)
+    allowed['team'] = team
+    allowed = allowed[allowed['date'] >= allowed['position'].map(first_dates)]
+    for position, first_date in first_dates.items():
+        OpponentPositionFeatures.objects.filter(team=team, position=position, date__gte=first_date).delete()
+    OpponentPositionFeatures.objects.bulk_create([OpponentPositionFeatures(**row) for row in to_records(allowed)])
+    return len(allowed)
+
+
+def fantasy_points(games):
+    """Fantasy points of every game in a DataFrame of game stats, scored by FANTASY_POINTS"""
+    import pandas
+    points = pandas.Series(0.0, index=games.index)
+    for stat, weight in FANTASY_POINTS.items():
+        points += games[stat].astype(float) * weight
+    return points.round(2)
+
+
+def rolling_averages(frame, group_column, stats):
+    """Average every stat over the previous 3, 5 and 10 rows of the same group
+
+        The frame must be sorted by group and then date. The first row of a group has no
+        average, and the next ones average the rows there are. Averages are rounded, so that
+        an incremental update comes out the same as a rebuild despite pandas' rolling sums.
+
+        Returns:
+            - averages (DataFrame): A <stat>_avg_<window> column for every stat and window
+    """
+    import pandas
+    stats = list(stats)
+    previous = frame.groupby(group_column, sort=False)[stats].shift(1)
+    previous[group_column] = frame[group_column]
+    averages = pandas.DataFrame(index=frame.index)
+    for window in ROLLING_WINDOWS:
+        rolled = previous.groupby(group_column, sort=False)[stats].rolling(window, min_periods=1).mean()
+        rolled = rolled.reset_index(level=0, drop=True)
+        for stat in stats:
+            averages['{}_avg_{}'.format(stat, window)] = rolled[stat].round(4)
+    return averages
+
+
+def to_records(frame):
+    """Turn the rows of a DataFrame into dicts for model instances, with None for missing values"""
+    frame = frame.astype(object).where(frame.notnull(), None)
+    return frame.to_dict('records')
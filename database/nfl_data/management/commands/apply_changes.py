@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from nfl_data.features import update_features
+from nfl_data.models import DataVersion, Game, Profile
+
+
+class Command(BaseCommand):
+    help = ('Apply the changes_<timestamp>.ndjson manifests written by the scraper\'s condense step, '
+            'instead of reloading every profile and game')
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifests', nargs='+', help='Manifests to apply, oldest first')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of changes applied at a time')
+        parser.add_argument('--features', action='store_true',
+                            help='Also update the features of the changed players, see update_features')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.changed_players = set()
+        # All of it or none of it, so readers never see a half-applied scrape
+        with transaction.atomic():
+            for manifest in options['manifests']:
+                counts = self.apply_manifest(manifest)
+                self.stdout.write('{}: {} profiles and {} games written, {} games removed'.format(
+                    manifest, counts['profile'], counts['game'], counts['removed']))
+            if options['features']:
+                counts = update_features(self.changed_players)
+                self.stdout.write('Features of {} player games and {} defense games written'.format(
+                    counts['player_games'], counts['defense_games']))
+            DataVersion.bump()
+
+    def apply_manifest(self, manifest):
+        """Apply a manifest in batches. Profiles come before games in a manifest, so they exist first."""
+        counts = {'profile': 0, 'game': 0, 'removed': 0}
+        batch = []
+        with open(manifest, 'r') as fin:
+            for line in fin:
+                change = json.loads(line)
+                if batch and change['type'] != batch[0]['type']:
+                    self.apply_batch(batch, counts)
+                    batch = []
+                batch.append(change)
+                if len(batch) >= self.batch_size:
+                    self.apply_batch(batch, counts)
+                    batch = []
+        if batch:
+            self.apply_batch(batch, counts)
+        return counts
+
+    def apply_batch(self, batch, counts):
+        """Apply changes that are all to profiles, or all to games"""
+        self.changed_players.update(change['record']['player_id'] for change in batch)
+        if batch[0]['type'] == 'profile':
+            profiles = {change['record']['player_id']: change['record'] for change in batch}
+            existing = set(Profile.objects.filter(player_id__in=list(profiles)).values_list('player_id', flat=True))
+            for player_id in existing:
+                Profile.objects.filter(player_id=player_id).update(**profiles[player_id])
+            # Without a batch size, Django splits the inserts into the most rows the database takes
+            Profile.objects.bulk_create([Profile(**profile) for player_id, profile in profiles.items()
+                                         if player_id not in existing])
+            counts['profile'] += len(profiles)
+            return
+
+        # Games are replaced by deleting the old row, grouped by player to keep the queries small
+        games_by_player = {}
+        for change in batch:
+            games_by_player.setdefault(change['record']['player_id'], []).append(change['record']['game_id'])
+        for player_id, game_ids in games_by_player.items():
+            Game.objects.filter(player_id=player_id, game_id__in=game_ids).delete()
+        new_games = []
+        for change in batch:
+            if change['change'] == 'removed':
+                counts['removed'] += 1
+                continue
+            record = dict(change['record'])
+            record['player_id_id'] = record.pop('player_id')
+            new_games.append(Game(**record))
+        Game.objects.bulk_create(new_games)
+        counts['game'] += len(new_games)
@@ -0,0 +1,107 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Max, Min, Sum
+
+from nfl_data.admin import prefix_range
+from nfl_data.models import Game, Profile
+
+
+class Command(BaseCommand):
+    help = ('Time the ORM lookups and aggregate queries the site and feature code make, and show their query '
+            'plans. Load data first, i.e. with generate_synthetic_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Times every query is run')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for picking the players, season and team')
+        parser.add_argument('--no-plans', action='store_true', help='Only report the timings')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        player_ids = Profile.objects.aggregate(first=Min('player_id'), last=Max('player_id'))
+        if player_ids['first'] is None:
+            raise CommandError('There is no data to query')
+        rng = random.Random(options['seed'])
+        # A player who has games, found through the player index instead of by sorting at random
+        game = Game.objects.filter(player_id__gte=rng.randint(player_ids['first'], player_ids['last'])) \
+            .order_by('player_id', 'date').first() or Game.objects.order_by('player_id', 'date').first()
+        if game is None:
+            raise CommandError('There is no data to query')
+
+        results = []
+        for category, name, queryset in self.get_queries(game):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.time()
+                num_rows = len(list(queryset.all()))
+                timings.append(time.time() - start)
+            result = {
+                'category': category,
+                'query': name,
+                'rows': num_rows,
+                'min_ms': 1000 * min(timings),
+                'median_ms': 1000 * statistics.median(timings),
+                'plan': None if options['no_plans'] else self.explain(queryset)
+            }
+            results.append(result)
+            self.stdout.write('{category:<10} {query:<32} {rows:>7} rows {min_ms:>10.2f} ms min '
+                              '{median_ms:>10.2f} ms median'.format(**result))
+            for line in result['plan'] or []:
+                self.stdout.write('    {}'.format(line))
+
+        if options['output'] is not None:
+            with open(options['output'], 'w') as fout:
+                json.dump(results, fout, indent=2)
+
+    @staticmethod
+    def get_queries(game):
+        """The queries to time, looking up the player, season and team of game
+
+            Returns:
+                - queries (tuple[]): The category, name and queryset of each query
+        """
+        player_id, year, team = game.player_id_id, game.year, game.team
+        name_prefix = Profile.objects.filter(player_id=player_id).values_list('name', flat=True).first()[:8]
+        return [
+            ('lookup', 'player profile', Profile.objects.filter(player_id=player_id)),
+            ('lookup', 'player last 10 games', Game.objects.filter(player_id=player_id).order_by('-date')[:10]),
+            ('lookup', 'player season', Game.objects.filter(player_id=player_id, year=year).order_by('date')),
+            ('lookup', 'team season', Game.objects.filter(year=year, team=team).order_by('date', 'player_id')),
+            ('lookup', 'game lines', Game.objects.filter(game_id=game.game_id)),
+            ('lookup', 'name search',
+             Profile.objects.filter(name__gte=name_prefix, name__lt=prefix_range(name_prefix)[1])[:100]),
+            ('admin', 'game changelist page', Game.objects.select_related('player_id').order_by('-date', '-id')[:100]),
+            ('admin', 'season changelist page',
+             Game.objects.filter(year=year).select_related('player_id').order_by('-date', '-id')[:100]),
+            ('aggregate', 'season passing leaders',
+             Game.objects.filter(year=year).values('player_id').annotate(yards=Sum('passing_yards'))
+             .order_by('-yards')[:10]),
+            ('aggregate', 'team season totals',
+             Game.objects.filter(year=year).values('team').annotate(
+                 passing_yards=Sum('passing_yards'), rushing_yards=Sum('rushing_yards')).order_by('team')),
+            ('aggregate', 'season yards by position',
+             Game.objects.filter(year=year).values('player_id__position').annotate(
+                 receiving_yards=Sum('receiving_yards')).order_by('player_id__position')),
+            ('aggregate', 'games per season', Game.objects.values('year').annotate(games=Count('id')).order_by('year')),
+        ]
+
+    @staticmethod
+    def explain(queryset):
+        """Get the database's plan for a queryset, one line per step"""
+        sql, params = queryset.query.sql_with_params()
+        if connection.vendor == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        elif connection.vendor in ('postgresql', 'mysql'):
+            prefix = 'EXPLAIN '
+        else:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+        if connection.vendor == 'sqlite':
+            return [row[-1] for row in rows]
+        return [' | '.join(str(column) for column in row) for row in rows]
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from nfl_data.models import DataVersion
+
+
+class Command(BaseCommand):
+    help = 'Mark the data as changed, i.e. after loaddata, so cached query results are dropped'
+
+    def handle(self, *args, **options):
+        DataVersion.bump()
+        self.stdout.write('Data version is now {}'.format(DataVersion.current()))
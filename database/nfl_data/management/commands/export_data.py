@@ -0,0 +1,67 @@
+import datetime
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nfl_data.models import DataVersion, Game, Profile
+from nfl_data.partitions import FORMATS, MANIFEST_FILE, export_fields, open_writer
+
+
+class Command(BaseCommand):
+    help = ('Export every profile, and every game a file per season, as NDJSON or Parquet, streaming rows from '
+            'the database a chunk at a time. import_data loads the export back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to write the export to')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson',
+                            help='ndjson, or parquet, which needs pyarrow')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of rows fetched from the database at once')
+        parser.add_argument('--min-year', type=int, default=None, help='Only export seasons from this year on')
+        parser.add_argument('--max-year', type=int, default=None, help='Only export seasons up to this year')
+
+    def handle(self, *args, **options):
+        directory, data_format, chunk_size = options['directory'], options['format'], options['chunk_size']
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+            raise CommandError('{} already has an export'.format(directory))
+        years = Game.objects.values_list('year', flat=True).distinct().order_by('year')
+        if options['min_year'] is not None:
+            years = years.filter(year__gte=options['min_year'])
+        if options['max_year'] is not None:
+            years = years.filter(year__lte=options['max_year'])
+
+        manifest = {
+            'format': data_format,
+            'data_version': DataVersion.current(),
+            'exported_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'profiles': self.export(Profile.objects.order_by('player_id'), Profile, directory,
+                                    'profiles', data_format, chunk_size),
+            'games': []
+        }
+        for year in list(years):
+            partition = self.export(Game.objects.filter(year=year).order_by('player_id', 'date'), Game, directory,
+                                    'games_{}'.format(year), data_format, chunk_size)
+            partition['year'] = year
+            manifest['games'].append(partition)
+        # The manifest goes last, so an export cut short is never mistaken for a whole one
+        with open(os.path.join(directory, MANIFEST_FILE), 'w') as fout:
+            json.dump(manifest, fout, indent=2)
+
+    def export(self, queryset, model, directory, name, data_format, chunk_size):
+        """Stream a queryset to a file through a server-side cursor where the database has them
+
+            Returns:
+                - partition (dict): The file's name and number of rows
+        """
+        start = time.time()
+        fields = export_fields(model)
+        rows = queryset.values_list(*[field.name for field in fields]).iterator(chunk_size=chunk_size)
+        filename = '{}.{}'.format(name, data_format)
+        with open_writer(os.path.join(directory, filename), data_format, fields, chunk_size) as writer:
+            for row in rows:
+                writer.write(row)
+        self.stdout.write('Exported {} rows to {} in {:.2f}s'.format(writer.num_rows, filename, time.time() - start))
+        return {'file': filename, 'rows': writer.num_rows}
@@ -0,0 +1,104 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from nfl_data.models import DataVersion, Game, Profile
+from nfl_data.synthetic import generate_games, generate_profiles
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with synthetic profiles and games at full scale, and time the bulk load, '
+            'so indexes and loaders can be measured without a full crawl')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=25000, help='Number of players')
+        parser.add_argument('--games', type=int, default=1000000, help='Approximate number of games')
+        parser.add_argument('--seed', type=int, default=0, help='Seed, the same seed always generates the same data')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help=('Number of rows passed to each bulk_create call. Django splits a call into as '
+                                  'many INSERT queries as the database\'s parameter limit needs.'))
+        parser.add_argument('--replace', action='store_true', help='Delete every profile and game first')
+        parser.add_argument('--ndjson', metavar='DIR',
+                            help=('Write profiles.ndjson and games.ndjson, as NdjsonSink does, to this directory '
+                                  'instead of loading the database'))
+
+    def handle(self, *args, **options):
+        profiles = list(generate_profiles(options['players'], options['seed']))
+        games = generate_games(profiles, options['games'], options['seed'])
+        if options['ndjson'] is not None:
+            self.write_ndjson(options['ndjson'], profiles, games)
+            return
+
+        if Profile.objects.exists() and not options['replace']:
+            raise CommandError('The database already has profiles, use --replace to delete them first')
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            if options['replace']:
+                self.timed('Deleted the old data', self.delete_all)
+            self.timed('Loaded {} profiles'.format(len(profiles)),
+                       lambda: self.load(Profile, (Profile(**profile) for profile in profiles)))
+            num_games = self.timed('Loaded {} games', lambda: self.load(Game, (self.make_game(game) for game in games)))
+            DataVersion.bump()
+        self.timed('Analyzed the tables', self.analyze)
+        self.stdout.write('{} games per player'.format(round(num_games / max(len(profiles), 1), 1)))
+
+    def timed(self, message, func):
+        """Run func and report how long it took, formatting the number of rows it returns into message"""
+        start = time.time()
+        result = func()
+        seconds = time.time() - start
+        if isinstance(result, int):
+            message = '{} ({} rows/s)'.format(message.format(result), int(result / max(seconds, 1e-6)))
+        self.stdout.write('{} in {:.2f}s'.format(message, seconds))
+        return result
+
+    def load(self, model, instances):
+        """Bulk create instances a batch at a time, returning the number of rows"""
+        num_rows = 0
+        batch = []
+        for instance in instances:
+            batch.append(instance)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                num_rows += len(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        return num_rows + len(batch)
+
+    @staticmethod
+    def delete_all():
+        Game.objects.all().delete()
+        Profile.objects.all().delete()
+
+    @staticmethod
+    def make_game(game):
+        game = dict(game)
+        game['player_id_id'] = game.pop('player_id')
+        return Game(**game)
+
+    @staticmethod
+    def analyze():
+        """Refresh the planner's statistics, which the estimated admin counts use too"""
+        with connection.cursor() as cursor:
+            for model in (Profile, Game):
+                if connection.vendor == 'sqlite':
+                    cursor.execute('ANALYZE {}'.format(model._meta.db_table))
+                elif connection.vendor == 'postgresql':
+                    cursor.execute('ANALYZE {}'.format(connection.ops.quote_name(model._meta.db_table)))
+                elif connection.vendor == 'mysql':
+                    cursor.execute('ANALYZE TABLE {}'.format(connection.ops.quote_name(model._meta.db_table)))
+
+    def write_ndjson(self, directory, profiles, games):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'profiles.ndjson'), 'w') as fout:
+            for profile in profiles:
+                fout.write(json.dumps(profile) + '\n')
+        num_games = 0
+        with open(os.path.join(directory, 'games.ndjson'), 'w') as fout:
+            for game in games:
+                fout.write(json.dumps(game) + '\n')
+                num_games += 1
+        self.stdout.write('Wrote {} profiles and {} games to {}'.format(len(profiles), num_games, directory))
@@ -0,0 +1,120 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from nfl_data.features import update_features
+from nfl_data.models import DataVersion, Game, Profile
+from nfl_data.partitions import (MANIFEST_FILE, create_staging_table, drop_staging_table, export_fields,
+                                 insert_staging_rows, load_staging_table, staging_table)
+
+
+class Command(BaseCommand):
+    help = ('Import an export written by export_data. Every file is loaded into a staging table by parallel '
+            'worker processes, and the staged rows are then copied over the exported profiles and seasons in one '
+            'transaction, which blocks other writers to the profiles and games until it commits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory of the export')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of worker processes, or 1 to load the files in this process')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Number of rows inserted per query')
+        parser.add_argument('--years', type=int, nargs='+', default=None, help='Only import these seasons')
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete every profile and game that is not in the import, not just the seasons in it')
+        parser.add_argument('--features', action='store_true',
+                            help='Also rebuild the features once the import is copied in, see update_features')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE), 'r') as fin:
+                manifest = json.load(fin)
+        except FileNotFoundError:
+            raise CommandError('{} has no {}, or the export did not finish'.format(directory, MANIFEST_FILE))
+        partitions = manifest['games']
+        if options['years'] is not None:
+            partitions = [partition for partition in partitions if partition['year'] in options['years']]
+            if options['replace']:
+                raise CommandError('--replace would delete the seasons left out by --years')
+
+        # Staging tables are all created up front, so the workers only insert rows
+        loads = [(Profile, staging_table(Profile, 'import'), manifest['profiles'])]
+        loads += [(Game, staging_table(Game, partition['year']), partition) for partition in partitions]
+        for model, table, partition in loads:
+            create_staging_table(model, table)
+        try:
+            start = time.time()
+            self.load(loads, directory, manifest['format'], options['workers'], options['batch_size'])
+            self.stdout.write('Loaded the staging tables in {:.2f}s'.format(time.time() - start))
+            start = time.time()
+            with transaction.atomic():
+                self.copy_in(loads, options['replace'])
+                DataVersion.bump()
+            self.stdout.write('Copied them in in {:.2f}s'.format(time.time() - start))
+        finally:
+            for model, table, partition in loads:
+                drop_staging_table(table)
+        if options['features']:
+            # In a transaction of its own, so the copy's locks are not held while it runs
+            counts = update_features()
+            self.stdout.write('Features of {} player games and {} defense games written'.format(
+                counts['player_games'], counts['defense_games']))
+
+    def load(self, loads, directory, data_format, num_workers, batch_size):
+        """Load every file into its staging table, biggest first, a file per worker at a time"""
+        loads = sorted(loads, key=lambda load: -load[2]['rows'])
+        if num_workers <= 1:
+            for model, table, partition in loads:
+                self.check_staged(partition, insert_staging_rows(
+                    model._meta.label, table, os.path.join(directory, partition['file']), data_format, batch_size))
+            return
+        # Forked workers must open connections of their own
+        connections.close_all()
+        with ProcessPoolExecutor(max(num_workers, 1), initializer=django.setup) as pool:
+            futures = {}
+            for model, table, partition in loads:
+                future = pool.submit(load_staging_table, model._meta.label, table,
+                                     os.path.join(directory, partition['file']), data_format, batch_size)
+                futures[future] = partition
+            for future in as_completed(futures):
+                self.check_staged(futures[future], future.result())
+
+    def check_staged(self, partition, num_rows):
+        if num_rows != partition['rows']:
+            raise CommandError('{} has {} rows, but the manifest says {}'.format(
+                partition['file'], num_rows, partition['rows']))
+        self.stdout.write('Staged {} rows from {}'.format(num_rows, partition['file']))
+
+    @staticmethod
+    def copy_in(loads, replace):
+        """Replace the live rows with the staged ones. Run it inside a transaction.
+
+            This is a copy, not a swap of tables: the live rows are deleted and the staged ones
+            inserted with INSERT ... SELECT, so it takes as long as writing every imported row.
+            Until the transaction commits, other writers to the profiles and games wait on it. On
+            PostgreSQL readers keep seeing the old rows meanwhile. On SQLite they only do in WAL
+            mode, and otherwise are blocked while it commits, or sooner if it spills to the file.
+        """
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if replace:
+                cursor.execute('DELETE FROM {}'.format(quote_name(Game._meta.db_table)))
+                cursor.execute('DELETE FROM {}'.format(quote_name(Profile._meta.db_table)))
+            for model, table, partition in loads:
+                if model is Profile:
+                    # Games that reference the profiles are checked at commit, once the profiles are back
+                    cursor.execute('DELETE FROM {} WHERE {} IN (SELECT {} FROM {})'.format(
+                        quote_name(Profile._meta.db_table), quote_name(Profile._meta.pk.column),
+                        quote_name(Profile._meta.pk.column), quote_name(table)))
+                else:
+                    cursor.execute('DELETE FROM {} WHERE {} = %s'.format(
+                        quote_name(Game._meta.db_table), quote_name(Game._meta.get_field('year').column)),
+                        [partition['year']])
+                columns = ', '.join(quote_name(field.column) for field in export_fields(model))
+                cursor.execute('INSERT INTO {} ({}) SELECT {} FROM {}'.format(
+                    quote_name(model._meta.db_table), columns, columns, quote_name(table)))
@@ -0,0 +1,28 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from nfl_data.features import update_features
+
+
+class Command(BaseCommand):
+    help = ('Recompute the rolling and opponent features of some players and the defenses they faced, '
+            'or rebuild every feature')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, nargs='+', help='IDs of the players whose games changed')
+        parser.add_argument('--manifest', nargs='+',
+                            help='Update the players changed by these changes_<timestamp>.ndjson manifests')
+
+    def handle(self, *args, **options):
+        player_ids = None
+        if options['players'] is not None or options['manifest'] is not None:
+            player_ids = set(options['players'] or [])
+            for manifest in options['manifest'] or []:
+                with open(manifest, 'r') as fin:
+                    player_ids.update(json.loads(line)['record']['player_id'] for line in fin)
+        start = time.time()
+        counts = update_features(player_ids)
+        self.stdout.write('Features of {} player games and {} defense games written in {:.2f}s'.format(
+            counts['player_games'], counts['defense_games'], time.time() - start))
@@ -0,0 +1,142 @@
+import datetime
+import re
+
+from django.db import migrations, models
+
+
+def to_digits(value):
+    """Keep the first number in a scraped string, i.e. '$15,000,000' -> '15000000'"""
+    if value is None:
+        return None
+    match = re.search(r'\d[\d,]*', value)
+    return None if match is None else match.group(0).replace(',', '')
+
+
+def to_iso_date(value):
+    """Turn a scraped date into YYYY-MM-DD, or None if it isn't a date"""
+    for date_format in ('%Y-%m-%d', '%B %d, %Y', '%b %d, %Y'):
+        try:
+            return datetime.datetime.strptime(value.strip(), date_format).date().isoformat()
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+
+def age_in_days(age, game_date):
+    """Turn a scraped age of years and days, i.e. '22-344', into days on the day of the game"""
+    match = re.match(r'^(\d+)-(\d+)$', age or '')
+    if match is None or game_date is None:
+        return None
+    years, days = int(match.group(1)), int(match.group(2))
+    last_birthday = game_date - datetime.timedelta(days=days)
+    try:
+        birth_date = last_birthday.replace(year=last_birthday.year - years)
+    except ValueError:
+        # Born on February 29th
+        birth_date = last_birthday.replace(year=last_birthday.year - years, day=28)
+    return (game_date - birth_date).days
+
+
+def convert_strings(apps, schema_editor):
+    """Rewrite the scraped strings so the columns can be cast to their new types"""
+    Profile = apps.get_model('nfl_data', 'Profile')
+    Game = apps.get_model('nfl_data', 'Game')
+    for profile in Profile.objects.all().iterator():
+        height = re.match(r'^(\d+)-(\d+)$', profile.height or '')
+        profile.height = None if height is None else str(int(height.group(1)) * 12 + int(height.group(2)))
+        profile.birth_date = to_iso_date(profile.birth_date)
+        profile.death_date = to_iso_date(profile.death_date)
+        profile.draft_year = to_digits(profile.draft_year)
+        profile.current_salary = to_digits(profile.current_salary)
+        hof_induction_year = re.search(r'\d{4}', profile.hof_induction_year or '')
+        profile.hof_induction_year = None if hof_induction_year is None else hof_induction_year.group(0)
+        profile.save()
+    # There are far fewer distinct ages and dates than games, and no converted age has a '-'
+    for age, game_date in Game.objects.values_list('age', 'date').distinct():
+        days = age_in_days(age, game_date)
+        Game.objects.filter(age=age, date=game_date).update(age=None if days is None else str(days))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nfl_data', '0008_auto_20171217_1557'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='game',
+            name='age',
+            field=models.CharField(max_length=6, null=True),
+        ),
+        migrations.RunPython(convert_strings, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='profile',
+            name='height',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='birth_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='death_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='draft_year',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='current_salary',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='hof_induction_year',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='year',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='game_number',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='age',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='passing_rating',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='defense_sacks',
+            field=models.FloatField(),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='id',
+            field=models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='game_id',
+            field=models.CharField(max_length=12),
+        ),
+        migrations.AlterUniqueTogether(
+            name='game',
+            unique_together={('player_id', 'game_id')},
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nfl_data', '0011_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpponentPositionFeatures',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team', models.CharField(max_length=3)),
+                ('position', models.CharField(max_length=2)),
+                ('game_id', models.CharField(max_length=12)),
+                ('date', models.DateField()),
+                ('year', models.IntegerField()),
+                ('points_allowed', models.FloatField()),
+                ('points_allowed_avg_3', models.FloatField(null=True)),
+                ('points_allowed_avg_5', models.FloatField(null=True)),
+                ('points_allowed_avg_10', models.FloatField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlayerGameFeatures',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('player_id', models.IntegerField()),
+                ('game_id', models.CharField(max_length=12)),
+                ('date', models.DateField()),
+                ('year', models.IntegerField()),
+                ('team', models.CharField(max_length=3)),
+                ('opponent', models.CharField(max_length=3)),
+                ('position', models.CharField(max_length=2, null=True)),
+                ('fantasy_points', models.FloatField()),
+                ('fantasy_points_avg_3', models.FloatField(null=True)),
+                ('fantasy_points_avg_5', models.FloatField(null=True)),
+                ('fantasy_points_avg_10', models.FloatField(null=True)),
+                ('passing_yards_avg_3', models.FloatField(null=True)),
+                ('passing_yards_avg_5', models.FloatField(null=True)),
+                ('passing_yards_avg_10', models.FloatField(null=True)),
+                ('rushing_yards_avg_3', models.FloatField(null=True)),
+                ('rushing_yards_avg_5', models.FloatField(null=True)),
+                ('rushing_yards_avg_10', models.FloatField(null=True)),
+                ('receiving_yards_avg_3', models.FloatField(null=True)),
+                ('receiving_yards_avg_5', models.FloatField(null=True)),
+                ('receiving_yards_avg_10', models.FloatField(null=True)),
+                ('receiving_targets_avg_3', models.FloatField(null=True)),
+                ('receiving_targets_avg_5', models.FloatField(null=True)),
+                ('receiving_targets_avg_10', models.FloatField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='playergamefeatures',
+            index=models.Index(fields=['opponent', 'position', 'date'], name='nfl_data_pgf_opponent_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='playergamefeatures',
+            unique_together={('player_id', 'game_id')},
+        ),
+        migrations.AddIndex(
+            model_name='opponentpositionfeatures',
+            index=models.Index(fields=['team', 'position', 'date'], name='nfl_data_opf_team_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='opponentpositionfeatures',
+            unique_together={('team', 'position', 'game_id')},
+        ),
+    ]
@@ -1,35 +1,41 @@
 from django.db import models
 
 class Profile(models.Model):
-    # TODO: Replace Charfields with more appropriate choice after data cleaning
     player_id = models.IntegerField(primary_key=True)
     name = models.CharField(max_length=50, null=True)
     position = models.CharField(max_length=2, null=True)
-    height = models.CharField(max_length=4, null=True)
+    # In inches
+    height = models.IntegerField(null=True)
     weight = models.IntegerField(null=True)
     current_team = models.CharField(max_length=3, null=True)
-    birth_date = models.CharField(max_length=10, null=True)
+    birth_date = models.DateField(null=True)
     birth_place = models.CharField(max_length=50, null=True)
-    death_date = models.CharField(max_length=10, null=True)
+    death_date = models.DateField(null=True)
     college = models.CharField(max_length=30, null=True)
     high_school = models.CharField(max_length=30, null=True)
     draft_team = models.CharField(max_length=3, null=True)
     draft_round = models.IntegerField(null=True)
     draft_position = models.IntegerField(null=True)
-    draft_year = models.CharField(max_length=4, null=True)
-    current_salary = models.CharField(max_length=9, null=True)
-    hof_induction_year = models.CharField(max_length=10, null=True)
+    draft_year = models.IntegerField(null=True)
+    current_salary = models.IntegerField(null=True)
+    hof_induction_year = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='nfl_data_profile_name_idx'),
+        ]
 
     def __str__(self):
         return "{} - {}".format(self.player_id, self.name)
 
 class Game(models.Model):
     player_id = models.ForeignKey('Profile', on_delete=models.CASCADE)
-    year = models.CharField(max_length=4)
-    game_id = models.CharField(max_length=12, primary_key=True)
+    year = models.IntegerField()
+    game_id = models.CharField(max_length=12)
     date = models.DateField()
-    game_number = models.IntegerField()
-    age = models.CharField(max_length=6)
+    game_number = models.IntegerField(null=True)
+    # In days
+    age = models.IntegerField(null=True)
     team = models.CharField(max_length=3)
     game_location = models.CharField(max_length=30)
     opponent = models.CharField(max_length=3)
@@ -39,7 +45,7 @@ class Game(models.Model):
     passing_attempts = models.IntegerField()
     passing_completions = models.IntegerField()
     passing_yards = models.IntegerField()
-    passing_rating = models.IntegerField()
+    passing_rating = models.FloatField()
     passing_touchdowns = models.IntegerField()
     passing_interceptions = models.IntegerField()
     passing_sacks = models.IntegerField()
@@ -57,7 +63,7 @@ class Game(models.Model):
     punt_return_attempts = models.IntegerField()
     punt_return_yards = models.IntegerField()
     punt_return_touchdowns = models.IntegerField()
-    defense_sacks = models.IntegerField()
+    defense_sacks = models.FloatField()
     defense_tackles = models.IntegerField()
     defense_tackle_assists = models.IntegerField()
     defense_interceptions = models.IntegerField()
@@ -72,6 +78,103 @@ class Game(models.Model):
     punting_yards = models.IntegerField()
     punting_blocked = models.IntegerField()
 
+    class Meta:
+        # Every player in a game has their own row
+        unique_together = ('player_id', 'game_id')
+        indexes = [
+            models.Index(fields=['date', 'id'], name='nfl_data_game_date_idx'),
+            models.Index(fields=['year', 'team'], name='nfl_data_game_year_team_idx'),
+            models.Index(fields=['year', 'date', 'id'], name='nfl_data_game_year_date_idx'),
+            models.Index(fields=['game_id'], name='nfl_data_game_game_id_idx'),
+            models.Index(fields=['player_id', 'date'], name='nfl_data_game_player_date_idx'),
+        ]
+
     def __str__(self):
         return '{}: {} vs. {} {}'.format(self.game_id, self.team,
                 self.opponent, self.date)
+
+
+class DataVersion(models.Model):
+    """Counter bumped every time data is bulk loaded, so caches of query results know to drop them"""
+    name = models.CharField(max_length=30, primary_key=True)
+    version = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current(cls, name='default'):
+        """Get the current version, 0 if the data has never been loaded"""
+        version = cls.objects.filter(name=name).values_list('version', flat=True).first()
+        return 0 if version is None else version
+
+    @classmethod
+    def bump(cls, name='default'):
+        """Record that the data changed. Call it inside the loader's transaction."""
+        if cls.objects.filter(name=name).update(version=models.F('version') + 1) == 0:
+            cls.objects.create(name=name, version=1)
+
+    def __str__(self):
+        return '{}: {}'.format(self.name, self.version)
+
+
+class PlayerGameFeatures(models.Model):
+    """A player's fantasy points in a game, and their averages over the games before it
+
+    Kept up to date by nfl_data.features. The player and game aren't foreign keys, since the
+    loaders replace games by deleting them, and features are only replaced when they are updated.
+    """
+    player_id = models.IntegerField()
+    game_id = models.CharField(max_length=12)
+    date = models.DateField()
+    year = models.IntegerField()
+    team = models.CharField(max_length=3)
+    opponent = models.CharField(max_length=3)
+    position = models.CharField(max_length=2, null=True)
+    fantasy_points = models.FloatField()
+    # Averages over the player's previous 3, 5 and 10 games, null for their first game
+    fantasy_points_avg_3 = models.FloatField(null=True)
+    fantasy_points_avg_5 = models.FloatField(null=True)
+    fantasy_points_avg_10 = models.FloatField(null=True)
+    passing_yards_avg_3 = models.FloatField(null=True)
+    passing_yards_avg_5 = models.FloatField(null=True)
+    passing_yards_avg_10 = models.FloatField(null=True)
+    rushing_yards_avg_3 = models.FloatField(null=True)
+    rushing_yards_avg_5 = models.FloatField(null=True)
+    rushing_yards_avg_10 = models.FloatField(null=True)
+    receiving_yards_avg_3 = models.FloatField(null=True)
+    receiving_yards_avg_5 = models.FloatField(null=True)
+    receiving_yards_avg_10 = models.FloatField(null=True)
+    receiving_targets_avg_3 = models.FloatField(null=True)
+    receiving_targets_avg_5 = models.FloatField(null=True)
+    receiving_targets_avg_10 = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ('player_id', 'game_id')
+        indexes = [
+            models.Index(fields=['opponent', 'position', 'date'], name='nfl_data_pgf_opponent_idx'),
+        ]
+
+    def __str__(self):
+        return '{}: {}'.format(self.player_id, self.game_id)
+
+
+class OpponentPositionFeatures(models.Model):
+    """Fantasy points a team's defense allowed to the players of a position in a game, and their averages"""
+    team = models.CharField(max_length=3)
+    position = models.CharField(max_length=2)
+    game_id = models.CharField(max_length=12)
+    date = models.DateField()
+    year = models.IntegerField()
+    points_allowed = models.FloatField()
+    # Averages over the team's previous 3, 5 and 10 games, null for its first game
+    points_allowed_avg_3 = models.FloatField(null=True)
+    points_allowed_avg_5 = models.FloatField(null=True)
+    points_allowed_avg_10 = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ('team', 'position', 'game_id')
+        indexes = [
+            models.Index(fields=['team', 'position', 'date'], name='nfl_data_opf_team_idx'),
+        ]
+
+    def __str__(self):
+        return '{} vs. {}: {}'.format(self.team, self.position, self.game_id)
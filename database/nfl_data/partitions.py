@@ -0,0 +1,213 @@
+"""Exports of Profile and Game split by season, and the staging tables they are imported through
+
+An export is a directory with a profiles file, a games file per season and a manifest.json
+listing them, as NDJSON or as Parquet, which needs pyarrow. Rows are keyed on the model's field
+names, so NDJSON exports have the scraper's schema.
+
+Imports load every file into a staging table of its own, from parallel worker processes, while
+readers keep using the live tables. import_data then copies the staged rows over the live ones in
+one transaction, see its copy_in for what that transaction locks.
+"""
+import json
+import os
+
+from django.apps import apps
+from django.db import connection, models, transaction
+
+FORMATS = ('ndjson', 'parquet')
+MANIFEST_FILE = 'manifest.json'
+
+# Kinds of model fields whose values go into the database as they are read
+PLAIN_TYPES = ('CharField', 'FloatField', 'IntegerField')
+
+# Arrow type of each kind of model field, for Parquet
+ARROW_TYPES = {
+    'BooleanField': 'bool_',
+    'NullBooleanField': 'bool_',
+    'CharField': 'string',
+    'DateField': 'date32',
+    'FloatField': 'float64',
+    'IntegerField': 'int32'
+}
+
+
+def export_fields(model):
+    """The fields of a model that are exported, which is all of them but an automatic primary key"""
+    return [field for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)]
+
+
+def internal_type(field):
+    """Kind of a model field, or of the field a foreign key points to"""
+    return (field.target_field if field.is_relation else field).get_internal_type()
+
+
+def arrow_schema(fields):
+    """Parquet schema for some model fields, so a column of nothing but nulls still gets its type"""
+    import pyarrow
+    return pyarrow.schema([pyarrow.field(field.name, getattr(pyarrow, ARROW_TYPES[internal_type(field)])(), field.null)
+                           for field in fields])
+
+
+def open_writer(path, data_format, fields, chunk_size):
+    """Open a file of an export for writing, see NdjsonWriter and ParquetWriter"""
+    if data_format == 'parquet':
+        return ParquetWriter(path, fields, chunk_size)
+    return NdjsonWriter(path, fields)
+
+
+class NdjsonWriter():
+    """Write rows of field values as JSON objects, one per line
+
+    The file is written under a temporary name and only renamed into place once it is complete.
+    """
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.names = [field.name for field in fields]
+        self.num_rows = 0
+        self.fout = None
+
+    def __enter__(self):
+        self.fout = open(self.path + '.tmp', 'w')
+        return self
+
+    def write(self, row):
+        self.fout.write(json.dumps(dict(zip(self.names, row)), default=lambda value: value.isoformat()) + '\n')
+        self.num_rows += 1
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.fout.close()
+        if exc_type is None:
+            os.replace(self.path + '.tmp', self.path)
+        else:
+            os.remove(self.path + '.tmp')
+
+
+class ParquetWriter():
+    """Write rows of field values to a Parquet file, a row group per chunk
+
+    The file is written under a temporary name and only renamed into place once it is complete.
+    """
+
+    def __init__(self, path, fields, chunk_size):
+        self.path = path
+        self.names = [field.name for field in fields]
+        self.schema = arrow_schema(fields)
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.num_rows = 0
+        self.writer = None
+
+    def __enter__(self):
+        import pyarrow.parquet
+        self.writer = pyarrow.parquet.ParquetWriter(self.path + '.tmp', self.schema)
+        return self
+
+    def write(self, row):
+        self.rows.append(row)
+        self.num_rows += 1
+        if len(self.rows) >= self.chunk_size:
+            self.write_rows()
+
+    def write_rows(self):
+        import pyarrow
+        columns = [pyarrow.array(column, type=self.schema.field(name).type)
+                   for name, column in zip(self.names, zip(*self.rows))]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+        self.rows = []
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is None and self.rows:
+            self.write_rows()
+        self.writer.close()
+        if exc_type is None:
+            os.replace(self.path + '.tmp', self.path)
+        else:
+            os.remove(self.path + '.tmp')
+
+
+def read_rows(path, data_format, batch_size):
+    """Read the rows of a file of an export
+
+        Yields:
+            - rows (dict[]): Up to batch_size rows, keyed on field name
+    """
+    if data_format == 'parquet':
+        import pyarrow.parquet
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size):
+            yield batch.to_pylist()
+        return
+    rows = []
+    with open(path, 'r') as fin:
+        for line in fin:
+            rows.append(json.loads(line))
+            if len(rows) >= batch_size:
+                yield rows
+                rows = []
+    if rows:
+        yield rows
+
+
+def staging_table(model, suffix):
+    """Name of a staging table of a model, i.e. nfl_data_game_staging_2016"""
+    return '{}_staging_{}'.format(model._meta.db_table, suffix)
+
+
+def create_staging_table(model, table):
+    """Create an empty staging table with the columns of a model's table, dropping any left over"""
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in export_fields(model))
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS {}'.format(connection.ops.quote_name(table)))
+        cursor.execute('CREATE TABLE {} AS SELECT {} FROM {} WHERE 1 = 0'.format(
+            connection.ops.quote_name(table), columns, connection.ops.quote_name(model._meta.db_table)))
+
+
+def drop_staging_table(table):
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS {}'.format(connection.ops.quote_name(table)))
+
+
+def load_staging_table(model_label, table, path, data_format, batch_size):
+    """Load a file of an export into its staging table from an import worker process, see insert_staging_rows
+
+        The worker's connection is closed once the file is loaded.
+    """
+    try:
+        return insert_staging_rows(model_label, table, path, data_format, batch_size)
+    finally:
+        connection.close()
+
+
+def insert_staging_rows(model_label, table, path, data_format, batch_size):
+    """Load a file of an export into its staging table
+
+        Numbers and strings are inserted as they are, and other values, such as dates, go
+        through their model field to be converted the way the database expects them. Every
+        batch is its own transaction, so workers writing to the same SQLite file only hold the
+        lock briefly.
+
+        Args:
+            - model_label (str): The model the rows are of, i.e. 'nfl_data.Game'
+            - table (str): The staging table
+            - path (str): The file
+            - data_format (str): 'ndjson' or 'parquet'
+            - batch_size (int): Number of rows inserted per query
+
+        Returns:
+            - num_rows (int): Number of rows loaded
+    """
+    fields = export_fields(apps.get_model(model_label))
+    insert = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(table), ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)))
+    converted = [internal_type(field) not in PLAIN_TYPES for field in fields]
+    num_rows = 0
+    for rows in read_rows(path, data_format, batch_size):
+        values = []
+        for row in rows:
+            values.append([field.get_db_prep_save(row.get(field.name), connection) if convert
+                           else row.get(field.name) for field, convert in zip(fields, converted)])
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(insert, values)
+        num_rows += len(rows)
+    return num_rows
@@ -0,0 +1,188 @@
+"""Cached lookups for the queries feature code makes over and over, i.e. a player's last N games
+
+Results come back as tuples of named tuples rather than model instances, and are kept in an
+in-process LRU cache with a TTL. Every cached result is dropped as soon as DataVersion is bumped,
+which the bulk loaders do whenever they change the data.
+
+Usage:
+    from nfl_data import queries
+    games = queries.player_last_games(player_id, 5)
+    games[0].passing_yards
+"""
+import collections
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+from .models import DataVersion, Game, Profile
+
+GAME_FIELDS = ('player_id', 'year', 'game_id', 'date', 'game_number', 'team', 'game_location', 'opponent',
+               'game_won', 'player_team_score', 'opponent_score', 'passing_attempts', 'passing_completions',
+               'passing_yards', 'passing_rating', 'passing_touchdowns', 'passing_interceptions', 'rushing_attempts',
+               'rushing_yards', 'rushing_touchdowns', 'receiving_targets', 'receiving_receptions',
+               'receiving_yards', 'receiving_touchdowns')
+
+
+def size_of(value):
+    """Approximate bytes held by a cached value of nested tuples and lists of plain values"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(size_of(item) for item in value)
+    return size
+
+
+class QueryCache():
+    """Thread-safe LRU cache of query results, with a TTL and a limit on entries or bytes
+
+    Entries belong to the DataVersion they were loaded under. The version is checked at most
+    once every version_check_interval seconds, so a lookup that hits the cache doesn't cost a
+    query, and the whole cache is cleared when it changes.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=None, ttl=3600, version_check_interval=1.0):
+        """
+            Args:
+                - max_entries (int): Most results to keep. None for no limit.
+                - max_bytes (int): Most bytes of results to keep, as estimated by size_of. None for no limit.
+                - ttl (float): Seconds a result is kept. None to keep it until it is evicted.
+                - version_check_interval (float): Seconds between checks of the DataVersion
+
+            Returns:
+                None
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.num_bytes = 0
+        self.data_version = None
+        self.version_checked = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, load):
+        """Get a cached result, or load it and cache it
+
+            Args:
+                - key (tuple): The query's name and arguments
+                - load (function): Runs the query, returning a tuple
+
+            Returns:
+                - result (tuple): The query's result
+        """
+        self.check_data_version()
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (self.ttl is None or entry[1] > now):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        result = load()
+        self.set(key, result, now)
+        return result
+
+    def set(self, key, result, now=None):
+        """Cache a result, evicting the least recently used ones over the limits"""
+        now = time.time() if now is None else now
+        size = size_of(result) if self.max_bytes is not None else 0
+        expires = None if self.ttl is None else now + self.ttl
+        with self.lock:
+            if key in self.entries:
+                self.num_bytes -= self.entries.pop(key)[2]
+            self.entries[key] = (result, expires, size)
+            self.num_bytes += size
+            while self.entries and ((self.max_entries is not None and len(self.entries) > self.max_entries) or
+                                    (self.max_bytes is not None and self.num_bytes > self.max_bytes)):
+                self.num_bytes -= self.entries.popitem(last=False)[1][2]
+
+    def check_data_version(self):
+        """Clear the cache if the data was reloaded since the results were cached"""
+        now = time.time()
+        if now - self.version_checked < self.version_check_interval:
+            return
+        data_version = DataVersion.current()
+        with self.lock:
+            self.version_checked = now
+            if data_version != self.data_version:
+                self.entries.clear()
+                self.num_bytes = 0
+                self.data_version = data_version
+
+    def clear(self):
+        """Drop every cached result"""
+        with self.lock:
+            self.entries.clear()
+            self.num_bytes = 0
+
+    def stats(self):
+        """Entries, estimated bytes, hits and misses of the cache"""
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.num_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+# Sized by the NFL_DATA_QUERY_CACHE setting, i.e. {'max_entries': None, 'max_bytes': 512 * 1024 * 1024}
+query_cache = QueryCache(**getattr(settings, 'NFL_DATA_QUERY_CACHE', {}))
+
+
+def player_profile(player_id):
+    """Get a player's profile
+
+        Returns:
+            - profile (tuple): The profile as a named tuple, or None if there is no such player
+    """
+    def load():
+        return tuple(Profile.objects.filter(player_id=player_id).values_list(named=True))
+    profiles = query_cache.get_or_load(('player_profile', player_id), load)
+    return profiles[0] if profiles else None
+
+
+def player_last_games(player_id, num_games=10, fields=GAME_FIELDS):
+    """Get a player's most recent games, newest first
+
+        Args:
+            - player_id (int): The player
+            - num_games (int): Number of games to get
+            - fields (str[]): Game fields to include
+
+        Returns:
+            - games (tuple): The games as named tuples of the fields
+    """
+    def load():
+        return tuple(Game.objects.filter(player_id=player_id).order_by('-date')
+                     .values_list(*fields, named=True)[:num_games])
+    return query_cache.get_or_load(('player_last_games', player_id, num_games, tuple(fields)), load)
+
+
+def player_season_games(player_id, year, fields=GAME_FIELDS):
+    """Get a player's games in a season, in the order they were played
+
+        Returns:
+            - games (tuple): The games as named tuples of the fields
+    """
+    def load():
+        return tuple(Game.objects.filter(player_id=player_id, year=year).order_by('date')
+                     .values_list(*fields, named=True))
+    return query_cache.get_or_load(('player_season_games', player_id, year, tuple(fields)), load)
+
+
+def team_season_games(team, year, fields=GAME_FIELDS):
+    """Get the line of every player of a team in every game of a season, in the order they were played
+
+        Args:
+            - team (str): The team's three-letter code, i.e. 'NWE'
+            - year (int): The season
+            - fields (str[]): Game fields to include
+
+        Returns:
+            - games (tuple): The player lines as named tuples of the fields
+    """
+    def load():
+        return tuple(Game.objects.filter(year=year, team=team).order_by('date', 'player_id')
+                     .values_list(*fields, named=True))
+    return query_cache.get_or_load(('team_season_games', team, year, tuple(fields)), load)
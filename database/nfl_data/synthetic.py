@@ -0,0 +1,184 @@
+"""Synthetic profiles and games, shaped like the scraper's records, for measuring the database at full scale
+
+Players get a position, a career of consecutive seasons and a team per season, and their
+stat lines are drawn around typical values for their position, so the data has the skew of
+the real thing: most games of most players are zero outside of a few stats, quarterbacks
+have the passing yards, and so on. The same seed always generates the same data.
+"""
+import datetime
+import random
+
+from .models import Game
+
+TEAMS = ['ARI', 'ATL', 'BAL', 'BUF', 'CAR', 'CHI', 'CIN', 'CLE', 'DAL', 'DEN', 'DET', 'GNB', 'HOU', 'IND', 'JAX',
+         'KAN', 'LAC', 'LAR', 'MIA', 'MIN', 'NWE', 'NOR', 'NYG', 'NYJ', 'OAK', 'PHI', 'PIT', 'SEA', 'SFO', 'TAM',
+         'TEN', 'WAS']
+
+# Positions and their share of players
+POSITIONS = [('QB', 0.06), ('RB', 0.1), ('WR', 0.14), ('TE', 0.07), ('OL', 0.18), ('DL', 0.14), ('LB', 0.12),
+             ('DB', 0.15), ('K', 0.02), ('P', 0.02)]
+
+GAMES_PER_SEASON = 16
+FIRST_YEAR = 1970
+LAST_YEAR = 2017
+
+GAME_FIELDS = [field.name for field in Game._meta.get_fields() if field.concrete and field.name != 'id']
+
+
+def generate_profiles(num_players, seed=0):
+    """Generate player profiles
+
+        Args:
+            - num_players (int): Number of players, given player IDs from 1
+            - seed (int): Seed for the random numbers
+
+        Yields:
+            - profile (dict): Profile in the scraper's schema
+    """
+    rng = random.Random(seed)
+    positions, weights = zip(*POSITIONS)
+    for player_id in range(1, num_players + 1):
+        position = rng.choices(positions, weights)[0]
+        birth_date = datetime.date(rng.randint(FIRST_YEAR - 22, LAST_YEAR - 22), rng.randint(1, 12),
+                                   rng.randint(1, 28))
+        drafted = rng.random() < 0.8
+        yield {
+            'player_id': player_id,
+            'name': 'Player {}'.format(player_id),
+            'position': position,
+            'height': rng.randint(68, 80),
+            'weight': rng.randint(170, 330),
+            'current_team': rng.choice(TEAMS) if rng.random() < 0.1 else None,
+            'birth_date': birth_date.isoformat(),
+            'birth_place': None,
+            'death_date': None,
+            'college': 'College {}'.format(rng.randint(1, 200)),
+            'high_school': None,
+            'draft_team': rng.choice(TEAMS) if drafted else None,
+            'draft_round': rng.randint(1, 7) if drafted else None,
+            'draft_position': rng.randint(1, 256) if drafted else None,
+            'draft_year': birth_date.year + 22 if drafted else None,
+            'current_salary': None,
+            'hof_induction_year': None
+        }
+
+
+def generate_schedule(year, seed=0):
+    """Pair the teams up for every week of a season
+
+        Returns:
+            - schedule (dict[]): For every week, each team's opponent, whether they are at home and
+              the score, as (opponent, home, team_score, opponent_score)
+    """
+    rng = random.Random('{}-{}'.format(seed, year))
+    schedule = []
+    for _ in range(GAMES_PER_SEASON):
+        teams = list(TEAMS)
+        rng.shuffle(teams)
+        week = {}
+        for home_team, away_team in zip(teams[::2], teams[1::2]):
+            home_score, away_score = rng.randint(0, 45), rng.randint(0, 45)
+            week[home_team] = (away_team, True, home_score, away_score)
+            week[away_team] = (home_team, False, away_score, home_score)
+        schedule.append(week)
+    return schedule
+
+
+def generate_games(profiles, num_games, seed=0):
+    """Generate the stat lines of every player's career, a player at a time
+
+        Careers are sized so that there are about num_games lines in total, a bit fewer since
+        careers end at LAST_YEAR. Teammates share their games, against the same opponent with
+        the same score.
+
+        Args:
+            - profiles (dict[]): Profiles from generate_profiles
+            - num_games (int): Approximate total number of games
+            - seed (int): Seed for the random numbers
+
+        Yields:
+            - game (dict): Stats for one game, in the scraper's schema, sorted by player and date
+    """
+    rng = random.Random(seed)
+    schedules = {}
+    games_per_player = max(num_games / max(len(profiles), 1), 1)
+    for profile in profiles:
+        birth_date = datetime.date(*map(int, profile['birth_date'].split('-')))
+        first_year = min(max(birth_date.year + 22, FIRST_YEAR), LAST_YEAR)
+        # Careers of players who started recently are cut short at LAST_YEAR
+        num_seasons = max(1, int(round(rng.uniform(0.5, 1.5) * games_per_player / GAMES_PER_SEASON)))
+        num_seasons = min(num_seasons, LAST_YEAR - first_year + 1)
+        team = rng.choice(TEAMS)
+        for year in range(first_year, first_year + num_seasons):
+            if year not in schedules:
+                schedules[year] = generate_schedule(year, seed)
+            if rng.random() < 0.2:
+                team = rng.choice(TEAMS)
+            season_start = datetime.date(year, 9, 7)
+            for game_number, week in enumerate(schedules[year], 1):
+                date = season_start + datetime.timedelta(days=7 * (game_number - 1))
+                yield generate_game(rng, profile, year, game_number, date, team, week[team], birth_date)
+
+
+def generate_game(rng, profile, year, game_number, date, team, matchup, birth_date):
+    """Generate one stat line of a player"""
+    opponent, home, team_score, opponent_score = matchup
+    game = {field: 0 for field in GAME_FIELDS}
+    game.update({
+        'player_id': profile['player_id'],
+        'year': year,
+        'game_id': '{}0{}'.format(date.strftime('%Y%m%d'), (team if home else opponent).lower()),
+        'date': date.isoformat(),
+        'game_number': game_number,
+        'age': (date - birth_date).days,
+        'team': team,
+        'game_location': 'H' if home else 'A',
+        'opponent': opponent,
+        'game_won': team_score > opponent_score,
+        'player_team_score': team_score,
+        'opponent_score': opponent_score,
+        'passing_rating': 0.0,
+        'defense_sacks': 0.0
+    })
+    position = profile['position']
+    if position == 'QB':
+        attempts = rng.randint(15, 50)
+        completions = int(attempts * rng.uniform(0.45, 0.75))
+        game.update({
+            'passing_attempts': attempts,
+            'passing_completions': completions,
+            'passing_yards': int(completions * rng.uniform(8, 14)),
+            'passing_touchdowns': rng.choices(range(6), [20, 30, 25, 15, 7, 3])[0],
+            'passing_interceptions': rng.choices(range(4), [40, 35, 18, 7])[0],
+            'passing_rating': round(rng.uniform(40, 140), 1),
+            'passing_sacks': rng.randint(0, 5),
+            'rushing_attempts': rng.randint(0, 6),
+        })
+        game['passing_sacks_yards_lost'] = game['passing_sacks'] * rng.randint(3, 9)
+        game['rushing_yards'] = game['rushing_attempts'] * rng.randint(-1, 8)
+    elif position == 'RB':
+        game['rushing_attempts'] = rng.randint(0, 25)
+        game['rushing_yards'] = int(game['rushing_attempts'] * rng.uniform(2, 6))
+        game['rushing_touchdowns'] = rng.choices(range(4), [60, 28, 9, 3])[0]
+        game['receiving_targets'] = rng.randint(0, 6)
+    elif position in ('WR', 'TE'):
+        game['receiving_targets'] = rng.randint(0, 12 if position == 'WR' else 8)
+    elif position in ('DL', 'LB', 'DB'):
+        game['defense_tackles'] = rng.randint(0, 9)
+        game['defense_tackle_assists'] = rng.randint(0, 5)
+        game['defense_sacks'] = rng.choice([0.0, 0.0, 0.0, 0.5, 1.0]) if position != 'DB' else 0.0
+        game['defense_interceptions'] = 1 if position == 'DB' and rng.random() < 0.08 else 0
+        game['defense_interception_yards'] = game['defense_interceptions'] * rng.randint(0, 40)
+    elif position == 'K':
+        game['point_after_attemps'] = rng.randint(0, 6)
+        game['point_after_makes'] = game['point_after_attemps'] - (1 if rng.random() < 0.05 else 0)
+        game['field_goal_attempts'] = rng.randint(0, 5)
+        game['field_goal_makes'] = rng.randint(0, game['field_goal_attempts'])
+    elif position == 'P':
+        game['punting_attempts'] = rng.randint(1, 9)
+        game['punting_yards'] = game['punting_attempts'] * rng.randint(35, 50)
+    if game['receiving_targets']:
+        game['receiving_receptions'] = rng.randint(0, game['receiving_targets'])
+        game['receiving_yards'] = int(game['receiving_receptions'] * rng.uniform(5, 16))
+        game['receiving_touchdowns'] = 1 if rng.random() < 0.1 * game['receiving_receptions'] else 0
+    return game
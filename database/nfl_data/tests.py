@@ -1,3 +1,209 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from .admin import ProfileAdmin, prefix_range
+from .features import update_features
+from .models import Game, OpponentPositionFeatures, PlayerGameFeatures, Profile
+from .synthetic import generate_games, generate_profiles
+
+# The scripts next to the database project, i.e. json_to_fixture.py
+sys.path.insert(0, os.path.dirname(settings.BASE_DIR))
+import json_to_fixture
+
+
+def load_records(profiles, games):
+    """Load profiles and games in the scraper's schema into the database"""
+    Profile.objects.bulk_create([Profile(**profile) for profile in profiles])
+    game_rows = []
+    for game in games:
+        game = dict(game)
+        game['player_id_id'] = game.pop('player_id')
+        game_rows.append(Game(**game))
+    Game.objects.bulk_create(game_rows)
+
+
+class ScratchDirMixin():
+    """Gives every test a scratch directory of its own"""
+
+    def make_scratch_dir(self):
+        scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, scratch_dir)
+        return scratch_dir
+
+    @staticmethod
+    def write_json(path, records):
+        with open(path, 'w') as fout:
+            json.dump(records, fout)
+
+
+class JsonToFixtureTest(ScratchDirMixin, TestCase):
+
+    def test_condensed_files_load_as_fixtures(self):
+        scratch_dir = self.make_scratch_dir()
+        profiles = list(generate_profiles(3))
+        games = list(generate_games(profiles, 40))
+        for name, model, primary_key, records in (('profiles', 'Profile', 'player_id', profiles),
+                                                  ('games', 'Game', None, games)):
+            self.write_json(os.path.join(scratch_dir, name + '.json'), records)
+            json_to_fixture.json_to_fixture(os.path.join(scratch_dir, name + '.json'), 'nfl_data', model,
+                                            primary_key, os.path.join(scratch_dir, name + '_fixture.json'))
+        with open(os.path.join(scratch_dir, 'games_fixture.json'), 'r') as fin:
+            self.assertNotIn('pk', json.load(fin)[0])
+
+        call_command('loaddata', os.path.join(scratch_dir, 'profiles_fixture.json'),
+                     os.path.join(scratch_dir, 'games_fixture.json'), verbosity=0)
+        self.assertEqual(Profile.objects.count(), 3)
+        self.assertEqual(Game.objects.count(), len(games))
+        game = Game.objects.get(player_id=games[0]['player_id'], game_id=games[0]['game_id'])
+        self.assertEqual((game.date.isoformat(), game.passing_yards), (games[0]['date'], games[0]['passing_yards']))
+
+
+class ProfileSearchTest(TestCase):
+
+    def setUp(self):
+        for player_id, name in enumerate(['Tom Brady', 'Tom Bradyson', 'Tommy Brady', 'Tom Brad', 'tom brady',
+                                          'Tom Bradz'], 1):
+            Profile.objects.create(player_id=player_id, name=name)
+        self.profile_admin = ProfileAdmin(Profile, admin.site)
+
+    def search(self, search_term):
+        queryset, _ = self.profile_admin.get_search_results(None, Profile.objects.order_by('name'), search_term)
+        return queryset
+
+    def test_search_matches_the_start_of_the_name(self):
+        self.assertEqual(list(self.search('Tom Brady').values_list('name', flat=True)), ['Tom Brady', 'Tom Bradyson'])
+        self.assertEqual(self.search('Tom').count(), 5)
+        self.assertEqual(prefix_range('Tom'), ('Tom', 'Ton'))
+
+    def test_search_uses_the_name_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Checks the SQLite query plan')
+        sql, params = self.search('Tom Brady').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX nfl_data_profile_name_idx', plan)
+
+
+class ApplyChangesTest(ScratchDirMixin, TestCase):
+
+    def setUp(self):
+        self.scratch_dir = self.make_scratch_dir()
+        self.profiles = list(generate_profiles(3))
+        self.games = list(generate_games(self.profiles, 40))
+        self.apply('changes_1.ndjson', [('added', 'profile', profile) for profile in self.profiles] +
+                   [('added', 'game', game) for game in self.games])
+
+    def apply(self, name, changes, *args):
+        path = os.path.join(self.scratch_dir, name)
+        with open(path, 'w') as fout:
+            for change, record_type, record in changes:
+                fout.write(json.dumps({'change': change, 'type': record_type, 'record': record}) + '\n')
+        call_command('apply_changes', path, *args, stdout=io.StringIO())
+
+    def test_changes_are_applied(self):
+        self.assertEqual(Game.objects.count(), len(self.games))
+        profile = dict(self.profiles[0], name='Renamed')
+        changed_game = dict(self.games[0], passing_yards=999)
+        removed_game = self.games[1]
+        added_game = dict(self.games[2], game_id='203001010nwe', date='2030-01-01')
+        self.apply('changes_2.ndjson', [
+            ('changed', 'profile', profile),
+            ('changed', 'game', changed_game),
+            ('removed', 'game', {'player_id': removed_game['player_id'], 'game_id': removed_game['game_id']}),
+            ('added', 'game', added_game)], '--batch-size', '2')
+
+        self.assertEqual(Profile.objects.get(player_id=profile['player_id']).name, 'Renamed')
+        self.assertEqual(Game.objects.count(), len(self.games))
+        self.assertEqual(Game.objects.get(player_id=changed_game['player_id'],
+                                          game_id=changed_game['game_id']).passing_yards, 999)
+        self.assertFalse(Game.objects.filter(player_id=removed_game['player_id'],
+                                             game_id=removed_game['game_id']).exists())
+        self.assertTrue(Game.objects.filter(player_id=added_game['player_id'], game_id='203001010nwe').exists())
+
+
+class ExportImportTest(ScratchDirMixin, TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(self.make_scratch_dir(), 'export')
+        self.profiles = list(generate_profiles(4, seed=2))
+        load_records(self.profiles, list(generate_games(self.profiles, 4 * 40, seed=2)))
+        self.exported = self.snapshot()
+        call_command('export_data', self.directory, '--chunk-size', '7', stdout=io.StringIO())
+
+    @staticmethod
+    def snapshot():
+        """Every profile and game, without the IDs the games happened to get"""
+        return (list(Profile.objects.order_by('player_id').values()),
+                list(Game.objects.order_by('player_id', 'game_id').values(
+                    *[field.name for field in Game._meta.fields if field.name != 'id'])))
+
+    def import_data(self, *args):
+        call_command('import_data', self.directory, '--workers', '1', '--batch-size', '9', *args,
+                     stdout=io.StringIO())
+
+    def test_import_with_replace_restores_the_export(self):
+        player_id = self.profiles[0]['player_id']
+        Game.objects.filter(player_id=player_id).update(passing_yards=999)
+        Game.objects.filter(player_id=self.profiles[1]['player_id']).delete()
+        Profile.objects.filter(player_id=player_id).update(name='Renamed')
+        Profile.objects.create(**dict(self.profiles[0], player_id=9999, name='Not Exported'))
+        self.import_data('--replace')
+        self.assertEqual(self.snapshot(), self.exported)
+
+    def test_import_of_some_seasons_leaves_the_others(self):
+        years = sorted(set(Game.objects.values_list('year', flat=True)))
+        Game.objects.update(passing_yards=999)
+        self.import_data('--years', str(years[0]))
+        self.assertFalse(Game.objects.filter(year=years[0], passing_yards=999).exists())
+        self.assertEqual(Game.objects.filter(passing_yards=999).count(), Game.objects.exclude(year=years[0]).count())
+        self.assertEqual(Game.objects.count(), len(self.exported[1]))
+
+
+class UpdateFeaturesTest(TestCase):
+
+    def setUp(self):
+        profiles = list(generate_profiles(12, seed=1))
+        self.games = list(generate_games(profiles, 12 * 40, seed=1))
+        load_records(profiles, self.games)
+
+    @staticmethod
+    def snapshot():
+        """Every feature row, without the IDs the rows happened to get"""
+        return (list(PlayerGameFeatures.objects.order_by('player_id', 'game_id').values(
+                    *[field.name for field in PlayerGameFeatures._meta.fields if field.name != 'id'])),
+                list(OpponentPositionFeatures.objects.order_by('team', 'position', 'game_id').values(
+                    *[field.name for field in OpponentPositionFeatures._meta.fields if field.name != 'id'])))
+
+    def test_rebuild_covers_every_game(self):
+        counts = update_features()
+        self.assertEqual(counts['player_games'], len(self.games))
+        self.assertEqual(PlayerGameFeatures.objects.count(), len(self.games))
+        first_game = PlayerGameFeatures.objects.order_by('player_id', 'date').first()
+        self.assertIsNone(first_game.fantasy_points_avg_3)
+        self.assertGreater(OpponentPositionFeatures.objects.count(), 0)
+
+    def test_incremental_update_matches_a_rebuild(self):
+        update_features()
+        first_player, second_player = self.games[0]['player_id'], self.games[-1]['player_id']
+        # A changed stat line, a removed game and a new position
+        Game.objects.filter(player_id=first_player, game_id=self.games[3]['game_id']).update(passing_yards=450,
+                                                                                             rushing_touchdowns=2)
+        Game.objects.filter(player_id=first_player, game_id=self.games[5]['game_id']).delete()
+        Profile.objects.filter(player_id=second_player).update(position='RB')
+        update_features([first_player, second_player])
+        incremental = self.snapshot()
+
+        update_features()
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual(len(incremental[0]), len(self.games) - 1)
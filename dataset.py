@@ -0,0 +1,496 @@
+"""Readers for the files written by scrape-nfl-stats.py
+
+The condensed profiles and games files are JSON arrays with one record per line, sorted by
+player ID (and games by date), with a .idx sidecar holding the byte range of every player's
+records. One player's records can be read without parsing the rest of the file.
+
+Dataset is a lazy view over whichever output is there, the condensed files, the SQLite sink's
+database or the NDJSON sink's files. Filters and the columns to keep are pushed down to the
+storage, so records that don't match are skipped before they are parsed, or never read at all.
+Datasets can also be loaded into pandas DataFrames with compact column types, which needs
+pandas installed.
+
+Usage:
+    from dataset import Dataset
+    quarterbacks = Dataset.open().filter(position='QB', year=range(2015, 2018))
+    for game in quarterbacks.select('player_id', 'date', 'passing_yards'):
+        ...
+    games = quarterbacks.to_dataframe()
+"""
+import collections
+import glob
+import json
+import os
+import re
+import sqlite3
+
+SQLITE_DB = 'nfl_stats.sqlite3'
+NDJSON_FILES = {'profiles': 'profiles.ndjson', 'games': 'games.ndjson'}
+
+# Fields each record type can be filtered on. Games are filtered on position through their player's profile.
+FILTER_FIELDS = {
+    'profiles': ('player_id', 'position'),
+    'games': ('player_id', 'year', 'team', 'position')
+}
+
+# Column types of the DataFrames built by to_dataframe. Integers get the narrowest type that fits
+# the field, and are widened if a value doesn't fit anyway; the capitalized types are nullable.
+# Other fields are left for pandas to infer.
+PROFILE_DTYPES = {
+    'player_id': 'int32',
+    'position': 'category',
+    'height': 'Int8',
+    'weight': 'Int16',
+    'current_team': 'category',
+    'birth_date': 'datetime',
+    'death_date': 'datetime',
+    'college': 'category',
+    'draft_team': 'category',
+    'draft_round': 'Int8',
+    'draft_position': 'Int16',
+    'draft_year': 'Int16',
+    'current_salary': 'Int32',
+    'hof_induction_year': 'Int16'
+}
+GAME_DTYPES = {
+    'player_id': 'int32',
+    'year': 'int16',
+    'date': 'datetime',
+    'game_number': 'Int8',
+    'age': 'Int16',
+    'team': 'category',
+    'game_location': 'category',
+    'opponent': 'category',
+    'game_won': 'boolean',
+    'player_team_score': 'int8',
+    'opponent_score': 'int8',
+    'passing_rating': 'float32',
+    'defense_sacks': 'float32'
+}
+# Every other game stat is a count or a number of yards
+GAME_STAT_DTYPE = 'int16'
+
+
+def latest_condensed_file(record_type='games', directory='.'):
+    """Find the most recently condensed file of a type
+
+        Args:
+            - record_type (str): 'games' or 'profiles'
+            - directory (str): Directory the condense step wrote to
+
+        Returns:
+            - path (str): The file, or None if nothing has been condensed
+    """
+    paths = glob.glob(os.path.join(directory, '{}_*.json'.format(record_type)))
+    if not paths:
+        return None
+    # Named after the time they were condensed
+    return max(paths, key=lambda path: float(os.path.basename(path)[len(record_type) + 1:-len('.json')]))
+
+
+class CondensedFile():
+    """A condensed profiles or games file and its index"""
+
+    def __init__(self, path, index_path=None):
+        """
+            Args:
+                - path (str): The condensed file
+                - index_path (str): Its index, by default the file's path with .idx appended
+
+            Returns:
+                None
+        """
+        self.path = path
+        self.index_path = path + '.idx' if index_path is None else index_path
+        self._index = None
+
+    @property
+    def index(self):
+        """Map of every player ID to the byte offset and length of their records, and their number of records"""
+        if self._index is None:
+            with open(self.index_path, 'r') as fin:
+                self._index = {int(player_id): entry for player_id, entry in json.load(fin).items()}
+        return self._index
+
+    def player_ids(self):
+        """Get the IDs of the players in the file, in the order they are in the file"""
+        return list(self.index)
+
+    def read_player(self, player_id):
+        """Read the records of one player, without parsing the rest of the file
+
+            Args:
+                - player_id (int): The player
+
+            Returns:
+                - records (dict[]): The player's records in file order, empty if they aren't in the file
+        """
+        entry = self.index.get(int(player_id))
+        if entry is None:
+            return []
+        offset, length = entry[0], entry[1]
+        with open(self.path, 'rb') as fin:
+            fin.seek(offset)
+            return json.loads(b'[' + fin.read(length) + b']')
+
+    @property
+    def indexed(self):
+        """Whether the file has an index, which files condensed before it was added don't"""
+        return self._index is not None or os.path.exists(self.index_path)
+
+    def read_players(self, player_ids, filters=None):
+        """Read the records of several players, seeking past everyone else
+
+            Args:
+                - player_ids (int[]): The players
+                - filters (dict): Set of allowed values of each field, see matching_records
+
+            Yields:
+                - record (dict): The matching records, in file order
+        """
+        ranges = sorted(self.index[player_id][:2] for player_id in set(player_ids) if player_id in self.index)
+        with open(self.path, 'rb') as fin:
+            for offset, length in ranges:
+                fin.seek(offset)
+                for record in matching_records(fin.read(length).split(b',\n'), filters):
+                    yield record
+
+    def scan(self, filters=None):
+        """Stream the records matching filters, see matching_records"""
+        if not self.indexed:
+            # Written as a single line, so there is nothing to stream
+            with open(self.path, 'rb') as fin:
+                records = json.load(fin)
+            for record in records:
+                if matches(record, filters):
+                    yield record
+            return
+        with open(self.path, 'rb') as fin:
+            for record in matching_records(fin, filters):
+                yield record
+
+    def __iter__(self):
+        """Stream every record in the file, one line at a time"""
+        return self.scan()
+
+    def __len__(self):
+        return sum(entry[2] for entry in self.index.values())
+
+
+def matching_records(lines, filters=None):
+    """Parse the records on lines of JSON that match filters
+
+        A line is only parsed when it contains the JSON of one of the allowed values of every
+        filtered field, so most non-matching records are skipped for the cost of a substring
+        search. That is only done for fields whose allowed values are all ints or strings, which
+        are written one way. A float or bool equal to a value, i.e. 225.0 or True, is written
+        differently, so fields with those are left to the check of the parsed record. Lines
+        holding the brackets of a JSON array, and trailing commas, are skipped.
+
+        Args:
+            - lines (iterator): Lines of JSON, as bytes
+            - filters (dict): Set of allowed values of each field. None to keep every record.
+
+        Yields:
+            - record (dict): The matching records
+    """
+    needles = [[json.dumps({field: value})[1:-1].encode('utf-8') for value in values]
+               for field, values in (filters or {}).items() if all(has_one_encoding(value) for value in values)]
+    for line in lines:
+        line = line.strip()
+        if line.endswith(b','):
+            line = line[:-1]
+        if line in (b'[', b']', b''):
+            continue
+        if not all(any(needle in line for needle in field_needles) for field_needles in needles):
+            continue
+        record = json.loads(line)
+        if matches(record, filters):
+            yield record
+
+
+def has_one_encoding(value):
+    """Check whether every value equal to value is written as the same JSON, see matching_records"""
+    return isinstance(value, str) or (isinstance(value, int) and not isinstance(value, bool))
+
+
+def matches(record, filters=None):
+    """Check a record against a set of allowed values for each field"""
+    return all(record.get(field) in values for field, values in (filters or {}).items())
+
+
+def to_value_set(value):
+    """Turn a filter value, which may be a single value or a collection of them, into a set"""
+    if isinstance(value, (str, bytes, int, float)):
+        return {value}
+    return set(value)
+
+
+class CondensedSource():
+    """The latest condensed profiles and games files. A filter on player_id is looked up in the index."""
+
+    joins_positions = False
+
+    def __init__(self, directory='.'):
+        self.files = {}
+        for record_type in ('profiles', 'games'):
+            path = latest_condensed_file(record_type, directory)
+            self.files[record_type] = None if path is None else CondensedFile(path)
+
+    @classmethod
+    def exists(cls, directory='.'):
+        return latest_condensed_file('games', directory) is not None
+
+    def scan(self, record_type, filters, columns):
+        condensed_file = self.files[record_type]
+        if condensed_file is None:
+            raise FileNotFoundError('No {} have been condensed'.format(record_type))
+        filters = dict(filters)
+        if 'player_id' in filters and condensed_file.indexed:
+            records = condensed_file.read_players(filters.pop('player_id'), filters)
+        else:
+            records = condensed_file.scan(filters)
+        return project(records, columns)
+
+
+class NdjsonSource():
+    """The profiles.ndjson and games.ndjson files written by NdjsonSink, streamed a line at a time"""
+
+    joins_positions = False
+
+    def __init__(self, directory='.'):
+        self.paths = {record_type: os.path.join(directory, name) for record_type, name in NDJSON_FILES.items()}
+
+    @classmethod
+    def exists(cls, directory='.'):
+        return os.path.exists(os.path.join(directory, NDJSON_FILES['games']))
+
+    def scan(self, record_type, filters, columns):
+        with open(self.paths[record_type], 'rb') as fin:
+            for record in project(matching_records(fin, filters), columns):
+                yield record
+
+
+class SqliteSource():
+    """The database written by SqliteSink. Filters become the WHERE clause and columns the SELECT list."""
+
+    def __init__(self, directory='.'):
+        self.path = os.path.join(directory, SQLITE_DB)
+
+    @classmethod
+    def exists(cls, directory='.'):
+        return os.path.exists(os.path.join(directory, SQLITE_DB))
+
+    # Games are filtered on position with a subquery on profiles, instead of a list of player IDs
+    joins_positions = True
+
+    def scan(self, record_type, filters, columns):
+        for column in list(filters) + list(columns or []):
+            if re.match(r'^[a-z_]+$', column) is None:
+                raise ValueError('{} is not a column'.format(column))
+        connection = sqlite3.connect(self.path)
+        connection.row_factory = sqlite3.Row
+        try:
+            conditions = []
+            for field, values in filters.items():
+                # Through a temporary table, since there may be more values than SQLite allows parameters
+                table = 'filter_{}'.format(field)
+                connection.execute('CREATE TEMP TABLE {} (value PRIMARY KEY)'.format(table))
+                connection.executemany('INSERT INTO {} VALUES (?)'.format(table), [(value,) for value in values])
+                if record_type == 'games' and field == 'position':
+                    conditions.append('player_id IN (SELECT player_id FROM profiles WHERE position IN '
+                                      '(SELECT value FROM {}))'.format(table))
+                else:
+                    conditions.append('{} IN (SELECT value FROM {})'.format(field, table))
+            query = 'SELECT {} FROM {}'.format(', '.join(columns) if columns else '*', record_type)
+            if conditions:
+                query += ' WHERE ' + ' AND '.join(conditions)
+            for row in connection.execute(query):
+                yield dict(row)
+        finally:
+            connection.close()
+
+
+def to_dataframe(records, record_type='games', columns=None):
+    """Build a DataFrame from scraped records, with the column types of PROFILE_DTYPES or GAME_DTYPES
+
+        Args:
+            - records (dict[]): Profiles or games
+            - record_type (str): 'profiles' or 'games'
+            - columns (str[]): Columns of the frame. Defaults to the fields of the first record.
+
+        Returns:
+            - frame (DataFrame): One row per record
+    """
+    import pandas
+    records = list(records)
+    if columns is None:
+        columns = list(records[0]) if records else []
+    data = collections.OrderedDict()
+    for column in columns:
+        if record_type == 'profiles':
+            dtype = PROFILE_DTYPES.get(column)
+        else:
+            dtype = GAME_DTYPES.get(column, None if column == 'game_id' else GAME_STAT_DTYPE)
+        data[column] = make_column([record.get(column) for record in records], dtype)
+    return pandas.DataFrame(data, columns=columns)
+
+
+def make_column(values, dtype):
+    """Build a column of a DataFrame from a list of values, see to_dataframe"""
+    import numpy
+    import pandas
+    if dtype == 'category':
+        return pandas.Categorical(values)
+    if dtype == 'datetime':
+        return pandas.to_datetime(values)
+    if dtype == 'boolean':
+        return pandas.array(values, dtype='boolean')
+    if dtype == 'float32':
+        return pandas.array(values, dtype='Float64').to_numpy(dtype='float32', na_value=numpy.nan)
+    if dtype is None or not dtype.lower().startswith('int'):
+        return values
+    column = pandas.array(values, dtype='Int64')
+    nullable = dtype.startswith('I') or bool(column.isna().any())
+    minimum, maximum = (column.min(), column.max()) if len(column) and not column.isna().all() else (0, 0)
+    bits = int(dtype.lower()[3:])
+    while bits < 64 and not numpy.iinfo('int{}'.format(bits)).min <= minimum <= maximum <= \
+            numpy.iinfo('int{}'.format(bits)).max:
+        bits *= 2
+    return column.astype('{}{}'.format('Int' if nullable else 'int', bits))
+
+
+def iter_dataframes(records, record_type='games', chunk_size=100000, columns=None):
+    """Build DataFrames from scraped records chunk_size records at a time, see to_dataframe
+
+        Yields:
+            - frame (DataFrame): The next chunk_size records
+    """
+    chunk = []
+    num_frames = 0
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield to_dataframe(chunk, record_type, columns)
+            num_frames += 1
+            chunk = []
+    if chunk or num_frames == 0:
+        yield to_dataframe(chunk, record_type, columns)
+
+
+def load_dataframe(records, record_type='games', chunk_size=100000, columns=None):
+    """Build one DataFrame from scraped records, a chunk at a time so the records are never all in memory
+
+        Categorical columns stay categorical, with the categories of every chunk.
+
+        Returns:
+            - frame (DataFrame): One row per record
+    """
+    import pandas
+    from pandas.api.types import union_categoricals
+    frames = list(iter_dataframes(records, record_type, chunk_size, columns))
+    if len(frames) == 1:
+        return frames[0]
+    data = collections.OrderedDict()
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pandas.CategoricalDtype):
+            data[column] = union_categoricals([frame[column] for frame in frames])
+        else:
+            data[column] = pandas.concat([frame[column] for frame in frames], ignore_index=True)
+        for frame in frames:
+            del frame[column]
+    return pandas.DataFrame(data, columns=list(data))
+
+
+def project(records, columns):
+    """Keep only the columns of every record, or every column if columns is None"""
+    if columns is None:
+        return records
+    return ({column: record.get(column) for column in columns} for record in records)
+
+
+class Dataset():
+    """Lazy, filtered and projected view of the scraped profiles or games
+
+    Nothing is read until the dataset is iterated, and every iteration reads the storage again.
+    filter and select return new datasets, so they can be chained and reused.
+    """
+
+    SOURCES = (CondensedSource, SqliteSource, NdjsonSource)
+
+    def __init__(self, source, record_type='games', filters=None, columns=None):
+        """
+            Args:
+                - source (obj): Storage to read, i.e. a CondensedSource
+                - record_type (str): 'games' or 'profiles'
+                - filters (dict): Set of allowed values of each field
+                - columns (str[]): Columns to keep. None for every column.
+
+            Returns:
+                None
+        """
+        if record_type not in FILTER_FIELDS:
+            raise ValueError('Unknown record type {}'.format(record_type))
+        self.source = source
+        self.record_type = record_type
+        self.filters = filters or {}
+        self.columns = columns
+
+    @classmethod
+    def open(cls, directory='.', record_type='games'):
+        """Open the output in a directory, preferring the condensed files, then SQLite, then NDJSON
+
+            Raises:
+                - FileNotFoundError: There is no output in the directory
+        """
+        for source in cls.SOURCES:
+            if source.exists(directory):
+                return cls(source(directory), record_type)
+        raise FileNotFoundError('No scraped data in {}'.format(directory))
+
+    def filter(self, **filters):
+        """Narrow the dataset down, to a value or to any of a collection of values of each field
+
+            Args:
+                - player_id (int or int[]): The players
+                - year (int or int[]): The seasons, i.e. range(2015, 2018). Games only.
+                - team (str or str[]): The teams the players played for. Games only.
+                - position (str or str[]): The players' positions, from their profiles
+
+            Returns:
+                - dataset (Dataset): The records of this dataset that match every filter
+        """
+        narrowed = dict(self.filters)
+        for field, value in filters.items():
+            if field not in FILTER_FIELDS[self.record_type]:
+                raise ValueError('{} can\'t be filtered on {}'.format(self.record_type, field))
+            values = to_value_set(value)
+            narrowed[field] = narrowed[field] & values if field in narrowed else values
+        return Dataset(self.source, self.record_type, narrowed, self.columns)
+
+    def select(self, *columns):
+        """Keep only some columns of every record
+
+            Returns:
+                - dataset (Dataset): This dataset's records with just those columns
+        """
+        return Dataset(self.source, self.record_type, self.filters, list(columns))
+
+    def to_dataframe(self, chunk_size=100000):
+        """Load the dataset into a pandas DataFrame with compact column types, see load_dataframe"""
+        return load_dataframe(self, self.record_type, chunk_size, self.columns)
+
+    def iter_dataframes(self, chunk_size=100000):
+        """Load the dataset into pandas DataFrames of chunk_size rows, see iter_dataframes"""
+        return iter_dataframes(self, self.record_type, chunk_size, self.columns)
+
+    def __iter__(self):
+        filters = dict(self.filters)
+        if self.record_type == 'games' and 'position' in filters and not self.source.joins_positions:
+            # Games have no position, so look up the players who play it first
+            player_ids = set(profile['player_id'] for profile in self.source.scan(
+                'profiles', {'position': filters.pop('position')}, ['player_id']))
+            filters['player_id'] = filters['player_id'] & player_ids if 'player_id' in filters else player_ids
+        if 'player_id' in filters and not filters['player_id']:
+            return iter([])
+        return iter(self.source.scan(self.record_type, filters, self.columns))
@@ -2,6 +2,16 @@ import argparse
 import json
 
 def json_to_fixture(input_file, app, model, primary_key, output_file):
+    """Turn a condensed JSON file into a Django fixture
+
+        Args:
+            - primary_key (str): Field of the records holding the model's primary key, or None
+              for models whose primary key the database assigns, i.e. Game, whose fixtures then
+              leave pk out
+
+        Returns:
+            None
+    """
     with open(input_file, 'r') as f:
         json_data = json.load(f)
 
@@ -9,7 +19,8 @@ def json_to_fixture(input_file, app, model, primary_key, output_file):
     for instance in json_data:
         new_data = dict()
         new_data['model'] = '{}.{}'.format(app, model.lower())
-        new_data['pk'] = instance[primary_key]
+        if primary_key is not None:
+            new_data['pk'] = instance[primary_key]
         new_data['fields'] = instance
         fixture.append(new_data)
 
@@ -21,7 +32,9 @@ if __name__ == '__main__':
     parser.add_argument('input', help='Input file')
     parser.add_argument('app', help='Name of django app')
     parser.add_argument('model', help='Name of django model')
-    parser.add_argument('primary_key', help='Model field containing primary_key')
+    parser.add_argument('primary_key', nargs='?', default=None,
+                        help=('Model field containing primary_key. Leave it out for Game, whose primary key '
+                              'the database assigns.'))
     parser.add_argument('output', help='Output file')
     args = parser.parse_args()
 
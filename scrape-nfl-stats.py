@@ -1,189 +1,2594 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
 from bs4 import BeautifulSoup
 from multiprocessing.dummy import Pool
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import threading
 import time
 import shutil
 import re
+import datetime
 import os
 import json
 import string
 import glob
+import sqlite3
+import hashlib
+import socket
+import argparse
+import cProfile
+import pstats
+import bisect
+import collections
+import queue
+import heapq
+import tempfile
+import traceback
+import zlib
+
+SITE_URL = 'https://www.pro-football-reference.com'
+BASE_URL = SITE_URL + '{0}'
+PLAYER_LIST_URL = SITE_URL + '/players/{0}'
+PLAYER_PROFILE_URL = SITE_URL + '/players/{0}/{1}'
+PLAYER_GAMELOG_URL = SITE_URL + '/players/{0}/{1}/gamelog/{2}'
+SEASON_SCHEDULE_URL = SITE_URL + '/years/{0}/games.htm'
 
-BASE_URL = 'https://www.pro-football-reference.com{0}'
-PLAYER_LIST_URL = 'https://www.pro-football-reference.com/players/{0}'
-PLAYER_PROFILE_URL = 'https://www.pro-football-reference.com/players/{0}/{1}'
-PLAYER_GAMELOG_URL = 'https://www.pro-football-reference.com/players/{0}/{1}/gamelog/{2}'
+HEADERS = {
+    'user-agent': ('Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/48.0.2564.109 Safari/537.36'),
+    # gzip and deflate, and brotli when the brotli package is installed
+    'accept-encoding': ACCEPT_ENCODING
+}
+# Seconds to wait for a connection, and for the site to send data
+REQUEST_TIMEOUT = (10, 30)
+
+PROFILE_DIR = 'profile_data'
+STATS_DIR = 'stats_data'
+TEAM_STATS_DIR = 'team_stats_data'
+QUEUE_DB = 'player_queue.sqlite3'
+SEGMENTS_DIR = 'segments'
+LOCAL_WORKER_ID = 'local'
+NUM_SHARD_BUCKETS = 1024
+METRICS_FILE = 'scrape_metrics'
+CHANGE_INDEX_DB = 'change_index.sqlite3'
+PAGE_STORE_DB = 'page_store.sqlite3'
+ROW_INDEX_DB = 'row_index.sqlite3'
+# Number of games sorted in memory at a time when condensing, before they are merged from disk
+CONDENSE_RUN_SIZE = 200000
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+# Fetching threads of the command line scraper, the most requests it ever has in flight
+MAX_JOBS = 16
+# Requests in flight when the concurrency limit is tuned, before it has seen any response
+INITIAL_CONCURRENCY = 4
+# How much slower than their usual latency responses can get before the concurrency limit backs off
+LATENCY_TOLERANCE = 2.0
+# Seconds over which the usual latency catches up with responses that got slower
+LATENCY_ADAPT_SECONDS = 600
+# Fraction of the concurrency limit kept after a timeout, throttling or server error
+CONCURRENCY_BACKOFF = 0.5
+# Number of concurrency limit changes kept in the metrics
+CONCURRENCY_HISTORY_SIZE = 1000
+
+# Game stat fields, the data-stat of the cells they are read from on gamelog and boxscore pages,
+# and their types
+GAME_STAT_COLUMNS = [
+    ('passing_attempts', 'pass_cmp', int),
+    ('passing_completions', 'pass_att', int),
+    ('passing_yards', 'pass_yds', int),
+    ('passing_touchdowns', 'pass_td', int),
+    ('passing_interceptions', 'pass_int', int),
+    ('passing_rating', 'pass_rating', float),
+    ('passing_sacks', 'pass_sacked', int),
+    ('passing_sacks_yards_lost', 'pass_sacked_yds', int),
+    ('rushing_attempts', 'rush_att', int),
+    ('rushing_yards', 'rush_yds', int),
+    ('rushing_touchdowns', 'rush_td', int),
+    ('receiving_targets', 'targets', int),
+    ('receiving_receptions', 'rec', int),
+    ('receiving_yards', 'rec_yds', int),
+    ('receiving_touchdowns', 'rec_td', int),
+    ('kick_return_attempts', 'kick_ret', int),
+    ('kick_return_yards', 'kick_ret_yds', int),
+    ('kick_return_touchdowns', 'kick_ret_td', int),
+    ('punt_return_attempts', 'punt_ret', int),
+    ('punt_return_yards', 'punt_ret_yds', int),
+    ('punt_return_touchdowns', 'punt_ret_td', int),
+    ('defense_sacks', 'sacks', float),
+    ('defense_tackles', 'tackles_solo', int),
+    ('defense_tackle_assists', 'tackles_assists', int),
+    ('defense_interceptions', 'def_int', int),
+    ('defense_interception_yards', 'def_int_yds', int),
+    ('defense_interception_touchdowns', 'def_int_td', int),
+    ('defense_safeties', 'safety_md', int),
+    ('point_after_attemps', 'xpm', int),
+    ('point_after_makes', 'xpa', int),
+    ('field_goal_attempts', 'fga', int),
+    ('field_goal_makes', 'fgm', int),
+    ('punting_attempts', 'punt', int),
+    ('punting_yards', 'punt_yds', int),
+    ('punting_blocked', 'punt_blocked', int)
+]
+
+# Boxscore tables with a row per player
+BOXSCORE_PLAYER_TABLES = ['player_offense', 'player_defense', 'returns', 'kicking']
+
+# Team stat fields read from a boxscore's team stats table, by the label of the row they are in.
+# Rows with several numbers, i.e. Rush-Yds-TDs, fill a field per number.
+TEAM_STAT_ROWS = [
+    ('First Downs', ['first_downs']),
+    ('Rush-Yds-TDs', ['rushing_attempts', 'rushing_yards', 'rushing_touchdowns']),
+    ('Cmp-Att-Yd-TD-INT', ['passing_completions', 'passing_attempts', 'passing_yards', 'passing_touchdowns',
+                           'passing_interceptions']),
+    ('Sacked-Yards', ['passing_sacks', 'passing_sacks_yards_lost']),
+    ('Net Pass Yards', ['net_passing_yards']),
+    ('Total Yards', ['total_yards']),
+    ('Fumbles-Lost', ['fumbles', 'fumbles_lost']),
+    ('Turnovers', ['turnovers']),
+    ('Penalties-Yards', ['penalties', 'penalty_yards']),
+    ('Third Down Conv.', ['third_down_conversions', 'third_down_attempts']),
+    ('Fourth Down Conv.', ['fourth_down_conversions', 'fourth_down_attempts']),
+    ('Time of Possession', ['time_of_possession'])
+]
+
+class Scraper():
+    """Scraper for pro-football-reference.com to collect NFL player stats"""
+
+    def __init__(self, letters_to_scrape=['A'], num_jobs=1, clear_old_data=True, first_player_id=1,
+                 min_year=None, max_year=None, positions=None, parse_jobs=0, parse_queue_size=None,
+                 queue_path=QUEUE_DB, output_dir='.', metrics_path=METRICS_FILE, metrics_interval=60,
+                 profile_path=None, site_url=SITE_URL, html_parser='html.parser', max_retries=3, retry_backoff=1.0,
+                 crawl_mode='players', request_timeout=REQUEST_TIMEOUT, page_store_path=PAGE_STORE_DB,
+                 cache_pages=False, adaptive_concurrency=False, initial_concurrency=INITIAL_CONCURRENCY,
+                 dedup=False, row_index_path=None):
+        """Initialize the scraper to get player stats
+
+                Args:
+                    - letters_to_scrape (str[]): The site sorts players by the first letter of their
+                      last name. This array tells the scraper which letters to scrape data for.
+                    - num_jobs (int): Number of threads fetching pages concurrently. Threads only
+                      help with time spent waiting for the server to respond; parsing is CPU bound,
+                      see parse_jobs. With adaptive_concurrency, the most requests ever in flight.
+                    - clear_old_data (boolean): Whether or not the data file should be wiped before
+                      starting the scrape.
+                    - first_player_id (int): The first ID for a player (set if you are rerunning to avoid duplicates)
+                    - min_year (int): Only scrape players, and seasons, from this year on. None for no limit.
+                    - max_year (int): Only scrape players, and seasons, up to this year. None for no limit.
+                    - positions (str[]): Only scrape players who played one of these positions (i.e. ['QB', 'RB']).
+                      None to scrape every position.
+                    - parse_jobs (int): Number of worker processes parsing fetched pages. With 0, pages
+                      are parsed by the thread that fetched them.
+                    - parse_queue_size (int): Maximum number of fetched pages waiting to be parsed.
+                      Fetching threads block once it is reached. Defaults to twice parse_jobs.
+                    - queue_path (str): SQLite file holding the work queue. Every worker of a
+                      distributed crawl must point at the same file.
+                    - output_dir (str): Directory the profile and stats directories are written to.
+                    - metrics_path (str): Path, without extension, the scrape metrics are written to as
+                      JSON and in the Prometheus text format, relative to output_dir. None to only print
+                      the summary.
+                    - metrics_interval (int): Seconds between metrics summaries while scraping.
+                    - profile_path (str): When set, scrape_site runs under cProfile and the stats are
+                      dumped here for pstats or snakeviz. The fetching threads and the parse processes
+                      are profiled too, and merged into the same stats.
+                    - site_url (str): Root the site is fetched from, i.e. a local mirror for benchmarks.
+                    - html_parser (str): Parser BeautifulSoup uses, i.e. 'html.parser' or 'lxml'.
+                    - max_retries (int): Number of times a failed request is retried.
+                    - retry_backoff (float): Seconds to wait before the first retry, doubling for every
+                      retry after. A Retry-After header from the site takes precedence.
+                    - crawl_mode (str): 'players' fetches every player's gamelog for each of their seasons.
+                      'boxscores' fetches each game's boxscore once instead and needs min_year and max_year,
+                      see run_boxscore_crawl.
+                    - request_timeout (float or tuple): Seconds to wait for a connection and for a response,
+                      as passed to requests.
+                    - page_store_path (str): SQLite file the pages of players and boxscores that fail to
+                      scrape are quarantined in, for reparse.
+                    - cache_pages (boolean): Whether every page of every player and boxscore is kept in the
+                      page store, not just the ones that failed, so that all of them can be reparsed.
+                    - adaptive_concurrency (boolean): Whether the number of requests in flight is tuned
+                      between 1 and num_jobs from how fast, and how reliably, the site responds, see
+                      ConcurrencyLimit. Otherwise every thread fetches at once.
+                    - initial_concurrency (int): Requests in flight at the start, with adaptive_concurrency.
+                    - dedup (boolean): Whether rows are checked against the rows already written out
+                      before writing them, see write_records, and players keep the IDs they were written
+                      under when they are discovered again.
+                    - row_index_path (str): SQLite file the rows written out are indexed in, with dedup.
+                      Defaults to ROW_INDEX_DB in output_dir, next to the output it describes.
+
+                Returns:
+                    None
+        """
+        self.letters_to_scrape = [letter.upper() for letter in letters_to_scrape]
+        self.num_jobs = num_jobs
+        self.clear_old_data = clear_old_data
+        # Every thread has its own session, since sessions aren't thread safe, but they share one
+        # pool of kept alive connections sized for all of the threads
+        self.http_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(num_jobs, 1), max_retries=0)
+        self.thread_sessions = threading.local()
+        self.request_timeout = request_timeout
+        self.start_time = time.time()
+        if metrics_path is not None:
+            metrics_path = os.path.join(output_dir, metrics_path)
+        self.metrics = ScrapeMetrics(self.start_time, metrics_path)
+        self.concurrency = ConcurrencyLimit(num_jobs, initial_concurrency, adaptive=adaptive_concurrency,
+                                            on_change=self.metrics.record_concurrency)
+        self.metrics_interval = metrics_interval
+        self.profile_path = profile_path
+        self.profile_stats = None
+        self.profile_lock = threading.Lock()
+        self.site_url = site_url
+        self.html_parser = html_parser
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        if crawl_mode not in ('players', 'boxscores'):
+            raise ValueError('Unknown crawl mode {}'.format(crawl_mode))
+        if crawl_mode == 'boxscores' and (min_year is None or max_year is None):
+            raise ValueError('The boxscore crawl needs min_year and max_year')
+        self.crawl_mode = crawl_mode
+        self.cross_process_player_count = 0
+        self.first_player_id = first_player_id
+        self.min_year = min_year
+        self.max_year = max_year
+        self.positions = None if positions is None else [position.upper() for position in positions]
+        self.work_queue = WorkQueue(queue_path)
+        self.page_store = PageStore(page_store_path)
+        self.cache_pages = cache_pages
+        # Set while reparsing, so pages are read from the page store instead of the site
+        self.offline = False
+        self.row_index = None
+        if dedup:
+            if row_index_path is None:
+                os.makedirs(output_dir, exist_ok=True)
+                row_index_path = os.path.join(output_dir, ROW_INDEX_DB)
+            self.row_index = RowIndex(row_index_path)
+        self.player_slugs = {}
+        self.output_dir = output_dir
+        self.profile_dir = os.path.join(output_dir, PROFILE_DIR)
+        self.stats_dir = os.path.join(output_dir, STATS_DIR)
+
+        if num_jobs > 1:
+            self.multiprocessing = True
+            self.worker_pool = Pool(num_jobs)
+        else:
+            self.multiprocessing = False
+
+        self.parse_jobs = parse_jobs
+        self.parse_pool = None
+        self.parse_slots = threading.BoundedSemaphore(parse_queue_size or max(parse_jobs, 1) * 2)
+
+    def scrape_site(self, sinks=None):
+        """Discover all players up front, then pool workers over a single queue of profiles
+
+            Args:
+                - sinks (RecordSink[]): Where to write the scraped records. By default they are
+                  saved as files and condensed once the scrape finishes.
+
+            Returns:
+                None
+        """
+        if self.profile_path is not None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(self.crawl, sinks)
+            finally:
+                profiler.create_stats()
+                self.add_profile_stats(profiler.stats)
+                self.profile_stats.dump_stats(self.profile_path)
+        else:
+            self.crawl(sinks)
+
+    def add_profile_stats(self, stats):
+        """Merge the cProfile stats of a thread or parse process into the scrape's profile
+
+            Args:
+                - stats (dict): The stats attribute of a cProfile.Profile after create_stats()
+
+            Returns:
+                None
+        """
+        with self.profile_lock:
+            if self.profile_stats is None:
+                self.profile_stats = pstats.Stats(ProfileStats(stats))
+            else:
+                self.profile_stats.add(ProfileStats(stats))
+
+    def run_in_thread_profiler(self, func, *args):
+        """Call a function from a worker thread, profiling it when the scrape is being profiled
+
+            cProfile only sees the thread it was enabled in, so every worker thread gets its own
+            profiler, whose stats are merged into the scrape's profile.
+
+            Returns:
+                - result (obj): The return value of func
+        """
+        if self.profile_path is None:
+            return func(*args)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args)
+        finally:
+            profiler.disable()
+            profiler.create_stats()
+            self.add_profile_stats(profiler.stats)
+
+    def crawl(self, sinks=None):
+        """Run every stage of the scrape"""
+        try:
+            if self.clear_old_data:
+                self.clear_data()
+            self.discover_players()
+            if self.crawl_mode == 'boxscores':
+                self.run_boxscore_crawl(sinks)
+            else:
+                self.run_worker(sinks=sinks)
+            if sinks is None:
+                self.condense_data()
+        finally:
+            self.close_parse_pool()
+
+    def open_parse_pool(self):
+        """Start the parse worker processes, if there are any and they aren't running yet
+
+            The processes are all started here, before any page is parsed, so they aren't forked
+            from a fetching thread while other threads might be holding locks.
+        """
+        if self.parse_jobs > 0 and self.parse_pool is None:
+            self.parse_pool = ProcessPoolExecutor(self.parse_jobs)
+            self.parse_pool.submit(int).result()
+
+    def close_parse_pool(self):
+        """Shut the parse worker processes down"""
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(cancel_futures=True)
+            self.parse_pool = None
+
+    def discover_players(self):
+        """Fetch every letter's player list concurrently and add the profiles to the work queue
+
+            The queue is durable, so an interrupted crawl can resume without rediscovering
+            players and player IDs stay stable between runs. Players outside of the year range
+            or positions being scraped are left out of the queue entirely. Discovery is skipped
+            when the queue was already built with the same filters.
+
+            Returns:
+                None
+        """
+        queue_filters = {
+            'letters': self.letters_to_scrape,
+            'min_year': self.min_year,
+            'max_year': self.max_year,
+            'positions': self.positions
+        }
+        if self.work_queue.get_filters() == queue_filters:
+            return
+        self.work_queue.reset()
+
+        print('Discovering players for {} letters...'.format(len(self.letters_to_scrape)))
+        work_queue = []
+        num_discovered = 0
+        for players in self.map_jobs(self.get_players_for_letter, self.letters_to_scrape):
+            num_discovered += len(players)
+            work_queue += [player for player in players if self.player_matches_filters(player)]
+        print('{} of {} players match the filters'.format(len(work_queue), num_discovered))
+        known_ids = None if self.row_index is None else self.row_index.get_player_ids()
+        self.work_queue.enqueue(work_queue, self.first_player_id, known_ids)
+        self.work_queue.set_filters(queue_filters)
+
+    def run_worker(self, worker_id=LOCAL_WORKER_ID, shard=None, num_shards=1, sinks=None):
+        """Claim players from the work queue and scrape them until the queue is drained
+
+            Args:
+                - worker_id (str): Name the worker's leases are held under
+                - shard (int): Only claim players in this shard, from 0 to num_shards - 1.
+                  None to claim from every shard.
+                - num_shards (int): Number of shards the queue is split into
+                - sinks (RecordSink[]): Where to write the scraped records. Defaults to saving
+                  them as files in the output directory.
+
+            Returns:
+                None
+        """
+        if sinks is None:
+            sinks = [FileSink(self.output_dir)]
+        player = {'profile': None, 'games': []}
+
+        def write_player():
+            self.write_records(sinks, player['profile'], player['games'])
+            player['games'] = []
+
+        try:
+            for record_type, record in self.iter_records(worker_id, shard, num_shards, write_player):
+                if record_type == 'profile':
+                    player['profile'] = record
+                else:
+                    player['games'].append(record)
+        finally:
+            for sink in sinks:
+                sink.close()
+
+    def iter_records(self, worker_id=LOCAL_WORKER_ID, shard=None, num_shards=1, before_complete=None):
+        """Scrape players from the work queue, yielding their records as each player finishes
+
+            Workers claim and scrape players in the background while the caller consumes the
+            records, so at most one career per worker is held in memory. A player's records are
+            only handed over once every page of theirs has been parsed, so a player that fails
+            part way through and is retried never produces duplicate records. Each profile comes
+            before that player's games.
+
+            Any players this worker still had leased from a previous run are put back first. When
+            the caller stops early, the players still being scraped are put back too, without
+            counting the attempt.
+
+            Args:
+                - worker_id (str): Name the worker's leases are held under
+                - shard (int): Only claim players in this shard, from 0 to num_shards - 1.
+                  None to claim from every shard.
+                - num_shards (int): Number of shards the queue is split into
+                - before_complete (function): Called after the last record of a player has been
+                  consumed and before the player is marked done, i.e. to flush sinks to disk
+
+            Yields:
+                - record_type (str): 'profile' or 'game'
+                - record (dict): The profile, or the stats for one game
+        """
+        self.work_queue.register_worker(worker_id)
+        self.work_queue.release(worker_id)
+        print('{} players left to scrape'.format(self.work_queue.count_remaining()))
+        self.open_parse_pool()
+        self.metrics.start_reporting(self.metrics_interval)
+        finished_players = queue.Queue(maxsize=self.num_jobs * 2)
+        stop_workers = threading.Event()
+        workers_done = object()
+
+        def emit(item):
+            while not stop_workers.is_set():
+                try:
+                    finished_players.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scrape_players():
+            while not stop_workers.is_set():
+                queue_item = self.work_queue.claim(worker_id, shard, num_shards)
+                if queue_item is None:
+                    return
+                try:
+                    profile, game_stats = self.scrape_player(queue_item)
+                except (KeyboardInterrupt, SystemExit, BrokenProcessPool):
+                    # A dead parse pool would fail every player after this one, so stop the
+                    # worker instead. Its leases are put back when it is restarted.
+                    raise
+                except Exception as e:
+                    if stop_workers.is_set():
+                        # The parse pool was shut down under the player because the caller
+                        # stopped, which isn't the player's fault
+                        self.work_queue.release(worker_id, queue_item['player_id'])
+                        return
+                    print('There was a problem parsing stats for {}'.format(queue_item['profile_url']))
+                    self.metrics.record_error('scrape', e)
+                    self.work_queue.fail(queue_item['player_id'], worker_id, repr(e))
+                    continue
+                if not emit((queue_item['player_id'], profile, game_stats)):
+                    # The caller stopped consuming records, so put the player back for the next run
+                    self.work_queue.release(worker_id, queue_item['player_id'])
+                    return
+
+        def renew_leases():
+            while not stop_workers.wait(self.work_queue.lease_seconds / 4):
+                self.work_queue.renew(worker_id)
+
+        def run_workers():
+            try:
+                for _ in self.map_jobs(lambda _: self.run_in_thread_profiler(scrape_players), range(self.num_jobs),
+                                       ordered=False):
+                    pass
+            except BaseException as e:
+                emit(e)
+            finally:
+                emit(workers_done)
+
+        threading.Thread(target=renew_leases, daemon=True).start()
+        threading.Thread(target=run_workers, daemon=True).start()
+        player_id = None
+        try:
+            while True:
+                item = finished_players.get()
+                if item is workers_done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                player_id, profile, game_stats = item
+                yield 'profile', profile
+                for game in game_stats:
+                    yield 'game', game
+                if before_complete is not None:
+                    before_complete()
+                if not self.work_queue.complete(player_id, worker_id):
+                    print('Lost the lease on player {}, they may also have been scraped by another worker'.format(
+                        player_id))
+                player_id = None
+        finally:
+            stop_workers.set()
+            if player_id is not None:
+                # The caller stopped part way through the player's records
+                self.work_queue.release(worker_id, player_id)
+            self.work_queue.unregister_worker(worker_id)
+            self.close_parse_pool()
+            self.metrics.stop_reporting()
+
+    def run_boxscore_crawl(self, sinks=None):
+        """Scrape every game from min_year to max_year from its boxscore, fetching each game once
+
+            The player crawl fetches a gamelog per player and season, so every game is read once
+            for each player in it. This walks each season's schedule instead and parses every
+            boxscore once, writing a stat line in the make_player_game_stats schema for each
+            player in the game, and a line in the Boxscore.make_team_game_stats schema for each
+            team. Boxscores don't show ages, so age is left empty.
+
+            Players come from the work queue, which gives them their player IDs, so
+            discover_players has to run first and its filters apply. Every player's profile is
+            scraped and written first, see scrape_profiles, and lines are only written for
+            players whose profile was, so no game is ever written without its player.
+
+            Finished players and games are recorded in the work queue, so an interrupted crawl
+            picks up where it left off.
+
+            Args:
+                - sinks (RecordSink[]): Where to write the profiles and game stats. Defaults to
+                  saving them as files in the output directory.
+
+            Returns:
+                None
+        """
+        if sinks is None:
+            sinks = [FileSink(self.output_dir)]
+        self.open_parse_pool()
+        self.metrics.start_reporting(self.metrics_interval)
+        try:
+            self.scrape_profiles(sinks)
+            player_ids = self.work_queue.get_player_ids('done')
+            seasons = range(self.min_year, self.max_year + 1)
+            for games in self.map_jobs(self.get_games_for_season, seasons):
+                self.work_queue.enqueue_boxscores(games)
+            boxscores = self.work_queue.get_pending_boxscores(self.min_year, self.max_year)
+            print('{} boxscores left to scrape'.format(len(boxscores)))
+            unknown_players = set()
+            scrape_boxscore = lambda game: self.run_in_thread_profiler(self.scrape_boxscore, game)
+            for game, lines in self.map_jobs(scrape_boxscore, boxscores, ordered=False):
+                if lines is not None:
+                    self.write_boxscore(game, lines, player_ids, sinks, unknown_players)
+            if unknown_players:
+                print('Skipped {} players without a profile in the work queue'.format(len(unknown_players)))
+        finally:
+            for sink in sinks:
+                sink.close()
+            self.close_parse_pool()
+            self.metrics.stop_reporting()
+
+    def scrape_profiles(self, sinks):
+        """Scrape and write the profile of every player in the work queue who isn't done yet
+
+            The boxscore crawl's first stage. Like a player in the player crawl, a profile is
+            written as a whole player, which replaces any games written for them before, so it
+            is written once, before any of the player's games, and the player is marked done.
+            Players whose profile fails are retried by the next crawl, up to the work queue's
+            max_attempts.
+
+            Args:
+                - sinks (RecordSink[]): Where to write the profiles
+
+            Returns:
+                None
+        """
+        queue_items = self.work_queue.get_pending_players()
+        print('{} player profiles left to scrape'.format(len(queue_items)))
+        scrape_profile = lambda queue_item: self.run_in_thread_profiler(self.scrape_profile, queue_item)
+        for queue_item, profile in self.map_jobs(scrape_profile, queue_items, ordered=False):
+            if profile is not None:
+                self.write_records(sinks, profile, [])
+                self.work_queue.mark_done(queue_item['player_id'])
+
+    def scrape_profile(self, queue_item):
+        """Fetch and parse one player's profile, without their gamelogs, from a worker thread
+
+            Returns:
+                - queue_item (dict): The same player
+                - profile (dict): Player profile data, or None if it couldn't be scraped
+        """
+        player = Player(queue_item['player_id'], queue_item['profile_url'], self)
+        try:
+            player.scrape_profile()
+        except (KeyboardInterrupt, SystemExit, BrokenProcessPool):
+            raise
+        except Exception as e:
+            print('There was a problem parsing the profile {}'.format(queue_item['profile_url']))
+            self.metrics.record_error('scrape', e)
+            self.work_queue.fail_profile(queue_item['player_id'], repr(e))
+            return queue_item, None
+        return queue_item, player.profile
+
+    def write_boxscore(self, game, lines, player_ids, sinks, unknown_players):
+        """Write the stat lines of a scraped boxscore to the sinks and mark the game done
+
+            Args:
+                - game (dict): The game, from the schedule
+                - lines (tuple): The slug and game stats of every player in the game, and the
+                  stats of both teams, see Boxscore.parse_boxscore
+                - player_ids (dict): Player ID of every slug whose profile has been written
+                - sinks (RecordSink[]): Where to write the game stats
+                - unknown_players (set): Slugs of players skipped because their profile wasn't written
+
+            Returns:
+                None
+        """
+        player_lines, team_lines = lines
+        games = []
+        for slug, stats in player_lines:
+            if slug not in player_ids:
+                unknown_players.add(slug)
+                continue
+            stats['player_id'] = player_ids[slug]
+            games.append(stats)
+        self.write_records(sinks, None, games, team_lines)
+        self.work_queue.complete_boxscore(game['game_id'])
+
+    def write_records(self, sinks, profile, games, team_games=()):
+        """Write a player's profile and games, or the lines of a boxscore, to the sinks and flush them
+
+            With dedup, the rows are compared with the rows written before, by slug, game ID and
+            content hash. Nothing is written when none of them changed, so running over players
+            again, or retrying part of a crawl, writes nothing twice. Otherwise, sinks that replace
+            a player or boxscore as a whole get all of its rows, and the others only the new and
+            changed ones. Rows are indexed once the sinks have flushed them. The team lines of a
+            boxscore come from the same page as its player lines, so they are written whenever
+            the boxscore is.
+
+            Args:
+                - sinks (RecordSink[]): Where to write the records
+                - profile (dict): The player's profile, or None for the lines of a boxscore
+                - games (dict[]): Game stats
+                - team_games (dict[]): Team stats of a boxscore
+
+            Returns:
+                None
+        """
+        row_diff = None
+        if self.row_index is not None:
+            records = games if profile is None else [profile] + games
+            if any(record['player_id'] not in self.player_slugs for record in records):
+                self.player_slugs = {player_id: slug for slug, player_id in self.work_queue.get_player_ids().items()}
+            row_diff = self.row_index.diff(profile, games, self.player_slugs)
+            num_changed = len(records) - row_diff.num_unchanged
+            self.metrics.record_rows(num_changed, row_diff.num_unchanged)
+            if num_changed == 0 and row_diff.num_removed == 0 and (records or not team_games):
+                return
+        for sink in sinks:
+            sink_profile, sink_games = profile, games
+            if row_diff is not None and not sink.replaces_whole_players:
+                sink_profile, sink_games = row_diff.profile, row_diff.games
+            if sink_profile is not None:
+                sink.write('profile', sink_profile)
+            for game in sink_games:
+                sink.write('game', game)
+            for team_game in team_games:
+                sink.write('team_game', team_game)
+            sink.flush()
+        if row_diff is not None:
+            self.row_index.record(row_diff)
+
+    def reparse(self, include_cached=False, sinks=None):
+        """Run the current parsers over the pages in the page store, without fetching anything
+
+            Players and boxscores are scraped again as they would be by the crawl, except that
+            every page comes from the page store, so a fix to a parser can be checked against the
+            pages that broke it. Ones that parse are written out and marked done in the work
+            queue, and their pages leave quarantine. A player is only reparsed if all of their
+            pages were fetched before they failed; the others have to be crawled again.
+
+            Args:
+                - include_cached (boolean): Reparse the pages cached by a crawl with cache_pages,
+                  not just the quarantined ones, i.e. to rebuild the dataset after a parser change
+                - sinks (RecordSink[]): Where to write the records. By default they are saved as
+                  files and condensed once the reparse finishes.
+
+            Returns:
+                - num_failed (int): Number of players and boxscores that still failed to parse
+        """
+        condense = sinks is None
+        if sinks is None:
+            sinks = [FileSink(self.output_dir)]
+        statuses = ['quarantined', 'cached'] if include_cached else ['quarantined']
+        players = self.page_store.get_players(statuses)
+        games = self.page_store.get_boxscore_games(statuses)
+        print('Reparsing {} players and {} boxscores...'.format(len(players), len(games)))
+        num_failed = 0
+        self.offline = True
+        self.open_parse_pool()
+        try:
+            for queue_item, result in self.map_jobs(self.reparse_player, players, ordered=False):
+                if result is None:
+                    num_failed += 1
+                    continue
+                profile, game_stats = result
+                self.write_records(sinks, profile, game_stats)
+                self.work_queue.mark_done(queue_item['player_id'])
+
+            player_ids = self.work_queue.get_player_ids('done')
+            unknown_players = set()
+            for game, lines in self.map_jobs(self.scrape_boxscore, games, ordered=False):
+                if lines is None:
+                    num_failed += 1
+                    continue
+                self.write_boxscore(game, lines, player_ids, sinks, unknown_players)
+        finally:
+            self.offline = False
+            for sink in sinks:
+                sink.close()
+            self.close_parse_pool()
+        print('{} players and boxscores still fail to parse, see {}'.format(num_failed, self.page_store.path))
+        if condense:
+            self.condense_data()
+        return num_failed
+
+    def reparse_player(self, queue_item):
+        """Reparse one player from the page store, from a worker thread
+
+            Returns:
+                - queue_item (dict): The same player
+                - result (tuple): Their profile and game stats, or None if they still fail
+        """
+        try:
+            return queue_item, self.scrape_player(queue_item)
+        except (KeyboardInterrupt, SystemExit, BrokenProcessPool):
+            raise
+        except Exception as e:
+            print('There was a problem reparsing stats for {}: {!r}'.format(queue_item['profile_url'], e))
+            self.metrics.record_error('reparse', e)
+            return queue_item, None
+
+    def get_games_for_season(self, year):
+        """Get the games of a season, regular season and playoffs, from its schedule
+
+            Args:
+                - year (int): The season
+
+            Returns:
+                - games (dict[]): The boxscore URL of every game played so far, see Boxscore.parse_schedule
+        """
+        response = self.get_page(SEASON_SCHEDULE_URL.format(year))
+        return self.submit_parse('schedule', Boxscore.parse_schedule, response.content, year,
+                                 self.html_parser).result()
+
+    def scrape_boxscore(self, game):
+        """Fetch and parse one boxscore, from a worker thread
+
+            Args:
+                - game (dict): The game, from the schedule
+
+            Returns:
+                - game (dict): The same game
+                - lines (tuple): The player and team lines of the game, see Boxscore.parse_boxscore,
+                  or None if the boxscore couldn't be scraped
+        """
+        pages = []
+        try:
+            response = self.get_page(game['boxscore_url'])
+            pages.append({'url': game['boxscore_url'], 'page_type': 'boxscore', 'player_id': None,
+                          'metadata': game, 'content': response.content})
+            lines = self.submit_parse('boxscore', Boxscore.parse_boxscore, response.content, game,
+                                      self.html_parser).result()
+        except (KeyboardInterrupt, SystemExit, BrokenProcessPool):
+            raise
+        except Exception as e:
+            print('There was a problem parsing the boxscore {}'.format(game['boxscore_url']))
+            self.metrics.record_error('scrape', e)
+            self.work_queue.fail_boxscore(game['game_id'], repr(e))
+            self.page_store.save(pages, 'quarantined', e)
+            return game, None
+        self.keep_pages(pages)
+        return game, lines
+
+    def player_matches_filters(self, player):
+        """Check a player from the player list against the year range and positions to scrape
+
+            Players whose list entry is missing the years or position are kept, since there
+            is no way to tell whether they are relevant without fetching their profile.
+
+            Args:
+                - player (dict): Player list metadata from get_players_for_letter
+
+            Returns:
+                - matches (boolean): Whether the player should be scraped
+        """
+        if self.min_year is not None and player['last_year'] is not None and player['last_year'] < self.min_year:
+            return False
+        if self.max_year is not None and player['first_year'] is not None and player['first_year'] > self.max_year:
+            return False
+        if self.positions is not None and player['positions']:
+            return any(position in self.positions for position in player['positions'])
+        return True
+
+    def season_in_range(self, year):
+        """Check whether a season falls inside the year range to scrape
+
+            Args:
+                - year (str): The season year from the player's gamelog list
+
+            Returns:
+                - in_range (boolean): Whether the season should be scraped
+        """
+        if not year.isdigit():
+            return False
+        if self.min_year is not None and int(year) < self.min_year:
+            return False
+        if self.max_year is not None and int(year) > self.max_year:
+            return False
+        return True
+
+    def scrape_player(self, queue_item):
+        """Scrape the profile and game stats for one entry of the work queue
+
+            Args:
+                - queue_item (dict): Work queue entry for the player
+
+            Returns:
+                - profile (dict): Player profile data
+                - game_stats (dict[]): The player's stats for every game scraped
+        """
+        player = Player(queue_item['player_id'], queue_item['profile_url'], self)
+        try:
+            player.scrape_profile()
+            player.scrape_player_stats()
+        except (KeyboardInterrupt, SystemExit, BrokenProcessPool):
+            raise
+        except Exception as e:
+            # Keep every page fetched so far, so a parser fix can be tried without fetching them again
+            self.page_store.save(player.pages, 'quarantined', e)
+            raise
+        self.keep_pages(player.pages)
+        return player.profile, player.game_stats
+
+    def keep_pages(self, pages):
+        """Update the page store for pages that scraped cleanly
+
+            They are cached when cache_pages is set. Otherwise they are taken out of quarantine,
+            in case an earlier attempt failed.
+
+            Args:
+                - pages (dict[]): The pages, see PageStore.save
+
+            Returns:
+                None
+        """
+        if self.cache_pages:
+            self.page_store.save(pages, 'cached')
+        else:
+            self.page_store.release([page['url'] for page in pages])
+
+    def map_jobs(self, func, items, ordered=True):
+        """Run a function over items, using the worker pool when there is one
+
+            Args:
+                - func (function): Function to call with each item
+                - items (list): Items to process
+                - ordered (boolean): Whether results must come back in the order of items
+
+            Returns:
+                - results (iterator): The return value of func for each item
+        """
+        if not self.multiprocessing:
+            return map(func, items)
+        if ordered:
+            return self.worker_pool.imap(func, items)
+        return self.worker_pool.imap_unordered(func, items)
+
+    def submit_parse(self, page_type, parse_func, *args):
+        """Queue a fetched page to be parsed by the parse workers
+
+            Blocks while parse_queue_size pages are already waiting, so fetching can't
+            get arbitrarily far ahead of parsing.
+
+            Args:
+                - page_type (str): Kind of page being parsed, for the metrics
+                - parse_func (function): Parser to run, which must be picklable
+                - args: Arguments for the parser, starting with the raw page
+
+            Returns:
+                - parsed (Future): Resolves to the return value of the parser
+        """
+        parsed = Future()
+
+        run_parse = run_timed if self.profile_path is None else run_profiled
+
+        def finish(timed_parse):
+            try:
+                outcome = timed_parse.result()
+            except Exception as e:
+                self.metrics.record_error('parse', e)
+                parsed.set_exception(e)
+                return
+            result, parse_seconds = outcome[:2]
+            if len(outcome) > 2:
+                self.add_profile_stats(outcome[2])
+            if isinstance(result, BoxscoreLines):
+                num_rows = len(result.players) + len(result.teams)
+            else:
+                num_rows = len(result) if isinstance(result, list) else 1
+            self.metrics.record_parse(page_type, parse_seconds, num_rows)
+            parsed.set_result(result)
+
+        if self.parse_pool is None:
+            timed_parse = Future()
+            try:
+                timed_parse.set_result(run_parse(parse_func, *args))
+            except Exception as e:
+                timed_parse.set_exception(e)
+            finish(timed_parse)
+            return parsed
+        self.parse_slots.acquire()
+        try:
+            timed_parse = self.parse_pool.submit(run_parse, parse_func, *args)
+        except:
+            self.parse_slots.release()
+            raise
+        timed_parse.add_done_callback(lambda _: self.parse_slots.release())
+        timed_parse.add_done_callback(finish)
+        return parsed
+
+    def condense_data(self):
+        """Condense data into a profile file and a stats file, plus a manifest of changes
+
+            Output segments written by distributed workers are merged in as well. Records saved
+            by an older version of the scraper are normalized on the way. Every file is written
+            to the output directory, next to the change index.
+
+            Profiles are sorted by player ID and games by player ID and date, one record per line
+            of the JSON array, and each file gets a .idx sidecar with the byte range of every
+            player's records, for dataset.CondensedFile to read one player without parsing the
+            rest. Games are sorted with an external merge, so they never all have to be in
+            memory. Team lines from the boxscore crawl go to a third file, sorted by date, game and
+            team, which isn't indexed or in the manifest. See write_changes for the manifest.
+        """
+        print('Condensing Data...')
+        timestamp = time.time()
+        change_index = ChangeIndex(os.path.join(self.output_dir, CHANGE_INDEX_DB))
+
+        # A player may be in more than one segment if a worker lost its lease on them, so keep
+        # one copy of every profile and game, from the most recently written file
+        condensed_profile_data = {}
+        all_profile_files = sorted(self.find_output_files(PROFILE_DIR), key=os.path.getmtime)
+        for file in all_profile_files:
+            with open(file, 'rb') as fin:
+                profile = Player.normalize_profile(json.load(fin))
+            condensed_profile_data[profile['player_id']] = profile
+        profiles = [condensed_profile_data[player_id] for player_id in sorted(condensed_profile_data)]
+        for profile in profiles:
+            change_index.add('profile', profile)
+        num_profiles = write_indexed_json(os.path.join(self.output_dir, 'profiles_{}.json'.format(timestamp)), profiles)
+        print('{} player profiles condensed'.format(num_profiles))
+
+        all_game_files = sorted(self.find_output_files(STATS_DIR), key=os.path.getmtime)
+        with tempfile.TemporaryDirectory(dir=self.output_dir) as run_dir:
+            games = self.sort_games(all_game_files, run_dir)
+            num_games = write_indexed_json(os.path.join(self.output_dir, 'games_{}.json'.format(timestamp)), games,
+                                           lambda game: change_index.add('game', game))
+        print('{} player seasons condensed'.format(num_games))
+
+        # Team lines only come from the boxscore crawl, a few hundred a season, so they are sorted in memory
+        condensed_team_games = {}
+        for file in sorted(self.find_output_files(TEAM_STATS_DIR), key=os.path.getmtime):
+            with open(file, 'rb') as fin:
+                for team_game in json.load(fin):
+                    condensed_team_games[(team_game['game_id'], team_game['team'])] = team_game
+        if condensed_team_games:
+            team_games = sorted(condensed_team_games.values(),
+                                key=lambda team_game: (team_game['date'], team_game['game_id'], team_game['team']))
+            with open(os.path.join(self.output_dir, 'team_games_{}.json'.format(timestamp)), 'w') as fout:
+                fout.write('[\n' + ',\n'.join(json.dumps(team_game) for team_game in team_games) + '\n]\n')
+            print('{} team games condensed'.format(len(team_games)))
+
+        self.write_changes(change_index, os.path.join(self.output_dir, 'changes_{}.ndjson'.format(timestamp)))
+
+    def sort_games(self, game_files, run_dir):
+        """Read games from the saved files, sorted by player ID, date and game ID, with duplicates dropped
+
+            Games are sorted CONDENSE_RUN_SIZE at a time, and every sorted run is written to
+            run_dir, then the runs are merged. Of the copies of a game, the one from the most
+            recently written file is kept.
+
+            Args:
+                - game_files (str[]): Saved game files, oldest first
+                - run_dir (str): Scratch directory for the sorted runs
+
+            Yields:
+                - game (dict): Normalized game stats
+        """
+        runs = []
+        buffer = []
+        for file_number, file in enumerate(game_files):
+            with open(file, 'rb') as fin:
+                for game in json.load(fin):
+                    game = Player.normalize_game_stats(game)
+                    buffer.append([game['player_id'], game['date'] or '', game['game_id'], file_number, game])
+            if len(buffer) >= CONDENSE_RUN_SIZE:
+                runs.append(self.write_sorted_run(buffer, run_dir, len(runs)))
+                buffer = []
+        buffer.sort(key=lambda item: item[:4])
+        if runs:
+            runs.append(self.write_sorted_run(buffer, run_dir, len(runs)))
+            merged = heapq.merge(*[self.read_sorted_run(run) for run in runs], key=lambda item: item[:4])
+        else:
+            merged = iter(buffer)
+
+        previous = None
+        for item in merged:
+            # Copies of a game sort next to each other, oldest first
+            if previous is not None and previous[:3] != item[:3]:
+                yield previous[4]
+            previous = item
+        if previous is not None:
+            yield previous[4]
+
+    @staticmethod
+    def write_sorted_run(buffer, run_dir, run_number):
+        """Sort a buffer of games and write it to run_dir, one per line
+
+            Returns:
+                - path (str): The run's file
+        """
+        buffer.sort(key=lambda item: item[:4])
+        path = os.path.join(run_dir, 'run_{}.ndjson'.format(run_number))
+        with open(path, 'w') as fout:
+            for item in buffer:
+                fout.write(json.dumps(item) + '\n')
+        return path
+
+    @staticmethod
+    def read_sorted_run(path):
+        """Stream the games of a run written by write_sorted_run"""
+        with open(path, 'r') as fin:
+            for line in fin:
+                yield json.loads(line)
+
+    def write_changes(self, change_index, filename):
+        """Write a manifest of the profiles and games added, changed or removed since the last condense
+
+            Every record was hashed into the change index as it was condensed, and is compared with
+            the hashes kept from the previous condense, which are then replaced. Each line of the
+            manifest is a JSON object with the change ('added', 'changed' or 'removed'), the record
+            type ('profile' or 'game') and the record, which for removed games only has the
+            player_id and game_id.
+
+            A scrape only covers some players when it is filtered or interrupted, so removals are
+            only reported for games of players whose profile was condensed this time. Profiles are
+            never reported as removed.
+
+            Args:
+                - change_index (ChangeIndex): Index every condensed record was added to
+                - filename (str): File to write the manifest to
+
+            Returns:
+                - counts (Counter): Number of changes by record type and change
+        """
+        counts = collections.Counter()
+        with open(filename, 'w') as fout:
+            for record_type in ('profile', 'game'):
+                for change, record in change_index.diff(record_type):
+                    fout.write(json.dumps({'change': change, 'type': record_type, 'record': record}) + '\n')
+                    counts[(record_type, change)] += 1
+        change_index.commit()
+        print('{} changes written to {}: {}'.format(sum(counts.values()), filename, ', '.join(
+            '{} {} {}s'.format(count, change, record_type) for (record_type, change), count in sorted(counts.items()))))
+        return counts
+
+    def find_output_files(self, data_dir):
+        """List the saved files of a data directory, across this scraper's output and every segment
+
+            Args:
+                - data_dir (str): PROFILE_DIR, STATS_DIR or TEAM_STATS_DIR
+
+            Returns:
+                - files (str[]): Paths of the saved JSON files
+        """
+        files = glob.glob(os.path.join(self.output_dir, data_dir, '*.json'))
+        files += glob.glob(os.path.join(self.output_dir, SEGMENTS_DIR, '*', data_dir, '*.json'))
+        return files
+
+    def get_players_for_letter(self, letter):
+        """Get a list of players for a letter of the alphabet.
+            Site organizes players by first letter of last name. Each entry in the list
+            also shows the positions the player played and the years they were active,
+            i.e. "Tom Brady (QB) 2000-2017".
+
+            Args:
+                - letter (str): letter of the alphabet uppercased
+
+            Returns:
+                - players (dict[]): the slug, name, profile URL, positions and active years of each player
+        """
+        response = self.get_page(PLAYER_LIST_URL.format(letter))
+        parse_start = time.process_time()
+        soup = BeautifulSoup(response.content, self.html_parser)
+
+        players = []
+        for player_entry in soup.find('div', {'id': 'div_players'}).find_all('p'):
+            player_link = player_entry.find('a', href=True)
+            if player_link is None:
+                continue
+            name = player_link.get_text()
+            description = player_entry.get_text().replace(name, '', 1)
+            years = re.search(r'(\d{4})-(\d{4})', description)
+            if years is not None:
+                description = description.replace(years.group(0), '')
+            players.append({
+                'slug': player_link['href'].split('/')[-1].replace('.htm', ''),
+                'name': name,
+                'letter': letter,
+                'profile_url': BASE_URL.format(player_link['href']),
+                'positions': re.findall(r'[A-Z]+', description),
+                'first_year': int(years.group(1)) if years is not None else None,
+                'last_year': int(years.group(2)) if years is not None else None
+            })
+        self.metrics.record_parse('player_list', time.process_time() - parse_start, len(players))
+        return players
+
+    def get_page(self, url, retry_count=0):
+        """Use requests to get a page; retry when failures occur
+
+            Connection errors, throttling (429) and server errors (5xx) are retried after a
+            backoff. Other error statuses, such as a 404, are raised straight away. While
+            reparsing, the page is read from the page store instead.
+
+            Args:
+                - url (str): The URL of the page to make a GET request to
+                - retry_count (int): Number of times the URL has already been requests
+
+            Returns:
+                - response (obj): The Requests response object
+
+            Raises:
+                - requests.RequestException: The page couldn't be fetched
+        """
+        if self.offline:
+            return self.page_store.load(url)
+        page_type = page_type_for(url)
+        retryable = True
+        retry_after = None
+        try:
+            response = self.fetch(url, page_type)
+            if not 200 <= response.status_code < 300:
+                self.metrics.record_error('fetch', 'HTTP {}'.format(response.status_code))
+                retryable = response.status_code == 429 or response.status_code >= 500
+                retry_after = response.headers.get('Retry-After')
+                response.raise_for_status()
+            return response
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception as e:
+            if not retryable:
+                raise
+            if not isinstance(e, requests.HTTPError):
+                # A broken connection is dropped from the pool by urllib3, the others are kept
+                self.metrics.record_error('fetch', e)
+            if retry_count >= self.max_retries:
+                raise
+            self.metrics.record_retry(page_type)
+            time.sleep(self.retry_delay(retry_count, retry_after))
+            return self.get_page(url, retry_count + 1)
+
+    def fetch(self, url, page_type):
+        """Make a single request once the concurrency limit allows it, and tell the limit how it went
+
+            Timeouts, connection errors, throttling (429) and server errors (5xx) count as the
+            site being overloaded.
+
+            Returns:
+                - response (obj): The Requests response object, whatever its status
+        """
+        fetch_start = self.concurrency.acquire()
+        overloaded = False
+        try:
+            response = self.get_session().get(url.replace(SITE_URL, self.site_url, 1), timeout=self.request_timeout)
+            # Reading the content here means the latency includes downloading the whole page
+            self.metrics.record_fetch(page_type, time.time() - fetch_start, len(response.content),
+                                      response.status_code)
+            overloaded = response.status_code == 429 or response.status_code >= 500
+            return response
+        except (requests.Timeout, requests.ConnectionError):
+            overloaded = True
+            raise
+        finally:
+            self.concurrency.release(page_type, fetch_start, overloaded)
+
+    def get_session(self):
+        """Get the calling thread's session, creating it on the thread's first request
+
+            Returns:
+                - session (requests.Session): Session mounted on the scraper's shared connection pool
+        """
+        session = getattr(self.thread_sessions, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            session.mount('http://', self.http_adapter)
+            session.mount('https://', self.http_adapter)
+            self.thread_sessions.session = session
+        return session
+
+    def retry_delay(self, retry_count, retry_after=None):
+        """Seconds to wait before retrying a request
+
+            Args:
+                - retry_count (int): Number of times the URL has already been retried
+                - retry_after (str): The response's Retry-After header, if it had one
+
+            Returns:
+                - delay (float): Seconds to wait
+        """
+        if retry_after is not None and retry_after.strip().isdigit():
+            return int(retry_after)
+        return self.retry_backoff * 2 ** retry_count
+
+    def clear_data(self):
+        """Clear the data directories, the work queue and the index of rows written"""
+        for data_dir in (self.profile_dir, self.stats_dir, os.path.join(self.output_dir, TEAM_STATS_DIR),
+                         os.path.join(self.output_dir, SEGMENTS_DIR)):
+            try:
+                shutil.rmtree(data_dir)
+            except FileNotFoundError:
+                pass
+        self.work_queue.reset()
+        if self.row_index is not None:
+            self.row_index.reset()
+
+
+def page_type_for(url):
+    """Classify a site URL by the kind of page it is, i.e. 'profile' or 'gamelog'"""
+    if '/gamelog/' in url:
+        return 'gamelog'
+    if '/boxscores/' in url:
+        return 'boxscore'
+    if '/years/' in url:
+        return 'schedule'
+    if '/players/' in url:
+        return 'profile' if url.endswith('.htm') else 'player_list'
+    return 'other'
+
+
+def write_indexed_json(path, records, on_record=None):
+    """Write records sorted by player ID as a JSON array with one record per line, plus a .idx sidecar
+
+        The sidecar is a JSON object mapping each player ID to the byte offset and length of
+        their records in the file, and their number of records. The bytes at that offset, put
+        between [ and ], are a JSON array of just that player's records.
+
+        Args:
+            - path (str): File to write
+            - records (iterator): The records, sorted by player_id
+            - on_record (function): Called with each record as it is written
+
+        Returns:
+            - num_records (int): Number of records written
+    """
+    index = collections.OrderedDict()
+    num_records = 0
+    with open(path, 'wb') as fout:
+        fout.write(b'[\n')
+        offset = 2
+        for record in records:
+            line = json.dumps(record).encode('utf-8')
+            if num_records > 0:
+                fout.write(b',\n')
+                offset += 2
+            player_id = str(record['player_id'])
+            if player_id not in index:
+                index[player_id] = [offset, 0, 0]
+            entry = index[player_id]
+            entry[1] = offset + len(line) - entry[0]
+            entry[2] += 1
+            fout.write(line)
+            offset += len(line)
+            num_records += 1
+            if on_record is not None:
+                on_record(record)
+        fout.write(b'\n]\n')
+    with open(path + '.idx', 'w') as fout:
+        json.dump(index, fout)
+    return num_records
+
+
+def to_int(value):
+    """Read the number in a scraped string, i.e. '$15,000,000' -> 15000000, or None if there is none"""
+    if value is None or isinstance(value, int):
+        return value
+    number = re.search(r'-?\d[\d,]*', value)
+    return None if number is None else int(number.group(0).replace(',', ''))
+
+
+def to_iso_date(value, date_format=None):
+    """Turn a scraped date, i.e. 'March 5, 1930', into YYYY-MM-DD, or None if it isn't a date"""
+    if not value:
+        return None
+    date_formats = [date_format] if date_format is not None else ['%Y-%m-%d', '%B %d, %Y', '%b %d, %Y']
+    for candidate_format in date_formats:
+        try:
+            return datetime.datetime.strptime(value.strip(), candidate_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def height_in_inches(height):
+    """Turn a scraped height in feet and inches, i.e. '6-5', into inches"""
+    if height is None or isinstance(height, int):
+        return height
+    feet_and_inches = re.match(r'^(\d+)-(\d+)$', height.strip())
+    if feet_and_inches is None:
+        return None
+    return int(feet_and_inches.group(1)) * 12 + int(feet_and_inches.group(2))
+
+
+def age_in_days(age, date):
+    """Turn a scraped age in years and days, i.e. '22-344', into days on the given date
+
+        Args:
+            - age (str): The age, as shown on the site
+            - date (str): The day the player was that age, as YYYY-MM-DD
+
+        Returns:
+            - days (int): The player's age in days, or None if it is unknown
+    """
+    if age is None or isinstance(age, int):
+        return age
+    years_and_days = re.match(r'^(\d+)-(\d+)$', age.strip())
+    if years_and_days is None or date is None:
+        return None
+    date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    last_birthday = date - datetime.timedelta(days=int(years_and_days.group(2)))
+    years = int(years_and_days.group(1))
+    try:
+        birth_date = last_birthday.replace(year=last_birthday.year - years)
+    except ValueError:
+        # Born on February 29th
+        birth_date = last_birthday.replace(year=last_birthday.year - years, day=28)
+    return (date - birth_date).days
+
+
+def run_timed(func, *args):
+    """Call a function and also return how many CPU seconds it took
+
+        Module level so it can be sent to the parse worker processes.
+
+        Returns:
+            - result (obj): The return value of func
+            - seconds (float): CPU time spent in the call
+    """
+    start = time.process_time()
+    result = func(*args)
+    return result, time.process_time() - start
+
+
+def run_profiled(func, *args):
+    """Like run_timed, but also profile the call with cProfile
+
+        Returns:
+            - result (obj): The return value of func
+            - seconds (float): CPU time spent in the call
+            - stats (dict): The profiler's stats, to merge with Scraper.add_profile_stats
+    """
+    profiler = cProfile.Profile()
+    result, seconds = profiler.runcall(run_timed, func, *args)
+    profiler.create_stats()
+    return result, seconds, profiler.stats
+
+
+class ProfileStats():
+    """Wraps the stats of a finished cProfile.Profile so pstats.Stats can load and merge them"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class ScrapeMetrics():
+    """Thread-safe counters and latency histograms for each stage of a scrape
+
+    Fetches and parses are tracked per page type (player_list, profile, gamelog, ...), errors per
+    stage and exception type. Summaries are printed, and written out, every reporting interval.
+    """
+
+    def __init__(self, start_time, metrics_path=METRICS_FILE):
+        """
+            Args:
+                - start_time (float): When the scrape started
+                - metrics_path (str): Path, without extension, to write the metrics files to.
+                  None to not write any.
+
+            Returns:
+                None
+        """
+        self.start_time = start_time
+        self.metrics_path = metrics_path
+        self.lock = threading.Lock()
+        self.fetches = collections.defaultdict(lambda: {
+            'count': 0,
+            'seconds': 0.0,
+            'bytes': 0,
+            'retries': 0,
+            'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+            'status_codes': collections.Counter()
+        })
+        self.parses = collections.defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'rows': 0})
+        self.errors = collections.Counter()
+        # Rows written out, and rows skipped because they were written before unchanged
+        self.rows = {'written': 0, 'unchanged': 0}
+        # The concurrency limit, the range it moved in since the last report, and its recent changes
+        self.concurrency = {'limit': None, 'low': None, 'high': None}
+        self.concurrency_history = collections.deque(maxlen=CONCURRENCY_HISTORY_SIZE)
+        self.reporter = None
+        self.stop_reporter = threading.Event()
+
+    def record_fetch(self, page_type, seconds, num_bytes, status_code):
+        """Record a completed request"""
+        with self.lock:
+            fetch = self.fetches[page_type]
+            fetch['count'] += 1
+            fetch['seconds'] += seconds
+            fetch['bytes'] += num_bytes
+            fetch['latency_buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            fetch['status_codes'][str(status_code)] += 1
+
+    def record_retry(self, page_type):
+        """Record a request being retried"""
+        with self.lock:
+            self.fetches[page_type]['retries'] += 1
+
+    def record_parse(self, page_type, seconds, rows):
+        """Record a parsed page and the number of rows it produced"""
+        with self.lock:
+            parse = self.parses[page_type]
+            parse['count'] += 1
+            parse['seconds'] += seconds
+            parse['rows'] += rows
+
+    def record_error(self, stage, error):
+        """Record an error during a stage (fetch, parse or scrape)
+
+            Args:
+                - stage (str): The stage the error happened in
+                - error (Exception|str): The exception raised, or a description such as 'HTTP 429'
+
+            Returns:
+                None
+        """
+        error_type = error if isinstance(error, str) else type(error).__name__
+        with self.lock:
+            self.errors[(stage, error_type)] += 1
+
+    def record_rows(self, num_written, num_unchanged):
+        """Record rows checked against the rows written before"""
+        with self.lock:
+            self.rows['written'] += num_written
+            self.rows['unchanged'] += num_unchanged
+
+    def record_concurrency(self, limit, reason):
+        """Record a change of the number of requests allowed in flight
+
+            Args:
+                - limit (int): The new limit
+                - reason (str): What changed it, i.e. 'healthy', 'slow' or 'overloaded'
+
+            Returns:
+                None
+        """
+        with self.lock:
+            concurrency = self.concurrency
+            concurrency['limit'] = limit
+            concurrency['low'] = limit if concurrency['low'] is None else min(concurrency['low'], limit)
+            concurrency['high'] = limit if concurrency['high'] is None else max(concurrency['high'], limit)
+            self.concurrency_history.append([round(time.time() - self.start_time, 3), limit, reason])
+
+    def snapshot(self):
+        """Copy of the metrics as plain data, safe to serialize"""
+        with self.lock:
+            return {
+                'elapsed_seconds': time.time() - self.start_time,
+                'fetches': {page_type: dict(fetch, status_codes=dict(fetch['status_codes']),
+                                            latency_buckets=list(fetch['latency_buckets']))
+                            for page_type, fetch in self.fetches.items()},
+                'parses': {page_type: dict(parse) for page_type, parse in self.parses.items()},
+                'errors': [{'stage': stage, 'type': error_type, 'count': count}
+                           for (stage, error_type), count in self.errors.items()],
+                'concurrency': dict(self.concurrency, history=list(self.concurrency_history)),
+                'rows': dict(self.rows)
+            }
+
+    def summary(self):
+        """One line per page type with the rates and averages that matter when tuning a scrape"""
+        snapshot = self.snapshot()
+        elapsed = max(snapshot['elapsed_seconds'], 1e-9)
+        lines = ['{:.0f}s elapsed'.format(elapsed)]
+        for page_type, fetch in sorted(snapshot['fetches'].items()):
+            parse = snapshot['parses'].get(page_type, {'count': 0, 'seconds': 0.0, 'rows': 0})
+            lines.append('  {}: {} fetched ({:.2f}/s, {:.3f}s avg, {:.1f} MB, {} retries), '
+                         '{} parsed ({:.3f}s avg, {} rows)'.format(
+                             page_type, fetch['count'], fetch['count'] / elapsed,
+                             fetch['seconds'] / max(fetch['count'], 1), fetch['bytes'] / 1e6,
+                             fetch['retries'], parse['count'], parse['seconds'] / max(parse['count'], 1),
+                             parse['rows']))
+        for error in snapshot['errors']:
+            lines.append('  {} errors during {}: {}'.format(error['type'], error['stage'], error['count']))
+        if snapshot['rows']['unchanged']:
+            lines.append('  rows: {written} written, {unchanged} unchanged and skipped'.format(**snapshot['rows']))
+        concurrency = snapshot['concurrency']
+        if concurrency['limit'] is not None:
+            lines.append('  concurrency limit: {limit} ({low} to {high} since the last report)'.format(**concurrency))
+        return '\n'.join(lines)
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format, i.e. for the node exporter textfile collector"""
+        snapshot = self.snapshot()
+        lines = [
+            '# TYPE nfl_scraper_elapsed_seconds gauge',
+            'nfl_scraper_elapsed_seconds {}'.format(snapshot['elapsed_seconds']),
+            '# TYPE nfl_scraper_fetch_seconds histogram'
+        ]
+        for page_type, fetch in sorted(snapshot['fetches'].items()):
+            cumulative = 0
+            for bucket, count in zip(LATENCY_BUCKETS + ['+Inf'], fetch['latency_buckets']):
+                cumulative += count
+                lines.append('nfl_scraper_fetch_seconds_bucket{{page_type="{}",le="{}"}} {}'.format(
+                    page_type, bucket, cumulative))
+            lines.append('nfl_scraper_fetch_seconds_sum{{page_type="{}"}} {}'.format(page_type, fetch['seconds']))
+            lines.append('nfl_scraper_fetch_seconds_count{{page_type="{}"}} {}'.format(page_type, fetch['count']))
+        for name, key, source in (('fetch_bytes_total', 'bytes', 'fetches'),
+                                  ('fetch_retries_total', 'retries', 'fetches'),
+                                  ('parse_seconds_total', 'seconds', 'parses'),
+                                  ('parse_pages_total', 'count', 'parses'),
+                                  ('parse_rows_total', 'rows', 'parses')):
+            lines.append('# TYPE nfl_scraper_{} counter'.format(name))
+            for page_type, values in sorted(snapshot[source].items()):
+                lines.append('nfl_scraper_{}{{page_type="{}"}} {}'.format(name, page_type, values[key]))
+        lines.append('# TYPE nfl_scraper_errors_total counter')
+        for error in snapshot['errors']:
+            lines.append('nfl_scraper_errors_total{{stage="{}",type="{}"}} {}'.format(
+                error['stage'], error['type'], error['count']))
+        if any(snapshot['rows'].values()):
+            lines.append('# TYPE nfl_scraper_rows_total counter')
+            for status, count in sorted(snapshot['rows'].items()):
+                lines.append('nfl_scraper_rows_total{{status="{}"}} {}'.format(status, count))
+        if snapshot['concurrency']['limit'] is not None:
+            lines.append('# TYPE nfl_scraper_concurrency_limit gauge')
+            lines.append('nfl_scraper_concurrency_limit {}'.format(snapshot['concurrency']['limit']))
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        """Print the summary and write the metrics files"""
+        print(self.summary())
+        if self.metrics_path is not None:
+            self.write_atomically('{}.json'.format(self.metrics_path), json.dumps(self.snapshot()))
+            self.write_atomically('{}.prom'.format(self.metrics_path), self.prometheus_text())
+        with self.lock:
+            self.concurrency['low'] = self.concurrency['high'] = self.concurrency['limit']
+
+    @staticmethod
+    def write_atomically(path, text):
+        """Replace a file in one step, so readers like the textfile collector never see half of it"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'w') as fout:
+            fout.write(text)
+        os.replace(temp_path, path)
+
+    def start_reporting(self, interval):
+        """Report from a background thread every interval seconds until stop_reporting is called"""
+        if self.reporter is not None:
+            return
+        self.stop_reporter.clear()
+
+        def report_periodically():
+            while not self.stop_reporter.wait(interval):
+                self.report()
+
+        self.reporter = threading.Thread(target=report_periodically, daemon=True)
+        self.reporter.start()
+
+    def stop_reporting(self):
+        """Stop the background reports and write a final one"""
+        if self.reporter is not None:
+            self.stop_reporter.set()
+            self.reporter.join()
+            self.reporter = None
+        self.report()
+
+
+class ConcurrencyLimit():
+    """Limit on the number of requests in flight, tuned by additive increase and multiplicative decrease
+
+    Every limit's worth of healthy responses raises the limit by one, as long as the fetching
+    threads are using all of it. Timeouts, connection errors, throttling (429) and server errors
+    (5xx) cut it to CONCURRENCY_BACKOFF of itself, and responses that are LATENCY_TOLERANCE times
+    slower than usual take one off it. Only requests sent after the last cut can cut it again, so
+    a burst of failures from a single slowdown only counts once.
+
+    Latency is compared per page type, since player lists are much bigger than gamelogs. What is
+    usual follows faster responses straight away and slower ones gradually, as the site's speed
+    changes over the day.
+    """
+
+    def __init__(self, max_limit, initial_limit=INITIAL_CONCURRENCY, min_limit=1, adaptive=True, on_change=None):
+        """
+            Args:
+                - max_limit (int): The most requests ever in flight, i.e. the number of fetching threads
+                - initial_limit (int): Requests in flight before any response has been seen
+                - min_limit (int): The fewest requests the limit is ever cut to
+                - adaptive (boolean): Whether the limit is tuned. Otherwise it stays at max_limit.
+                - on_change (function): Called with the new limit and the reason whenever it changes
+
+            Returns:
+                None
+        """
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = min(max(min_limit, 1), self.max_limit)
+        self.adaptive = adaptive
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit) if adaptive else self.max_limit)
+        self.on_change = on_change
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        # Smoothed and usual latency of each page type, and when they were last updated
+        self.latencies = {}
+        self.last_cut = 0.0
+        if adaptive and on_change is not None:
+            on_change(int(self.limit), 'initial')
+
+    def acquire(self):
+        """Wait until another request is allowed in flight
+
+            Returns:
+                - start (float): When the request was let through, to pass to release
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        return time.time()
+
+    def release(self, page_type, start, overloaded):
+        """Finish a request and adjust the limit from how it went
+
+            Args:
+                - page_type (str): Type of the page requested
+                - start (float): What acquire returned for the request
+                - overloaded (boolean): Whether the request timed out, couldn't connect or got a 429 or 5xx
+
+            Returns:
+                None
+        """
+        seconds = time.time() - start
+        change = None
+        with self.condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if self.adaptive:
+                old_limit = int(self.limit)
+                reason = self.adjust(page_type, seconds, start, overloaded, saturated)
+                if int(self.limit) != old_limit:
+                    change = (int(self.limit), reason)
+            self.condition.notify_all()
+        if change is not None and self.on_change is not None:
+            self.on_change(*change)
+
+    def adjust(self, page_type, seconds, start, overloaded, saturated):
+        """Move the limit for one finished request, returning the reason it moved"""
+        if overloaded:
+            if start >= self.last_cut:
+                self.limit = max(self.min_limit, self.limit * CONCURRENCY_BACKOFF)
+                self.last_cut = time.time()
+            return 'overloaded'
+        now = time.time()
+        smoothed, usual, updated = self.latencies.get(page_type, (seconds, seconds, now))
+        smoothed += 0.2 * (seconds - smoothed)
+        if smoothed < usual:
+            usual = smoothed
+        else:
+            usual += (smoothed - usual) * min((now - updated) / LATENCY_ADAPT_SECONDS, 1)
+        self.latencies[page_type] = (smoothed, usual, now)
+        if smoothed > usual * LATENCY_TOLERANCE:
+            if start >= self.last_cut:
+                self.limit = max(self.min_limit, self.limit - 1)
+                self.last_cut = time.time()
+            return 'slow'
+        if saturated:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        return 'healthy'
+
+
+class WorkQueue():
+    """Durable queue of player profiles to scrape, backed by SQLite
+
+    Workers claim players under a lease, which they keep renewing while they are alive. A claim
+    whose lease runs out, because the worker died or hung, goes back to the other workers, and
+    failed players are retried up to max_attempts. Every worker process on a host can work off
+    one queue file. SQLite's locking isn't reliable over network filesystems, so to spread a
+    crawl over several hosts, copy the discovered queue to each host and give each one its own
+    shard instead of sharing the file.
+    """
+
+    def __init__(self, path=QUEUE_DB, lease_seconds=600, max_attempts=3):
+        """
+            Args:
+                - path (str): SQLite file holding the queue
+                - lease_seconds (int): How long a worker may hold a player before it can be reclaimed
+                - max_attempts (int): Number of times a player is tried before it is marked failed
+
+            Returns:
+                None
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.local = threading.local()
+        connection = self.connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS players (
+                player_id INTEGER PRIMARY KEY,
+                slug TEXT UNIQUE NOT NULL,
+                letter TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                metadata TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )""")
+        connection.execute('CREATE INDEX IF NOT EXISTS players_status ON players (status, shard)')
+        connection.execute('CREATE TABLE IF NOT EXISTS queue_meta (key TEXT PRIMARY KEY, value TEXT)')
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                host TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                heartbeat REAL NOT NULL
+            )""")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS boxscores (
+                game_id TEXT PRIMARY KEY,
+                year INTEGER NOT NULL,
+                metadata TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )""")
+
+    def connect(self):
+        """Get this thread's connection to the queue, since SQLite connections can't be shared"""
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self.local.connection.row_factory = sqlite3.Row
+        return self.local.connection
+
+    @staticmethod
+    def shard_for(slug):
+        """Stable hash bucket for a player slug, so every host agrees on the shards"""
+        return int(hashlib.md5(slug.encode('utf-8')).hexdigest(), 16) % NUM_SHARD_BUCKETS
+
+    def get_filters(self):
+        """Get the scrape filters the queue was built with, or None for an empty queue"""
+        row = self.connect().execute("SELECT value FROM queue_meta WHERE key = 'filters'").fetchone()
+        return None if row is None else json.loads(row['value'])
+
+    def set_filters(self, filters):
+        """Record the scrape filters the queue was built with"""
+        self.connect().execute("INSERT OR REPLACE INTO queue_meta (key, value) VALUES ('filters', ?)",
+                               (json.dumps(filters),))
+
+    def enqueue(self, players, first_player_id=1, known_ids=None):
+        """Add discovered players to the queue, giving each the next free player ID
+
+            Args:
+                - players (dict[]): Player list metadata from Scraper.get_players_for_letter
+                - first_player_id (int): ID to start from when the queue is empty
+                - known_ids (dict): IDs players were given before, by slug, which they keep. New
+                  players get IDs after all of them.
+
+            Returns:
+                None
+        """
+        known_ids = known_ids or {}
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            next_id = connection.execute('SELECT MAX(player_id) FROM players').fetchone()[0]
+            next_id = max(first_player_id if next_id is None else next_id + 1, max(known_ids.values(), default=0) + 1)
+            for player in players:
+                values = [player['slug'], player['letter'], self.shard_for(player['slug']), json.dumps(player)]
+                insert = ('INSERT OR IGNORE INTO players (player_id, slug, letter, shard, metadata) '
+                          'VALUES (?, ?, ?, ?, ?)')
+                # A known ID already taken by another player in the queue falls back to a new one
+                if player['slug'] in known_ids and connection.execute(
+                        insert, [known_ids[player['slug']]] + values).rowcount:
+                    continue
+                next_id += connection.execute(insert, [next_id] + values).rowcount
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+
+    def claim(self, worker_id, shard=None, num_shards=1):
+        """Lease the next player that is pending, or whose lease ran out
+
+            Args:
+                - worker_id (str): Name to hold the lease under
+                - shard (int): Only claim players in this shard. None for any shard.
+                - num_shards (int): Number of shards the queue is split into
+
+            Returns:
+                - queue_item (dict): The player's metadata and ID, or None when nothing is left to claim
+        """
+        now = time.time()
+        query = ("SELECT player_id, metadata FROM players "
+                 "WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?))")
+        params = [now]
+        if shard is not None:
+            query += ' AND shard % ? = ?'
+            params += [num_shards, shard]
+        query += ' ORDER BY player_id LIMIT 1'
+
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(query, params).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE players SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1 WHERE player_id = ?",
+                    (worker_id, now + self.lease_seconds, row['player_id']))
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        queue_item = json.loads(row['metadata'])
+        queue_item['player_id'] = row['player_id']
+        return queue_item
+
+    def complete(self, player_id, worker_id):
+        """Mark a leased player as scraped
+
+            Returns:
+                - completed (boolean): False if the worker had lost its lease on the player, in
+                  which case another worker may have scraped them too
+        """
+        completed = self.connect().execute(
+            "UPDATE players SET status = 'done', lease_owner = NULL, lease_expires = NULL "
+            "WHERE player_id = ? AND lease_owner = ?", (player_id, worker_id))
+        return completed.rowcount > 0
+
+    def mark_done(self, player_id):
+        """Mark a player as scraped outside of a lease, i.e. after they were reparsed"""
+        self.connect().execute(
+            "UPDATE players SET status = 'done', lease_owner = NULL, lease_expires = NULL, last_error = NULL "
+            "WHERE player_id = ?", (player_id,))
+
+    def register_worker(self, worker_id):
+        """Take a worker ID for this process, failing if a live process already holds it
+
+            A holder on this host whose process has exited, i.e. a crashed worker being
+            restarted, doesn't count.
+
+            Raises:
+                - ValueError: Another process has held the ID within the last lease period
+        """
+        host, pid, now = socket.gethostname(), os.getpid(), time.time()
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            holder = connection.execute('SELECT host, pid, heartbeat FROM workers WHERE worker_id = ?',
+                                        (worker_id,)).fetchone()
+            if holder is not None and (holder['host'], holder['pid']) != (host, pid) and \
+                    holder['heartbeat'] > now - self.lease_seconds and \
+                    (holder['host'] != host or self.process_alive(holder['pid'])):
+                raise ValueError('Worker ID {} is in use by process {} on {}'.format(
+                    worker_id, holder['pid'], holder['host']))
+            connection.execute('INSERT OR REPLACE INTO workers (worker_id, host, pid, heartbeat) VALUES (?, ?, ?, ?)',
+                               (worker_id, host, pid, now))
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def process_alive(pid):
+        """Check whether a process is running on this host"""
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def unregister_worker(self, worker_id):
+        """Give up a worker ID taken with register_worker"""
+        self.connect().execute('DELETE FROM workers WHERE worker_id = ? AND host = ? AND pid = ?',
+                               (worker_id, socket.gethostname(), os.getpid()))
+
+    def renew(self, worker_id):
+        """Extend every lease a worker holds, and its worker ID, by another lease period"""
+        now = time.time()
+        connection = self.connect()
+        connection.execute("UPDATE players SET lease_expires = ? WHERE status = 'leased' AND lease_owner = ?",
+                           (now + self.lease_seconds, worker_id))
+        connection.execute('UPDATE workers SET heartbeat = ? WHERE worker_id = ?', (now, worker_id))
+
+    def fail(self, player_id, worker_id, error):
+        """Give up a leased player after an error, retrying it later unless it is out of attempts"""
+        self.connect().execute(
+            "UPDATE players SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_owner = NULL, lease_expires = NULL, last_error = ? WHERE player_id = ? AND lease_owner = ?",
+            (self.max_attempts, error, player_id, worker_id))
+
+    def release(self, worker_id, player_id=None):
+        """Put back every player a worker still holds, i.e. after it was restarted
+
+            With a player_id, only that player is put back, and the attempt isn't counted, i.e.
+            when the worker is stopping and gives up a player it was part way through.
+        """
+        if player_id is None:
+            self.connect().execute(
+                "UPDATE players SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+                "WHERE status = 'leased' AND lease_owner = ?", (worker_id,))
+        else:
+            self.connect().execute(
+                "UPDATE players SET status = 'pending', lease_owner = NULL, lease_expires = NULL, "
+                "attempts = attempts - 1 WHERE status = 'leased' AND lease_owner = ? AND player_id = ?",
+                (worker_id, player_id))
+
+    def get_player_ids(self, status=None):
+        """Map the slug of every player in the queue, or of the ones with a status, to their player ID"""
+        if status is None:
+            return dict(self.connect().execute('SELECT slug, player_id FROM players').fetchall())
+        return dict(self.connect().execute('SELECT slug, player_id FROM players WHERE status = ?',
+                                           (status,)).fetchall())
+
+    def get_pending_players(self):
+        """Get the players that haven't been scraped or leased, for the boxscore crawl's profiles
+
+            Returns:
+                - queue_items (dict[]): The metadata and ID of each player, as returned by claim
+        """
+        queue_items = []
+        for row in self.connect().execute(
+                "SELECT player_id, metadata FROM players WHERE status = 'pending' ORDER BY player_id").fetchall():
+            queue_item = json.loads(row['metadata'])
+            queue_item['player_id'] = row['player_id']
+            queue_items.append(queue_item)
+        return queue_items
+
+    def fail_profile(self, player_id, error):
+        """Record a profile that failed outside of a lease, which is retried unless it is out of attempts"""
+        self.connect().execute(
+            "UPDATE players SET attempts = attempts + 1, last_error = ?, "
+            "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END WHERE player_id = ?",
+            (error, self.max_attempts, player_id))
+
+    def enqueue_boxscores(self, games):
+        """Add games from a season schedule for the boxscore crawl, skipping ones already queued
+
+            Args:
+                - games (dict[]): Games from Boxscore.parse_schedule
+
+            Returns:
+                None
+        """
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR IGNORE INTO boxscores (game_id, year, metadata) VALUES (?, ?, ?)',
+                                   [(game['game_id'], game['year'], json.dumps(game)) for game in games])
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+
+    def get_pending_boxscores(self, min_year, max_year):
+        """Get the queued games from min_year to max_year whose boxscores haven't been scraped yet"""
+        rows = self.connect().execute(
+            "SELECT metadata FROM boxscores WHERE status = 'pending' AND year BETWEEN ? AND ? ORDER BY game_id",
+            (min_year, max_year)).fetchall()
+        return [json.loads(row['metadata']) for row in rows]
+
+    def complete_boxscore(self, game_id):
+        """Mark a game's boxscore as scraped"""
+        self.connect().execute("UPDATE boxscores SET status = 'done' WHERE game_id = ?", (game_id,))
+
+    def fail_boxscore(self, game_id, error):
+        """Record a failed boxscore, which is retried by the next crawl unless it is out of attempts"""
+        self.connect().execute(
+            "UPDATE boxscores SET attempts = attempts + 1, last_error = ?, "
+            "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END WHERE game_id = ?",
+            (error, self.max_attempts, game_id))
+
+    def count_remaining(self):
+        """Count the players that still need to be scraped"""
+        return self.connect().execute(
+            "SELECT COUNT(*) FROM players WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+    def reset(self):
+        """Empty the queue"""
+        connection = self.connect()
+        connection.execute('DELETE FROM players')
+        connection.execute('DELETE FROM boxscores')
+        connection.execute('DELETE FROM queue_meta')
+
+
+class ChangeIndex():
+    """Hashes of the records condensed last time, backed by SQLite, for finding what a scrape changed
+
+    The records of the new condense are staged in a temporary table and compared with a join,
+    so a full dataset never has to be held in memory. Nothing is saved until commit is called.
+    """
+
+    def __init__(self, path=CHANGE_INDEX_DB):
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS record_hashes (
+                record_type TEXT NOT NULL,
+                player_id INTEGER NOT NULL,
+                game_id TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (record_type, player_id, game_id)
+            )""")
+        self.connection.execute('BEGIN')
+        self.connection.execute("""
+            CREATE TEMP TABLE new_records (
+                record_type TEXT NOT NULL,
+                player_id INTEGER NOT NULL,
+                game_id TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                record TEXT NOT NULL,
+                PRIMARY KEY (record_type, player_id, game_id)
+            )""")
+
+    def add(self, record_type, record):
+        """Stage a record of the new condense
+
+            Args:
+                - record_type (str): 'profile' or 'game'
+                - record (dict): The normalized record
+
+            Returns:
+                None
+        """
+        encoded = json.dumps(record, sort_keys=True)
+        self.connection.execute('INSERT OR REPLACE INTO new_records VALUES (?, ?, ?, ?, ?)', (
+            record_type, record['player_id'], record.get('game_id') or '',
+            hashlib.sha1(encoded.encode('utf-8')).hexdigest(), encoded))
+
+    def diff(self, record_type):
+        """Compare the staged records of a type with the ones last committed
+
+            Args:
+                - record_type (str): 'profile' or 'game'
 
-HEADERS = {
-    'user-agent': ('Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 '
-                   '(KHTML, like Gecko) Chrome/48.0.2564.109 Safari/537.36')
-}
+            Yields:
+                - change (str): 'added', 'changed' or 'removed'
+                - record (dict): The record, or the player_id and game_id of a removed game
+        """
+        changed = self.connection.execute("""
+            SELECT new.record, old.hash IS NULL FROM new_records new
+            LEFT JOIN record_hashes old ON old.record_type = new.record_type AND old.player_id = new.player_id
+                AND old.game_id = new.game_id
+            WHERE new.record_type = ? AND (old.hash IS NULL OR old.hash != new.hash)
+            ORDER BY new.player_id, new.game_id""", (record_type,))
+        for record, added in changed:
+            yield 'added' if added else 'changed', json.loads(record)
+
+        if record_type == 'game':
+            removed = self.connection.execute("""
+                SELECT old.player_id, old.game_id FROM record_hashes old
+                WHERE old.record_type = 'game'
+                AND old.player_id IN (SELECT player_id FROM new_records WHERE record_type = 'profile')
+                AND NOT EXISTS (SELECT 1 FROM new_records new WHERE new.record_type = 'game'
+                                AND new.player_id = old.player_id AND new.game_id = old.game_id)
+                ORDER BY old.player_id, old.game_id""").fetchall()
+            for player_id, game_id in removed:
+                self.connection.execute(
+                    "DELETE FROM record_hashes WHERE record_type = 'game' AND player_id = ? AND game_id = ?",
+                    (player_id, game_id))
+                yield 'removed', {'player_id': player_id, 'game_id': game_id}
+
+    def commit(self):
+        """Save the hashes of the staged records as the ones to compare the next condense with"""
+        self.connection.execute('INSERT OR REPLACE INTO record_hashes '
+                                'SELECT record_type, player_id, game_id, hash FROM new_records')
+        self.connection.execute('DROP TABLE new_records')
+        self.connection.execute('COMMIT')
+        self.connection.close()
+
+
+StoredPage = collections.namedtuple('StoredPage', ['url', 'content'])
+
+
+class PageStore():
+    """Raw pages of players and boxscores, backed by SQLite, so they can be parsed again without fetching them
+
+    Pages of a player or boxscore that failed to scrape are quarantined with the error, and,
+    when the scraper caches pages, every other page is kept too. Pages are stored compressed,
+    under the site URL they were fetched from.
+    """
+
+    def __init__(self, path=PAGE_STORE_DB):
+        self.path = path
+        self.local = threading.local()
+        connection = self.connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                page_type TEXT NOT NULL,
+                player_id INTEGER,
+                metadata TEXT,
+                content BLOB NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                traceback TEXT,
+                saved_at REAL NOT NULL
+            )""")
+        connection.execute('CREATE INDEX IF NOT EXISTS pages_status ON pages (status, page_type)')
+
+    def connect(self):
+        """Get this thread's connection to the store, since SQLite connections can't be shared"""
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        return self.local.connection
+
+    def save(self, pages, status, error=None):
+        """Save pages, replacing any saved before under the same URLs
 
-PROFILE_DIR = 'profile_data'
-STATS_DIR = 'stats_data'
+            Args:
+                - pages (dict[]): The pages, with the url, page_type, player_id, metadata (the
+                  game of a boxscore) and raw content
+                - status (str): 'quarantined' or 'cached'
+                - error (Exception): The error the pages are quarantined for
 
-class Scraper():
-    """Scraper for pro-football-reference.com to collect NFL player stats"""
+            Returns:
+                None
+        """
+        if not pages:
+            return
+        error_text = None if error is None else repr(error)
+        error_traceback = None if error is None else ''.join(
+            traceback.format_exception(type(error), error, error.__traceback__))
+        now = time.time()
+        self.connect().executemany(
+            'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(page['url'], page['page_type'], page['player_id'],
+              None if page['metadata'] is None else json.dumps(page['metadata']),
+              zlib.compress(page['content']), status, error_text, error_traceback, now) for page in pages])
+
+    def release(self, urls):
+        """Drop quarantined pages that have since scraped cleanly"""
+        if urls:
+            self.connect().execute(
+                "DELETE FROM pages WHERE status = 'quarantined' AND url IN ({})".format(', '.join('?' * len(urls))),
+                urls)
+
+    def load(self, url):
+        """Get a saved page
 
-    def __init__(self, letters_to_scrape=['A'], num_jobs=1, clear_old_data=True, first_player_id=1):
-        """Initialize the scraper to get player stats
+            Returns:
+                - page (StoredPage): The page's URL and raw content
 
-                Args:
-                    - letters_to_scrape (str[]): The site sorts players by the first letter of their
-                      last name. This array tells the scraper which letters to scrape data for.
-                    - num_jobs (int): Number of concurrent jobs the scraper should run. While Python
-                      can't multi-thread, it can manage multiple processes at once, which allows it to
-                      utilize time spent waiting for the server to respond.
-                    - clear_old_data (boolean): Whether or not the data file should be wiped before
-                      starting the scrape.
-                    - first_player_id (int): The first ID for a player (set if you are rerunning to avoid duplicates)
+            Raises:
+                - LookupError: The page isn't in the store
+        """
+        row = self.connect().execute('SELECT content FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            raise LookupError('{} is not in the page store'.format(url))
+        return StoredPage(url, zlib.decompress(row[0]))
 
-                Returns:
-                    None
+    def get_players(self, statuses):
+        """Get the players with a profile page saved with one of the statuses
+
+            Returns:
+                - players (dict[]): The player_id and profile_url of each player, as in the work queue
         """
-        self.letters_to_scrape = [letter.upper() for letter in letters_to_scrape]
-        self.num_jobs = num_jobs
-        self.clear_old_data = clear_old_data
-        self.session = requests.Session()
-        self.start_time = time.time()
-        self.cross_process_player_count = 0
-        self.first_player_id = first_player_id
+        rows = self.connect().execute(
+            "SELECT DISTINCT player_id FROM pages WHERE page_type IN ('profile', 'gamelog') AND status IN ({})"
+            .format(', '.join('?' * len(statuses))), statuses).fetchall()
+        players = []
+        for (player_id,) in rows:
+            profile = self.connect().execute(
+                "SELECT url FROM pages WHERE player_id = ? AND page_type = 'profile'", (player_id,)).fetchone()
+            if profile is not None:
+                players.append({'player_id': player_id, 'profile_url': profile[0]})
+        return players
+
+    def get_boxscore_games(self, statuses):
+        """Get the games whose boxscore page was saved with one of the statuses"""
+        rows = self.connect().execute(
+            "SELECT metadata FROM pages WHERE page_type = 'boxscore' AND status IN ({}) ORDER BY url"
+            .format(', '.join('?' * len(statuses))), statuses).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+RowDiff = collections.namedtuple('RowDiff', ['profile', 'games', 'num_unchanged', 'num_removed', 'profile_row',
+                                             'game_rows'])
+
+
+class RowIndex():
+    """Content hash of every profile and game written out, backed by SQLite, to skip writing them again
+
+    Profiles are keyed on the player's slug and games on the slug and game ID, which stay the same
+    between runs, unlike player IDs handed out by a rebuilt work queue. The index also keeps the
+    player ID each slug was written under, so that discovering players again gives them their old
+    IDs back. It describes what has been written to the output, so it has to be deleted along with
+    the output.
+    """
+
+    def __init__(self, path=ROW_INDEX_DB):
+        self.path = path
+        self.local = threading.local()
+        connection = self.connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                slug TEXT PRIMARY KEY,
+                player_id INTEGER NOT NULL,
+                row_hash TEXT NOT NULL
+            )""")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS games (
+                slug TEXT NOT NULL,
+                game_id TEXT NOT NULL,
+                row_hash TEXT NOT NULL,
+                PRIMARY KEY (slug, game_id)
+            )""")
+
+    def connect(self):
+        """Get this thread's connection to the index, since SQLite connections can't be shared"""
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        return self.local.connection
 
-        if num_jobs > 1:
-            self.multiprocessing = True
-            self.worker_pool = Pool(num_jobs)
+    @staticmethod
+    def row_hash(record):
+        """Hash of everything in a record, player ID included"""
+        return hashlib.md5(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get_player_ids(self):
+        """Map the slug of every player written out to their player ID"""
+        return dict(self.connect().execute('SELECT slug, player_id FROM profiles').fetchall())
+
+    def diff(self, profile, games, slugs):
+        """Compare a player's profile and games, or the lines of a boxscore, with the rows written before
+
+            Args:
+                - profile (dict): The player's profile. None for boxscore lines, which only replace
+                  the rows of their own game.
+                - games (dict[]): Game stats
+                - slugs (dict): Slug of every player ID
+
+            Returns:
+                - row_diff (RowDiff): The profile if it is new or changed, otherwise None; the new
+                  and changed games; how many rows are unchanged, and how many games of the player
+                  were written before but are gone now; and the rows to pass to record once they
+                  have been written
+        """
+        connection = self.connect()
+        profile_row = None
+        num_unchanged = 0
+        if profile is not None:
+            slug = slugs[profile['player_id']]
+            profile_row = (slug, profile['player_id'], self.row_hash(profile))
+            old_profile = connection.execute('SELECT slug, player_id, row_hash FROM profiles WHERE slug = ?',
+                                             (slug,)).fetchone()
+            if old_profile == profile_row:
+                profile, num_unchanged = None, 1
+            old_games = {(slug, game_id): row_hash for game_id, row_hash in connection.execute(
+                'SELECT game_id, row_hash FROM games WHERE slug = ?', (slug,))}
         else:
-            self.multiprocessing = False
+            old_games = {}
+            for game in games:
+                key = (slugs[game['player_id']], game['game_id'])
+                row = connection.execute('SELECT row_hash FROM games WHERE slug = ? AND game_id = ?', key).fetchone()
+                if row is not None:
+                    old_games[key] = row[0]
+
+        changed_games = []
+        game_rows = []
+        for game in games:
+            game_row = (slugs[game['player_id']], game['game_id'], self.row_hash(game))
+            game_rows.append(game_row)
+            if old_games.get(game_row[:2]) == game_row[2]:
+                num_unchanged += 1
+            else:
+                changed_games.append(game)
+        num_removed = len(set(old_games) - set(game_row[:2] for game_row in game_rows))
+        return RowDiff(profile, changed_games, num_unchanged, num_removed, profile_row, game_rows)
+
+    def record(self, row_diff):
+        """Record the rows of a diff as written, replacing the player's earlier games when it had a profile"""
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if row_diff.profile_row is not None:
+                connection.execute('INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)', row_diff.profile_row)
+                connection.execute('DELETE FROM games WHERE slug = ?', (row_diff.profile_row[0],))
+            connection.executemany('INSERT OR REPLACE INTO games VALUES (?, ?, ?)', row_diff.game_rows)
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
 
-    def scrape_site(self):
-        """Pool workers to scrape players by first letter of last name"""
-        if self.clear_old_data:
-            self.clear_data()
-        player_id = self.first_player_id
-        for letter in self.letters_to_scrape:
-            player_profile_urls = self.get_players_for_letter(letter)
-            for player_profile_url in player_profile_urls:
-                player = Player(player_id, player_profile_url, self)
-                try:
-                    player.scrape_profile()
-                    player.scrape_player_stats()
-                except (KeyboardInterrupt, SystemExit):
-                    raise
-                except:
-                    print('There was a problem parsing stats for {}'.format(player_profile_url))
-                    continue
-                self.save_player_profile(player.profile)
-                self.save_player_game_stats(player.game_stats, player.player_id, player.profile['name'])
-                player_id += 1
-        self.condense_data()
+    def reset(self):
+        """Forget every row written"""
+        connection = self.connect()
+        connection.execute('DELETE FROM profiles')
+        connection.execute('DELETE FROM games')
 
-    def condense_data(self):
-        """Condense data into two files, a profile file and a stats file"""
-        print('Condensing Data...')
-        condensed_profile_data = []
-        all_profile_files = glob.glob('{}/*.json'.format(PROFILE_DIR))
-        for file in all_profile_files:
-            with open(file, 'rb') as fin:
-                condensed_profile_data.append(json.load(fin))
-        print('{} player profiles condensed'.format(len(condensed_profile_data)))
-        filename = 'profiles_{}.json'.format(time.time())
-        with open(filename, 'w') as fout:
-            json.dump(condensed_profile_data, fout)
 
-        condensed_game_data = []
-        all_game_files = glob.glob('{}/*.json'.format(STATS_DIR))
-        for file in all_game_files:
-            with open(file, 'rb') as fin:
-                condensed_game_data += json.load(fin)
-        print('{} player seasons condensed'.format(len(condensed_game_data)))
-        filename = 'games_{}.json'.format(time.time())
-        with open(filename, 'w') as fout:
-            json.dump(condensed_game_data, fout)
+class RecordSink():
+    """Destination for the records yielded by Scraper.iter_records"""
+
+    # Whether the sink replaces a player's rows, or a boxscore's, as a whole, so that when rows
+    # already written are skipped, a player or boxscore with any change still gets all of its rows.
+    # Sinks that replace rows one at a time only get the new and changed ones.
+    replaces_whole_players = True
 
-    def save_player_profile(self, profile):
-        """Save a player's profile as JSON
+    def write(self, record_type, record):
+        """Write a record
 
             Args:
-                - profile (dict): Player profile data
+                - record_type (str): 'profile', 'game', or 'team_game' for the team lines of the
+                  boxscore crawl
+                - record (dict): Player profile, game stats or team game stats
 
-            Return:
+            Returns:
                 None
         """
-        filename = '{}/{}_{}.json'.format(PROFILE_DIR, profile['player_id'], profile['name'].replace(' ', '-'))
-        try:
-            os.makedirs(PROFILE_DIR)
-        except OSError:
-            pass
-        with open(filename, 'w') as fout:
-            json.dump(profile, fout)
+        raise NotImplementedError
+
+    def flush(self):
+        """Make everything written so far durable
+
+            Called once all of a player's records have been written and before the player is
+            marked done in the work queue. Writing the same player again, i.e. after a crash
+            between this flush and the queue update, should replace their earlier records.
+        """
+        pass
+
+    def close(self):
+        """Flush anything buffered once the scrape is over"""
+        self.flush()
+
+
+class FileSink(RecordSink):
+    """Save each player's profile, and their game stats, as JSON files for condense_data
 
-    def save_player_game_stats(self, games, player_id, player_name):
-        """Save a list of player games with stats info
+    Game stats written without a profile, i.e. by the boxscore crawl, are saved a file per game,
+    as are the team lines of a game.
+    """
 
+    def __init__(self, output_dir='.'):
+        """
             Args:
-                - games (dict[]): List of game stats
-                - player_id (int): ID of the player the games belong to
-                - player_name (str): Name of the player the game stats belong to
+                - output_dir (str): Directory the profile and stats directories are written to
 
-            Return:
+            Returns:
                 None
         """
-        filename = '{}/{}_{}.json'.format(STATS_DIR, player_id, player_name.replace(' ', '-'))
+        self.profile_dir = os.path.join(output_dir, PROFILE_DIR)
+        self.stats_dir = os.path.join(output_dir, STATS_DIR)
+        self.team_stats_dir = os.path.join(output_dir, TEAM_STATS_DIR)
+        self.profile = None
+        self.games = []
+        self.team_games = []
+
+    def write(self, record_type, record):
+        if record_type == 'profile':
+            self.flush()
+            self.profile = record
+        elif record_type == 'team_game':
+            self.team_games.append(record)
+        else:
+            self.games.append(record)
+
+    def flush(self):
+        """Save the buffered player's profile and games, or the buffered boxscore's lines"""
+        if self.profile is not None:
+            name = '{}_{}'.format(self.profile['player_id'], self.profile['name'].replace(' ', '-'))
+            self.save_json(self.stats_dir, name, self.games)
+            self.save_json(self.profile_dir, name, self.profile)
+        elif self.games:
+            self.save_json(self.stats_dir, 'boxscore_{}'.format(self.games[0]['game_id']), self.games)
+        if self.team_games:
+            self.save_json(self.team_stats_dir, 'boxscore_{}'.format(self.team_games[0]['game_id']), self.team_games)
+        self.profile = None
+        self.games = []
+        self.team_games = []
+
+    @staticmethod
+    def save_json(data_dir, name, data):
+        """Save data as JSON to data_dir/name.json"""
         try:
-            os.makedirs(STATS_DIR)
+            os.makedirs(data_dir)
         except OSError:
             pass
-        with open(filename, 'w') as fout:
-            json.dump(games, fout)
+        with open('{}/{}.json'.format(data_dir, name), 'w') as fout:
+            json.dump(data, fout)
 
-    def get_players_for_letter(self, letter):
-        """Get a list of player links for a letter of the alphabet.
-            Site organizes players by first letter of last name.
 
+class NdjsonSink(RecordSink):
+    """Append records as newline-delimited JSON, a file for profiles, one for games and one for team games"""
+
+    replaces_whole_players = False
+
+    def __init__(self, profile_path='profiles.ndjson', games_path='games.ndjson',
+                 team_games_path='team_games.ndjson'):
+        """
             Args:
-                - letter (str): letter of the alphabet uppercased
+                - profile_path (str): File to append profiles to
+                - games_path (str): File to append game stats to
+                - team_games_path (str): File to append the team stats of the boxscore crawl to
 
             Returns:
-                - player_links (str[]): the URLs to get player profiles
+                None
         """
-        response = self.get_page(PLAYER_LIST_URL.format(letter))
-        soup = BeautifulSoup(response.content, 'html.parser')
+        self.files = {
+            'profile': open(profile_path, 'a'),
+            'game': open(games_path, 'a'),
+            'team_game': open(team_games_path, 'a')
+        }
 
-        players = soup.find('div', {'id': 'div_players'}).find_all('a')
-        return [BASE_URL.format(player['href']) for player in players]
+    def write(self, record_type, record):
+        self.files[record_type].write(json.dumps(record) + '\n')
 
-    def get_page(self, url, retry_count=0):
-        """Use requests to get a page; retry when failures occur
+    def flush(self):
+        for fout in self.files.values():
+            fout.flush()
+            os.fsync(fout.fileno())
 
+    def close(self):
+        self.flush()
+        for fout in self.files.values():
+            fout.close()
+
+
+class SqliteSink(RecordSink):
+    """Write records to profiles, games and team_games tables of a SQLite database, replacing rows scraped before"""
+
+    replaces_whole_players = False
+
+    def __init__(self, path='nfl_stats.sqlite3', batch_size=1000):
+        """
             Args:
-                - url (str): The URL of the page to make a GET request to
-                - retry_count (int): Number of times the URL has already been requests
+                - path (str): SQLite database file
+                - batch_size (int): Number of records inserted per transaction
 
             Returns:
-                - response (obj): The Requests response object
+                None
         """
-        try:
-            return self.session.get(url, headers=HEADERS)
-        except (KeyboardInterrupt, SystemExit):
-            raise
-        except:
-            retry_count += 1
-            if retry_count <= 3:
-                self.session = requests.Session()
-                return self.get_page(url, retry_count)
-            else:
-                raise
+        self.connection = sqlite3.connect(path)
+        self.batch_size = batch_size
+        self.columns = {
+            'profile': list(Player.make_player_profile(None).keys()),
+            'game': list(Player.make_player_game_stats(None, None).keys()),
+            'team_game': list(Boxscore.make_team_game_stats(None).keys())
+        }
+        self.tables = {'profile': 'profiles', 'game': 'games', 'team_game': 'team_games'}
+        self.connection.execute('CREATE TABLE IF NOT EXISTS profiles ({}, PRIMARY KEY (player_id))'.format(
+            ', '.join(self.columns['profile'])))
+        self.connection.execute('CREATE TABLE IF NOT EXISTS games ({}, PRIMARY KEY (player_id, game_id))'.format(
+            ', '.join(self.columns['game'])))
+        self.connection.execute('CREATE TABLE IF NOT EXISTS team_games ({}, PRIMARY KEY (game_id, team))'.format(
+            ', '.join(self.columns['team_game'])))
+        self.pending = {'profile': [], 'game': [], 'team_game': []}
+
+    def write(self, record_type, record):
+        self.pending[record_type].append([record.get(column) for column in self.columns[record_type]])
+        if len(self.pending[record_type]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Insert the rows batched for every table in one transaction"""
+        with self.connection:
+            for record_type, rows in self.pending.items():
+                self.connection.executemany('INSERT OR REPLACE INTO {} VALUES ({})'.format(
+                    self.tables[record_type], ', '.join('?' * len(self.columns[record_type]))), rows)
+        self.pending = {'profile': [], 'game': [], 'team_game': []}
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+class DjangoSink(RecordSink):
+    """Bulk insert records into the nfl_data Profile and Game models
+
+    Django must already be set up, i.e. by running inside a management command or after
+    django.setup() with DJANGO_SETTINGS_MODULE pointing at database.settings. Rows of players
+    already in the database are replaced. Games written without their player's profile, i.e. by
+    the boxscore crawl, only replace the same player's line of the same game. The database has no
+    model for team lines, so they are left out. Every flush bumps the DataVersion, so cached query
+    results are dropped.
+    """
+
+    def __init__(self, batch_size=1000):
+        """
+            Args:
+                - batch_size (int): Most records per bulk_create query, lowered to what the database takes
 
-    def clear_data(self):
-        """Clear the data directories"""
-        try:
-            shutil.rmtree(PROFILE_DIR)
-        except FileNotFoundError:
-            pass
-        try:
-            shutil.rmtree(STATS_DIR)
-        except FileNotFoundError:
-            pass
+            Returns:
+                None
+        """
+        from nfl_data.models import DataVersion, Game, Profile
+        self.models = {'profile': Profile, 'game': Game}
+        self.data_version = DataVersion
+        self.batch_size = batch_size
+        self.pending = {'profile': [], 'game': []}
+
+    def write(self, record_type, record):
+        if record_type == 'team_game':
+            return
+        if record_type == 'game':
+            record = dict(record)
+            record['player_id_id'] = record.pop('player_id')
+        self.pending[record_type].append(self.models[record_type](**record))
+
+    def flush(self):
+        """Replace the buffered players' rows in one transaction"""
+        from django.db import connection, transaction
+        from django.db.models import Q
+        profiles, games = self.pending['profile'], self.pending['game']
+        if not profiles and not games:
+            return
+        Profile, Game = self.models['profile'], self.models['game']
+        player_ids = set(profile.player_id for profile in profiles)
+        lone_games = Q(pk__in=[])
+        for game in games:
+            if game.player_id_id not in player_ids:
+                lone_games |= Q(player_id=game.player_id_id, game_id=game.game_id)
+        with transaction.atomic():
+            Game.objects.filter(Q(player_id__in=player_ids) | lone_games).delete()
+            # Games reference profiles, so profiles go in first
+            Profile.objects.filter(player_id__in=player_ids).delete()
+            for model, objs in ((Profile, profiles), (Game, games)):
+                # An explicit batch size overrides Django's own limit, i.e. SQLite's 500 rows per query
+                batch_size = min(self.batch_size, connection.ops.bulk_batch_size(model._meta.concrete_fields, objs))
+                model.objects.bulk_create(objs, batch_size=max(batch_size, 1))
+            self.data_version.bump()
+        self.pending = {'profile': [], 'game': []}
+
+
+class MemorySink(RecordSink):
+    """Keep records in lists, i.e. for tests or small scrapes"""
+
+    replaces_whole_players = False
+
+    def __init__(self):
+        self.profiles = []
+        self.games = []
+        self.team_games = []
+
+    def write(self, record_type, record):
+        if record_type == 'profile':
+            self.profiles.append(record)
+        elif record_type == 'team_game':
+            self.team_games.append(record)
+        else:
+            self.games.append(record)
 
 
 class Player():
@@ -202,7 +2607,23 @@ class Player():
         self.player_id = player_id
         self.profile_url = profile_url
         self.scraper = scraper
-        self.profile = {
+        self.profile = self.make_player_profile(player_id)
+        self.seasons_with_stats = []
+        self.game_stats = []
+        # Raw pages fetched for the player, for the page store
+        self.pages = []
+
+    @staticmethod
+    def make_player_profile(player_id):
+        """Factory method to return the profile fields to collect for a player
+
+            Args:
+                - player_id (int): unique Id for the player
+
+            Returns:
+                - profile (dict): dictionary with profile fields initialized
+        """
+        return {
             'player_id': player_id,
             'name': None,
             'position': None,
@@ -221,45 +2642,65 @@ class Player():
             'current_salary': None,
             'hof_induction_year': None
         }
-        self.seasons_with_stats = []
-        self.game_stats = []
 
     def scrape_profile(self):
         """Scrape profile info for player"""
         response = self.scraper.get_page(self.profile_url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        self.pages.append({'url': self.profile_url, 'page_type': 'profile', 'player_id': self.player_id,
+                           'metadata': None, 'content': response.content})
+        self.profile, self.seasons_with_stats = self.scraper.submit_parse(
+            'profile', Player.parse_profile, response.content, self.player_id, self.scraper.html_parser).result()
+        print('scaping {}'.format(self.profile['name']))
+
+    @staticmethod
+    def parse_profile(html, player_id, html_parser='html.parser'):
+        """Parse a player's profile page
+
+            This runs in a parse worker process, so it only works on the raw page and
+            returns plain data.
+
+            Args:
+                - html (bytes): Raw profile page
+                - player_id (int): Unique ID for player
+                - html_parser (str): Parser for BeautifulSoup to use
+
+            Returns:
+                - profile (dict): Player profile data
+                - seasons (dict[]): Seasons that have stats for the player
+        """
+        soup = BeautifulSoup(html, html_parser)
+        profile = Player.make_player_profile(player_id)
 
         profile_section = soup.find('div', {'id': 'meta'})
-        self.profile['name'] = profile_section.find('h1', {'itemprop': 'name'}).contents[0]
-        print('scaping {}'.format(self.profile['name']))
+        profile['name'] = profile_section.find('h1', {'itemprop': 'name'}).contents[0]
 
         profile_attributes = profile_section.find_all('p')
         current_attribute = 1
         num_attributes = len(profile_attributes)
 
-        self.profile['position'] = profile_attributes[current_attribute].contents[2].split('\n')[0].split(' ')[1]
+        profile['position'] = profile_attributes[current_attribute].contents[2].split('\n')[0].split(' ')[1]
         current_attribute += 1
 
         height = profile_attributes[current_attribute].find('span', {'itemprop': 'height'})
         if height is not None:
-            self.profile['height'] = height.contents[0]
+            profile['height'] = height.contents[0]
         weight = profile_attributes[current_attribute].find('span', {'itemprop': 'weight'})
         if weight is not None:
-            self.profile['weight'] = weight.contents[0].split('lb')[0]
+            profile['weight'] = weight.contents[0].split('lb')[0]
         if height is not None or weight is not None:
             current_attribute += 1
 
         affiliation_section = profile_section.find('span', {'itemprop': 'affiliation'})
         if affiliation_section is not None:
-            self.profile['current_team'] = affiliation_section.contents[0].contents[0]
+            profile['current_team'] = affiliation_section.contents[0].contents[0]
             current_attribute += 1
 
         birth_date = profile_attributes[current_attribute].find('span', {'itemprop': 'birthDate'})
         if birth_date is not None:
-            self.profile['birth_date'] = birth_date['data-birth']
+            profile['birth_date'] = birth_date['data-birth']
         birth_place_section = profile_attributes[current_attribute].find('span', {'itemprop': 'birthPlace'}).contents
         try:
-            self.profile['birth_place'] = re.split('\xa0', birth_place_section[0])[1] + ' ' + birth_place_section[1].contents[0]
+            profile['birth_place'] = re.split('\xa0', birth_place_section[0])[1] + ' ' + birth_place_section[1].contents[0]
         except IndexError:
             pass
         if birth_date is not None or len(birth_place_section) > 0:
@@ -267,61 +2708,99 @@ class Player():
 
         death_section = profile_section.find('span', {'itemprop': 'deathDate'})
         if death_section is not None:
-            self.profile['death_date'] = death_section['data-death']
+            profile['death_date'] = death_section['data-death']
             current_attribute += 1
 
         if profile_attributes[current_attribute].contents[0].contents[0] == 'College':
-            self.profile['college'] = profile_attributes[current_attribute].contents[2].contents[0]
+            profile['college'] = profile_attributes[current_attribute].contents[2].contents[0]
             current_attribute += 1
 
         # Skip weighted career AV
         current_attribute += 1
 
         if ((current_attribute + 1) <= num_attributes) and profile_attributes[current_attribute].contents[0].contents[0] == 'High School':
-            self.profile['high_school'] = profile_attributes[current_attribute].contents[2].contents[0] + ', ' + profile_attributes[current_attribute].contents[4].contents[0]
+            profile['high_school'] = profile_attributes[current_attribute].contents[2].contents[0] + ', ' + profile_attributes[current_attribute].contents[4].contents[0]
             current_attribute += 1
 
         if ((current_attribute + 1) <= num_attributes) and profile_attributes[current_attribute].contents[0].contents[0] == 'Draft':
-            self.profile['draft_team'] = profile_attributes[current_attribute].contents[2].contents[0]
+            profile['draft_team'] = profile_attributes[current_attribute].contents[2].contents[0]
             draft_info = profile_attributes[current_attribute].contents[3].split(' ')
-            self.profile['draft_round'] = re.findall(r'\d+', draft_info[3])[0]
-            self.profile['draft_position'] = re.findall(r'\d+', draft_info[5])[0]
-            self.profile['draft_year'] = re.findall(r'\d+', profile_attributes[current_attribute].contents[4].contents[0])[0]
+            profile['draft_round'] = re.findall(r'\d+', draft_info[3])[0]
+            profile['draft_position'] = re.findall(r'\d+', draft_info[5])[0]
+            profile['draft_year'] = re.findall(r'\d+', profile_attributes[current_attribute].contents[4].contents[0])[0]
             current_attribute += 1
 
         if ((current_attribute + 1) <= num_attributes) and profile_attributes[current_attribute].contents[0].contents[0] == 'Current cap hit':
             profile_attributes[current_attribute].contents
-            self.profile['current_salary'] = profile_attributes[current_attribute].contents[2].contents[0]
+            profile['current_salary'] = profile_attributes[current_attribute].contents[2].contents[0]
             current_attribute += 1
 
         if ((current_attribute + 1) <= num_attributes) and profile_attributes[current_attribute].contents[0].contents[0] == 'Hall of fame':
-            self.profile['hof_induction_year'] = profile_attributes[current_attribute].contents[2].contents[0]
+            profile['hof_induction_year'] = profile_attributes[current_attribute].contents[2].contents[0]
             current_attribute += 1
 
-        self.seasons_with_stats = self.get_seasons_with_stats(soup)
+        seasons = [Player.detach_strings(season) for season in Player.get_seasons_with_stats(soup)]
+        return Player.normalize_profile(Player.detach_strings(profile)), seasons
 
     def scrape_player_stats(self):
         """Scrape the stats for all available games for a player"""
+        for season_game_stats in self.iter_season_stats():
+            self.game_stats += season_game_stats
+
+    def iter_season_stats(self):
+        """Scrape the player's stats one season at a time
+
+            Every season page is fetched before waiting on any of them to be parsed, so
+            the parse workers work through earlier seasons while later ones download.
+
+            Yields:
+                - game_stats (dict[]): The player's stats for each game of a season
+        """
+        parsed_seasons = []
         for season in self.seasons_with_stats:
-            if season['year'] == 'Career' or season['year'] == 'Postseason':
+            if not self.scraper.season_in_range(season['year']):
                 continue
-            self.scrape_season_gamelog(season['gamelog_url'], season['year'])
+            parsed_seasons.append(self.scrape_season_gamelog(season['gamelog_url'], season['year']))
+        for parsed_season in parsed_seasons:
+            yield parsed_season.result()
 
     def scrape_season_gamelog(self, gamelog_url, year):
-        """Scrape player stats for a given year
+        """Fetch a season's gamelog and hand it off to be parsed
 
             Args:
                 - gamelog_url (str): URL to the stats for a given year
                 - year (int): The year the stats are for
 
             Returns:
-                - stats (dict): All of the player's stats for that year
+                - parsed_season (Future): Resolves to the player's game stats for that year
         """
         response = self.scraper.get_page(gamelog_url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        self.pages.append({'url': gamelog_url, 'page_type': 'gamelog', 'player_id': self.player_id,
+                           'metadata': None, 'content': response.content})
+        return self.scraper.submit_parse('gamelog', Player.parse_season_gamelog, response.content,
+                                         self.player_id, year, self.scraper.html_parser)
+
+    @staticmethod
+    def parse_season_gamelog(html, player_id, year, html_parser='html.parser'):
+        """Parse a player's gamelog page for a given year
+
+            This runs in a parse worker process, so it only works on the raw page and
+            returns plain data.
+
+            Args:
+                - html (bytes): Raw gamelog page
+                - player_id (int): Unique ID for player
+                - year (int): The year the stats are for
+                - html_parser (str): Parser for BeautifulSoup to use
+
+            Returns:
+                - game_stats (dict[]): The player's stats for each game that year
+        """
+        soup = BeautifulSoup(html, html_parser)
+        game_stats = []
         regular_season_table = soup.find('table', {'id': 'stats'})
         if regular_season_table is None:
-            return False
+            return game_stats
         games = regular_season_table.find('tbody').find_all('tr')
 
         playoff_table = soup.find('table', {'id': 'stats_playoffs'})
@@ -329,7 +2808,7 @@ class Player():
             games += playoff_table.find('tbody').find_all('tr')
 
         for game in games:
-            stats = self.make_player_game_stats(self.player_id, year)
+            stats = Player.make_player_game_stats(player_id, year)
             stats['game_id'] = game.find('td', {'data-stat': 'game_date'}).find('a', href=True)['href'].replace('/boxscores/', '').replace('.htm', '')
             stats['date'] = game.find('td', {'data-stat': 'game_date'}).contents[0].contents[0]
             stats['game_number'] = game.find('td', {'data-stat': 'game_num'}).contents[0]
@@ -347,151 +2826,28 @@ class Player():
             stats['player_team_score'] = result.split(' ')[1].split('-')[0]
             stats['opponent_score'] = result.split(' ')[1].split('-')[1]
 
-            # Collect passing stats
-            pass_attempts = game.find('td', {'data-stat': 'pass_cmp'})
-            if pass_attempts is not None and len(pass_attempts) > 0:
-                stats['passing_attempts'] = int(pass_attempts.contents[0])
-
-            pass_completions = game.find('td', {'data-stat': 'pass_att'})
-            if pass_completions is not None and len(pass_completions) > 0:
-                stats['passing_completions'] = int(pass_completions.contents[0])
-
-            pass_yards = game.find('td', {'data-stat': 'pass_yds'})
-            if pass_yards is not None and len(pass_yards) > 0:
-                stats['passing_yards'] = int(pass_yards.contents[0])
-
-            pass_touchdowns = game.find('td', {'data-stat': 'pass_td'})
-            if pass_touchdowns is not None and len(pass_touchdowns) > 0:
-                stats['passing_touchdowns'] = int(pass_touchdowns.contents[0])
-
-            pass_interceptions = game.find('td', {'data-stat': 'pass_int'})
-            if pass_interceptions is not None and len(pass_interceptions) > 0:
-                stats['passing_interceptions'] = int(pass_interceptions.contents[0])
-
-            pass_rating = game.find('td', {'data-stat': 'pass_rating'})
-            if pass_rating is not None and len(pass_rating) > 0:
-                stats['passing_rating'] = float(pass_rating.contents[0])
-
-            pass_sacks = game.find('td', {'data-stat': 'pass_sacked'})
-            if pass_sacks is not None and len(pass_sacks) > 0:
-                stats['passing_sacks'] = int(pass_sacks.contents[0])
-
-            pass_sacks_yards_lost = game.find('td', {'data-stat': 'pass_sacked_yds'})
-            if pass_sacks_yards_lost is not None and len(pass_sacks_yards_lost) > 0:
-                stats['passing_sacks_yards_lost'] = int(pass_sacks_yards_lost.contents[0])
-
-            # Collect rushing stats
-            rushing_attempts = game.find('td', {'data-stat': 'rush_att'})
-            if rushing_attempts is not None and len(rushing_attempts) > 0:
-                stats['rushing_attempts'] = int(rushing_attempts.contents[0])
-
-            rushing_yards = game.find('td', {'data-stat': 'rush_yds'})
-            if rushing_yards is not None and len(rushing_yards) > 0:
-                stats['rushing_yards'] = int(rushing_yards.contents[0])
-
-            rushing_touchdowns = game.find('td', {'data-stat': 'rush_td'})
-            if rushing_touchdowns is not None and len(rushing_touchdowns) > 0:
-                stats['rushing_touchdowns'] = int(rushing_touchdowns.contents[0])
-
-            # Collect receiving stats
-            receiving_targets = game.find('td', {'data-stat': 'targets'})
-            if receiving_targets is not None and len(receiving_targets) > 0:
-                stats['receiving_targets'] = int(receiving_targets.contents[0])
-
-            receiving_receptions = game.find('td', {'data-stat': 'rec'})
-            if receiving_receptions is not None and len(receiving_receptions) > 0:
-                stats['receiving_receptions'] = int(receiving_receptions.contents[0])
-
-            receiving_yards = game.find('td', {'data-stat': 'rec_yds'})
-            if receiving_yards is not None and len(receiving_yards) > 0:
-                stats['receiving_yards'] = int(receiving_yards.contents[0])
-
-            receiving_touchdowns = game.find('td', {'data-stat': 'rec_td'})
-            if receiving_touchdowns is not None and len(receiving_touchdowns) > 0:
-                stats['receiving_touchdowns'] = int(receiving_touchdowns.contents[0])
+            Player.read_game_stats(game, stats)
+            game_stats.append(Player.normalize_game_stats(Player.detach_strings(stats)))
 
-            # Collect kick return stats
-            kick_return_attempts = game.find('td', {'data-stat': 'kick_ret'})
-            if kick_return_attempts is not None and len(kick_return_attempts) > 0:
-                stats['kick_return_attempts'] = int(kick_return_attempts.contents[0])
+        return game_stats
 
-            kick_return_yards = game.find('td', {'data-stat': 'kick_ret_yds'})
-            if kick_return_yards is not None and len(kick_return_yards) > 0:
-                stats['kick_return_yards'] = int(kick_return_yards.contents[0])
-
-            kick_return_touchdowns = game.find('td', {'data-stat': 'kick_ret_td'})
-            if kick_return_touchdowns is not None and len(kick_return_touchdowns) > 0:
-                stats['kick_return_touchdowns'] = int(kick_return_touchdowns.contents[0])
-
-            # Collect punt return stats
-            punt_return_attempts = game.find('td', {'data-stat': 'punt_ret'})
-            if punt_return_attempts is not None and len(punt_return_attempts) > 0:
-                stats['punt_return_attempts'] = int(punt_return_attempts.contents[0])
-
-            punt_return_yards = game.find('td', {'data-stat': 'punt_ret_yds'})
-            if punt_return_yards is not None and len(punt_return_yards) > 0:
-                stats['punt_return_yards'] = int(punt_return_yards.contents[0])
-
-            punt_return_touchdowns = game.find('td', {'data-stat': 'punt_ret_td'})
-            if punt_return_touchdowns is not None and len(punt_return_touchdowns) > 0:
-                stats['punt_return_touchdowns'] = int(punt_return_touchdowns.contents[0])
-
-            # Collect defensive stats
-            defense_sacks = game.find('td', {'data-stat': 'sacks'})
-            if defense_sacks is not None and len(defense_sacks) > 0:
-                stats['defense_sacks'] = float(defense_sacks.contents[0])
-
-            defense_tackles = game.find('td', {'data-stat': 'tackles_solo'})
-            if defense_tackles is not None and len(defense_tackles) > 0:
-                stats['defense_tackles'] = int(defense_tackles.contents[0])
-
-            defense_tackle_assists = game.find('td', {'data-stat': 'tackles_assists'})
-            if defense_tackle_assists is not None and len(defense_tackle_assists) > 0:
-                stats['defense_tackle_assists'] = int(defense_tackle_assists.contents[0])
-
-            defense_interceptions = game.find('td', {'data-stat': 'def_int'})
-            if defense_interceptions is not None and len(defense_interceptions) > 0:
-                stats['defense_interceptions'] = int(defense_interceptions.contents[0])
-
-            defense_interception_yards = game.find('td', {'data-stat': 'def_int_yds'})
-            if defense_interception_yards is not None and len(defense_interception_yards) > 0:
-                stats['defense_interception_yards'] = int(defense_interception_yards.contents[0])
-
-            defense_safeties = game.find('td', {'data-stat': 'safety_md'})
-            if defense_safeties is not None and len(defense_safeties) > 0:
-                stats['defense_safeties'] = int(defense_safeties.contents[0])
-
-            # Collect kicking stats
-            point_after_attemps = game.find('td', {'data-stat': 'xpm'})
-            if point_after_attemps is not None and len(point_after_attemps) > 0:
-                stats['point_after_attemps'] = int(point_after_attemps.contents[0])
-
-            point_after_makes = game.find('td', {'data-stat': 'xpa'})
-            if point_after_makes is not None and len(point_after_makes) > 0:
-                stats['point_after_makes'] = int(point_after_makes.contents[0])
-
-            field_goal_attempts = game.find('td', {'data-stat': 'fga'})
-            if field_goal_attempts is not None and len(field_goal_attempts) > 0:
-                stats['field_goal_attempts'] = int(field_goal_attempts.contents[0])
-
-            field_goal_makes = game.find('td', {'data-stat': 'fgm'})
-            if field_goal_makes is not None and len(field_goal_makes) > 0:
-                stats['field_goal_makes'] = int(field_goal_makes.contents[0])
-
-            # Collect punting stats
-            punting_attempts = game.find('td', {'data-stat': 'punt'})
-            if punting_attempts is not None and len(punting_attempts) > 0:
-                stats['punting_attempts'] = int(punting_attempts.contents[0])
+    @staticmethod
+    def read_game_stats(row, stats):
+        """Read the stat cells of a gamelog or boxscore row into a player's game stats
 
-            punting_yards = game.find('td', {'data-stat': 'punt_yds'})
-            if punting_yards is not None and len(punting_yards) > 0:
-                stats['punting_yards'] = int(punting_yards.contents[0])
+            Stats the row has no cell for, or an empty one, are left as they are.
 
-            punting_blocked = game.find('td', {'data-stat': 'punt_blocked'})
-            if punting_blocked is not None and len(punting_blocked) > 0:
-                stats['punting_blocked'] = int(punting_blocked.contents[0])
+            Args:
+                - row (obj): BeautifulSoup tr of the player's stats for the game
+                - stats (dict): Game stats from make_player_game_stats to fill in
 
-            self.game_stats.append(stats)
+            Returns:
+                None
+        """
+        for field, data_stat, stat_type in GAME_STAT_COLUMNS:
+            cell = row.find('td', {'data-stat': data_stat})
+            if cell is not None and len(cell) > 0:
+                stats[field] = stat_type(cell.contents[0])
 
     @staticmethod
     def make_player_game_stats(player_id, year):
@@ -563,7 +2919,71 @@ class Player():
             'punting_blocked': 0
         }
 
-    def get_seasons_with_stats(self, profile_soup):
+    @staticmethod
+    def detach_strings(record):
+        """Copy a record, turning BeautifulSoup strings into plain strings
+
+            BeautifulSoup strings keep a reference to the whole parsed page, which makes
+            records expensive to hold on to and to send back from a parse worker.
+
+            Args:
+                - record (dict): Scraped record
+
+            Returns:
+                - record (dict): The same record with only plain values
+        """
+        return {key: str(value) if isinstance(value, str) else value for key, value in record.items()}
+
+    @staticmethod
+    def normalize_profile(profile):
+        """Turn the strings scraped for a profile into typed values
+
+            Height becomes inches, the draft fields, salary and Hall of Fame year become ints and
+            dates become YYYY-MM-DD. Values that are already typed are kept, so records saved
+            before normalization can be run through it too.
+
+            Args:
+                - profile (dict): Player profile data
+
+            Returns:
+                - profile (dict): A copy of the profile with typed values
+        """
+        profile = dict(profile)
+        profile['height'] = height_in_inches(profile['height'])
+        for field in ('weight', 'draft_round', 'draft_position', 'draft_year', 'current_salary'):
+            profile[field] = to_int(profile[field])
+        hof_induction_year = re.search(r'\d{4}', str(profile['hof_induction_year'] or ''))
+        profile['hof_induction_year'] = None if hof_induction_year is None else int(hof_induction_year.group(0))
+        profile['birth_date'] = to_iso_date(profile['birth_date'])
+        profile['death_date'] = to_iso_date(profile['death_date'])
+        return profile
+
+    @staticmethod
+    def normalize_game_stats(stats):
+        """Turn the strings scraped for a game into typed values
+
+            The year, game number and scores become ints, the date becomes YYYY-MM-DD and the age
+            becomes the player's age in days on the day of the game. Values that are already typed
+            are kept.
+
+            Args:
+                - stats (dict): The player's stats for a game
+
+            Returns:
+                - stats (dict): A copy of the stats with typed values
+        """
+        stats = dict(stats)
+        for field in ('year', 'game_number', 'player_team_score', 'opponent_score'):
+            stats[field] = to_int(stats[field])
+        stats['date'] = to_iso_date(stats['date'])
+        if stats['date'] is None and stats['game_id']:
+            # Game IDs start with the date, i.e. 201709070nwe
+            stats['date'] = to_iso_date(stats['game_id'][:8], '%Y%m%d')
+        stats['age'] = age_in_days(stats['age'], stats['date'])
+        return stats
+
+    @staticmethod
+    def get_seasons_with_stats(profile_soup):
         """Scrape a list of seasons that has stats for the player
 
             Args:
@@ -583,8 +3003,269 @@ class Player():
         return seasons
 
 
+# The lines parsed from a boxscore: the slug and stats of every player, and the stats of both teams
+BoxscoreLines = collections.namedtuple('BoxscoreLines', ['players', 'teams'])
+
+
+class Boxscore():
+    """Parsers for season schedules and game boxscores, used by the boxscore crawl"""
+
+    @staticmethod
+    def parse_schedule(html, year, html_parser='html.parser'):
+        """Parse a season's schedule page into the games that have a boxscore
+
+            Games that haven't been played yet have no boxscore and are left out.
+
+            Args:
+                - html (bytes): Raw schedule page
+                - year (int): The season
+                - html_parser (str): Parser for BeautifulSoup to use
+
+            Returns:
+                - games (dict[]): The game_id, year and boxscore URL of each game, whether it was at a
+                  neutral site, and the number of the game in each team's season, by the team's
+                  code in the site's URLs
+        """
+        soup = BeautifulSoup(html, html_parser)
+        games = []
+        schedule_table = soup.find('table', {'id': 'games'})
+        if schedule_table is None:
+            return games
+        games_played = collections.Counter()
+        for row in schedule_table.find('tbody').find_all('tr'):
+            boxscore_cell = row.find('td', {'data-stat': 'boxscore_word'})
+            boxscore_link = None if boxscore_cell is None else boxscore_cell.find('a', href=True)
+            if boxscore_link is None or '/boxscores/' not in boxscore_link['href']:
+                continue
+            game_numbers = {}
+            for data_stat in ('winner', 'loser'):
+                team_code = Boxscore.team_code(row.find('td', {'data-stat': data_stat}))
+                games_played[team_code] += 1
+                game_numbers[team_code] = games_played[team_code]
+            location = row.find('td', {'data-stat': 'game_location'})
+            games.append({
+                'game_id': boxscore_link['href'].replace('/boxscores/', '').replace('.htm', ''),
+                'year': year,
+                'boxscore_url': BASE_URL.format(boxscore_link['href']),
+                'neutral': location is not None and location.get_text().strip() == 'N',
+                'game_numbers': game_numbers
+            })
+        return games
+
+    @staticmethod
+    def parse_boxscore(html, game, html_parser='html.parser'):
+        """Parse a boxscore into a stat line for every player and both teams in the game
+
+            Most of the page's tables are inside HTML comments, which are stripped before the
+            page is parsed so it only has to be parsed once.
+
+            Args:
+                - html (bytes): Raw boxscore page
+                - game (dict): The game, from parse_schedule
+                - html_parser (str): Parser for BeautifulSoup to use
+
+            Returns:
+                - lines (BoxscoreLines): The slug and stats in the make_player_game_stats schema,
+                  without a player_id, of every player in the game, and the stats in the
+                  make_team_game_stats schema of the visiting team and then the home team. The
+                  team lines are left out of a boxscore without a team stats table.
+        """
+        soup = BeautifulSoup(html.replace(b'<!--', b'').replace(b'-->', b''), html_parser)
+        scorebox_teams = soup.find('div', {'class': 'scorebox'}).find_all('strong')
+        team_codes = [Boxscore.team_code(team) for team in scorebox_teams[:2]]
+        scores = [score.get_text().strip() for score in soup.find('div', {'class': 'scorebox'}).find_all(
+            'div', {'class': 'score'})]
+
+        player_rows = collections.OrderedDict()
+        for table_id in BOXSCORE_PLAYER_TABLES:
+            table = soup.find('table', {'id': table_id})
+            if table is None:
+                continue
+            for row in table.find('tbody').find_all('tr'):
+                player = row.find('th', {'data-stat': 'player'})
+                if player is None or not player.get('data-append-csv'):
+                    continue
+                player_rows.setdefault(player['data-append-csv'], []).append(row)
+
+        # The visiting team is listed first, both in the scorebox and in the team stats
+        team_stats = soup.find('table', {'id': 'team_stats'})
+        if team_stats is not None:
+            teams = [team_stats.find('th', {'data-stat': data_stat}).get_text().strip()
+                     for data_stat in ('vis_stat', 'home_stat')]
+        else:
+            teams = []
+            for rows in player_rows.values():
+                team = rows[0].find('td', {'data-stat': 'team'}).get_text().strip()
+                if team not in teams:
+                    teams.append(team)
+
+        def describe_game(stats, side):
+            """Fill in the fields a player's line and their team's line share"""
+            stats['game_id'] = game['game_id']
+            stats['date'] = '{}-{}-{}'.format(game['game_id'][:4], game['game_id'][4:6], game['game_id'][6:8])
+            stats['game_number'] = game['game_numbers'].get(team_codes[side])
+            stats['team'] = teams[side]
+            if game['neutral']:
+                stats['game_location'] = 'N'
+            else:
+                stats['game_location'] = 'H' if side == 1 else 'A'
+            stats['opponent'] = teams[1 - side]
+            stats['game_won'] = int(scores[side]) > int(scores[1 - side])
+
+        player_lines = []
+        for slug, rows in player_rows.items():
+            stats = Player.make_player_game_stats(None, game['year'])
+            side = teams.index(rows[0].find('td', {'data-stat': 'team'}).get_text().strip())
+            describe_game(stats, side)
+            stats['player_team_score'] = scores[side]
+            stats['opponent_score'] = scores[1 - side]
+            for row in rows:
+                Player.read_game_stats(row, stats)
+            player_lines.append((slug, Player.normalize_game_stats(Player.detach_strings(stats))))
+
+        team_lines = []
+        if team_stats is not None:
+            for side, data_stat in enumerate(('vis_stat', 'home_stat')):
+                stats = Boxscore.make_team_game_stats(game['year'])
+                describe_game(stats, side)
+                stats['team_score'] = int(scores[side])
+                stats['opponent_score'] = int(scores[1 - side])
+                Boxscore.read_team_stats(team_stats, data_stat, stats)
+                team_lines.append(stats)
+        return BoxscoreLines(player_lines, team_lines)
+
+    @staticmethod
+    def make_team_game_stats(year):
+        """Factory method to return the stats to collect for a team in a game
+
+            Args:
+                - year (int): The season
+
+            Returns:
+                - team_game_stats (dict): dictionary with team stats initialized
+        """
+        team_game_stats = {
+            'year': year,
+            'game_id': None,
+            'date': None,
+            'game_number': None,
+            'team': None,
+            'game_location': None,
+            'opponent': None,
+            'game_won': None,
+            'team_score': 0,
+            'opponent_score': 0
+        }
+        for label, fields in TEAM_STAT_ROWS:
+            for field in fields:
+                team_game_stats[field] = None
+        return team_game_stats
+
+    @staticmethod
+    def read_team_stats(team_stats, data_stat, stats):
+        """Read one team's column of a boxscore's team stats table into the team's game stats
+
+            Rows with several numbers are split on the dashes between them, so a negative number
+            keeps its sign, i.e. '18--3-0' is 18 rushes for -3 yards and no touchdowns. Time of
+            possession becomes seconds. Rows that are missing, or don't have the expected number of
+            values, are left as None.
+
+            Args:
+                - team_stats (obj): BeautifulSoup table of the team stats
+                - data_stat (str): 'vis_stat' or 'home_stat'
+                - stats (dict): Team game stats from make_team_game_stats to fill in
+
+            Returns:
+                None
+        """
+        values = {}
+        for row in team_stats.find('tbody').find_all('tr'):
+            label, cell = row.find('th'), row.find('td', {'data-stat': data_stat})
+            if label is not None and cell is not None:
+                values[label.get_text().strip()] = cell.get_text().strip()
+        for label, fields in TEAM_STAT_ROWS:
+            value = values.get(label)
+            if not value:
+                continue
+            if label == 'Time of Possession':
+                minutes, seconds = (to_int(number) for number in (value.split(':') + ['0'])[:2])
+                numbers = [None if minutes is None or seconds is None else minutes * 60 + seconds]
+            else:
+                numbers = [to_int(number) for number in re.split(r'(?<=\d)-', value)]
+            if len(numbers) == len(fields) and None not in numbers:
+                stats.update(zip(fields, numbers))
+
+    @staticmethod
+    def team_code(element):
+        """Get the site's code for a team, i.e. 'nwe', from the link to its season page inside element"""
+        team_link = element.find('a', href=True)
+        return team_link['href'].split('/')[2]
+
+
 if __name__ == '__main__':
-    letters_to_scrape = list(string.ascii_uppercase)
-    nfl_scraper = Scraper(letters_to_scrape=letters_to_scrape, num_jobs=10, clear_old_data=False)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', nargs='?', default='scrape',
+                        choices=['scrape', 'discover', 'worker', 'condense', 'reparse'],
+                        help=('scrape runs the whole crawl in this process. For a distributed crawl, run discover '
+                              'once, a worker per process, then condense. To use several hosts, copy the queue '
+                              'to each host and give each host its own --shard. reparse parses the quarantined '
+                              'pages again, without fetching anything, and condenses.'))
+    parser.add_argument('--queue', default=QUEUE_DB, help='SQLite work queue shared by the workers on this host')
+    parser.add_argument('--worker-id', default=None,
+                        help=('Name of this worker, which is also the name of its output segment. Must be unique; '
+                              'reuse it when restarting a worker so it takes back its leases. '
+                              'Defaults to the host name plus the shard.'))
+    parser.add_argument('--shard', type=int, default=None, help='Only scrape players in this shard')
+    parser.add_argument('--num-shards', type=int, default=1, help='Number of shards the queue is split into')
+    parser.add_argument('--crawl', default='players', choices=['players', 'boxscores'],
+                        help=('players fetches every player\'s gamelog for each season they played. boxscores '
+                              'fetches each game of the seasons from --min-year to --max-year once instead.'))
+    parser.add_argument('--min-year', type=int, default=None, help='Only scrape seasons from this year on')
+    parser.add_argument('--max-year', type=int, default=None, help='Only scrape seasons up to this year')
+    parser.add_argument('--page-store', default=PAGE_STORE_DB,
+                        help='SQLite file the pages of players and boxscores that fail to parse are kept in')
+    parser.add_argument('--cache-pages', action='store_true',
+                        help='Keep every page in the page store, not just the ones that fail to parse')
+    parser.add_argument('--all', action='store_true', help='With reparse, reparse the cached pages too')
+    parser.add_argument('--max-jobs', type=int, default=MAX_JOBS,
+                        help=('Most requests in flight at once. How many are is tuned from how the site responds, '
+                              'and logged with the metrics.'))
+    parser.add_argument('--fixed-jobs', action='store_true',
+                        help='Always keep --max-jobs requests in flight instead of tuning how many')
+    parser.add_argument('--dedup', action='store_true',
+                        help=('Skip rows that haven\'t changed since they were written, using the row index, and '
+                              'give players discovered again the IDs they were written under'))
+    parser.add_argument('--row-index', default=ROW_INDEX_DB,
+                        help=('SQLite index of the rows written out, with --dedup. Shared by the workers on this '
+                              'host, like the queue. Delete it along with the output.'))
+    args = parser.parse_args()
+    if args.crawl == 'boxscores' and (args.min_year is None or args.max_year is None):
+        parser.error('--crawl boxscores needs --min-year and --max-year')
+    if args.crawl == 'boxscores' and args.mode == 'worker':
+        parser.error('The boxscore crawl runs in a single process, use the scrape mode')
+    if args.worker_id is None:
+        args.worker_id = socket.gethostname()
+        if args.shard is not None:
+            args.worker_id += '-shard{}'.format(args.shard)
 
-    nfl_scraper.scrape_site()
+    letters_to_scrape = list(string.ascii_uppercase)
+    output_dir = '.'
+    if args.mode == 'worker':
+        output_dir = os.path.join(SEGMENTS_DIR, args.worker_id)
+    nfl_scraper = Scraper(letters_to_scrape=letters_to_scrape, num_jobs=args.max_jobs, clear_old_data=False,
+                          min_year=args.min_year, max_year=args.max_year, parse_jobs=os.cpu_count(),
+                          queue_path=args.queue, output_dir=output_dir, crawl_mode=args.crawl,
+                          page_store_path=args.page_store, cache_pages=args.cache_pages,
+                          adaptive_concurrency=not args.fixed_jobs, dedup=args.dedup,
+                          row_index_path=args.row_index)
+
+    if args.mode == 'scrape':
+        nfl_scraper.scrape_site()
+    elif args.mode == 'discover':
+        nfl_scraper.discover_players()
+    elif args.mode == 'worker':
+        nfl_scraper.run_worker(args.worker_id, args.shard, args.num_shards)
+    elif args.mode == 'reparse':
+        nfl_scraper.reparse(args.all)
+    else:
+        nfl_scraper.condense_data()
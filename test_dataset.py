@@ -0,0 +1,144 @@
+"""Tests for dataset.py
+
+The files read are written with the scraper's own writers, so the readers are tested against
+the format the scraper actually writes.
+
+Usage:
+    python -m unittest test_dataset
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark'))
+import bench_scraper
+import dataset
+
+scraper_module = bench_scraper.load_scraper_module()
+
+
+def make_games(player_ids=(1, 2, 3), years=(2015, 2016)):
+    """Games sorted by player and date, as the condense step writes them"""
+    games = []
+    for player_id in player_ids:
+        for year in years:
+            for week in range(1, 3):
+                games.append({'player_id': player_id, 'year': year, 'game_id': '{}09{:02d}0nwe'.format(year, week),
+                              'date': '{}-09-{:02d}'.format(year, week), 'team': 'NWE' if player_id % 2 else 'KAN',
+                              'passing_yards': 100 * player_id + week, 'passing_rating': 80.5 + week})
+    return games
+
+
+class CondensedFileTest(unittest.TestCase):
+
+    def setUp(self):
+        scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, scratch_dir)
+        self.path = os.path.join(scratch_dir, 'games_1.json')
+        self.games = make_games()
+        scraper_module.write_indexed_json(self.path, self.games)
+        self.condensed_file = dataset.CondensedFile(self.path)
+
+    def test_file_is_still_a_json_array(self):
+        with open(self.path, 'r') as fin:
+            self.assertEqual(json.load(fin), self.games)
+
+    def test_index_has_every_player_in_file_order(self):
+        self.assertTrue(self.condensed_file.indexed)
+        self.assertEqual(self.condensed_file.player_ids(), [1, 2, 3])
+        self.assertEqual(len(self.condensed_file), len(self.games))
+
+    def test_read_player_reads_only_their_records(self):
+        self.assertEqual(self.condensed_file.read_player(2), [game for game in self.games if game['player_id'] == 2])
+        self.assertEqual(self.condensed_file.read_player('3'), self.games[-4:])
+        self.assertEqual(self.condensed_file.read_player(4), [])
+
+    def test_read_players_filters_within_the_players(self):
+        records = list(self.condensed_file.read_players([3, 1, 4], {'year': {2016}}))
+        self.assertEqual(records, [game for game in self.games if game['player_id'] in (1, 3) and game['year'] == 2016])
+
+    def test_scan_streams_every_record(self):
+        self.assertEqual(list(self.condensed_file), self.games)
+        self.assertEqual(list(self.condensed_file.scan({'team': {'KAN'}})),
+                         [game for game in self.games if game['team'] == 'KAN'])
+
+    def test_files_condensed_before_the_index_are_still_read(self):
+        os.remove(self.path + '.idx')
+        with open(self.path, 'w') as fout:
+            json.dump(self.games, fout)
+        condensed_file = dataset.CondensedFile(self.path)
+        self.assertFalse(condensed_file.indexed)
+        self.assertEqual(list(condensed_file.scan({'player_id': {2}})), self.games[4:8])
+
+
+class DatasetTest(unittest.TestCase):
+    """Runs every test against the condensed files, the SQLite sink's database and the NDJSON sink's files"""
+
+    def setUp(self):
+        scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, scratch_dir)
+        self.games = make_games()
+        self.profiles = [{'player_id': player_id, 'name': 'Player {}'.format(player_id),
+                          'position': 'QB' if player_id == 2 else 'WR', 'weight': 200 + player_id}
+                         for player_id in (1, 2, 3)]
+        self.directories = {}
+        for source in ('condensed', 'sqlite', 'ndjson'):
+            directory = self.directories[source] = os.path.join(scratch_dir, source)
+            os.mkdir(directory)
+            if source == 'condensed':
+                scraper_module.write_indexed_json(os.path.join(directory, 'profiles_1.json'), self.profiles)
+                scraper_module.write_indexed_json(os.path.join(directory, 'games_1.json'), self.games)
+                continue
+            if source == 'sqlite':
+                sink = scraper_module.SqliteSink(os.path.join(directory, dataset.SQLITE_DB))
+            else:
+                sink = scraper_module.NdjsonSink(*[os.path.join(directory, name) for name in (
+                    'profiles.ndjson', 'games.ndjson', 'team_games.ndjson')])
+            for profile in self.profiles:
+                sink.write('profile', profile)
+            for game in self.games:
+                sink.write('game', game)
+            sink.close()
+
+    def assertReads(self, make_dataset, expected, columns=('player_id', 'game_id')):
+        """Check the dataset make_dataset builds has the expected records in every source"""
+        expected = [{column: record[column] for column in columns} for record in expected]
+        for source, directory in self.directories.items():
+            with self.subTest(source=source):
+                records = list(make_dataset(dataset.Dataset.open(directory)).select(*columns))
+                self.assertEqual(sorted(records, key=lambda record: sorted(record.items())),
+                                 sorted(expected, key=lambda record: sorted(record.items())))
+
+    def test_open_finds_every_source(self):
+        self.assertIsInstance(dataset.Dataset.open(self.directories['condensed']).source, dataset.CondensedSource)
+        self.assertIsInstance(dataset.Dataset.open(self.directories['sqlite']).source, dataset.SqliteSource)
+        self.assertIsInstance(dataset.Dataset.open(self.directories['ndjson']).source, dataset.NdjsonSource)
+
+    def test_filters_are_combined(self):
+        self.assertReads(lambda games: games.filter(player_id=[1, 3], year=2016).filter(team='NWE'),
+                         [game for game in self.games if game['player_id'] in (1, 3) and game['year'] == 2016])
+        self.assertReads(lambda games: games.filter(player_id=1).filter(player_id=2), [])
+
+    def test_games_are_filtered_on_their_players_position(self):
+        self.assertReads(lambda games: games.filter(position='QB', year=range(2016, 2018)),
+                         [game for game in self.games if game['player_id'] == 2 and game['year'] == 2016])
+
+    def test_values_equal_to_a_stored_value_match(self):
+        # 2015.0 is written differently from the 2015 in the files, but equals it
+        self.assertReads(lambda games: games.filter(year=2015.0),
+                         [game for game in self.games if game['year'] == 2015])
+        self.assertReads(lambda games: games.filter(player_id={2, 3.0}),
+                         [game for game in self.games if game['player_id'] in (2, 3)])
+
+    def test_profiles_are_filtered_and_selected(self):
+        self.assertReads(lambda profiles: dataset.Dataset(profiles.source, 'profiles').filter(position='WR'),
+                         [self.profiles[0], self.profiles[2]], ('player_id', 'weight'))
+        with self.assertRaises(ValueError):
+            dataset.Dataset.open(self.directories['condensed'], 'profiles').filter(year=2015)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,465 @@
+"""Tests for scrape-nfl-stats.py
+
+The scraper is run against benchmark/bench_scraper.py's MockSite, a local stand-in for the
+site, so nothing is requested from pro-football-reference.com.
+
+Usage:
+    python -m unittest test_scrape_nfl_stats
+"""
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark'))
+import bench_scraper
+
+scraper_module = bench_scraper.load_scraper_module()
+
+
+def list_player(slug, letter='A', first_year=2000, last_year=2005, positions=('QB',)):
+    """A player as get_players_for_letter lists them"""
+    return {'slug': slug, 'name': slug, 'letter': letter, 'profile_url': 'http://site/players/{}/{}.htm'.format(
+        letter, slug), 'positions': list(positions), 'first_year': first_year, 'last_year': last_year}
+
+
+class ScratchDirTestCase(unittest.TestCase):
+    """Runs every test in a scratch directory of its own"""
+
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.scratch_dir)
+
+    def path(self, name):
+        return os.path.join(self.scratch_dir, name)
+
+    def read_condensed(self, name):
+        """Read the records of the condensed profiles or games file in the scratch directory"""
+        paths = glob.glob(self.path('{}_*.json'.format(name)))
+        self.assertEqual(len(paths), 1)
+        with open(paths[0], 'r') as fin:
+            return json.load(fin)
+
+
+class MockSiteTestCase(ScratchDirTestCase):
+    """Runs every test against a MockSite of its own, from the scratch directory"""
+
+    site_options = {}
+
+    def setUp(self):
+        super().setUp()
+        self.site = bench_scraper.MockSite(**dict({'players_per_letter': 2}, **self.site_options))
+        self.site_url = self.site.start()
+        self.addCleanup(self.site.stop)
+        working_dir = os.getcwd()
+        os.chdir(self.scratch_dir)
+        self.addCleanup(os.chdir, working_dir)
+
+    def make_scraper(self, **options):
+        """A scraper of the mock site that keeps everything in the scratch directory"""
+        options = dict({'letters_to_scrape': ['A', 'B'], 'num_jobs': 2, 'site_url': self.site_url,
+                        'output_dir': self.scratch_dir, 'metrics_path': None, 'metrics_interval': 3600,
+                        'retry_backoff': 0.01, 'queue_path': self.path('queue.sqlite3'),
+                        'page_store_path': self.path('pages.sqlite3')}, **options)
+        return scraper_module.Scraper(**options)
+
+
+class NormalizeTest(unittest.TestCase):
+
+    def test_strings_become_numbers(self):
+        self.assertEqual(scraper_module.to_int('$15,000,000'), 15000000)
+        self.assertEqual(scraper_module.to_int('-3'), -3)
+        self.assertIsNone(scraper_module.to_int('N/A'))
+        self.assertEqual(scraper_module.height_in_inches('6-5'), 77)
+        self.assertIsNone(scraper_module.height_in_inches('tall'))
+        self.assertEqual(scraper_module.to_iso_date('March 5, 1930'), '1930-03-05')
+
+    def test_age_is_days_on_the_day_of_the_game(self):
+        self.assertEqual(scraper_module.age_in_days('22-0', '2000-08-03'), 8036)
+        self.assertEqual(scraper_module.age_in_days('22-1', '2000-08-04'), 8037)
+        self.assertIsNone(scraper_module.age_in_days('22-1', None))
+
+    def test_records_are_typed_and_typed_records_are_kept(self):
+        profile = scraper_module.Player.make_player_profile(1)
+        profile.update({'height': '6-4', 'weight': '225lb', 'birth_date': 'August 3, 1977', 'draft_year': '2000',
+                        'current_salary': '$14,000,000', 'hof_induction_year': 'Inducted in 2021'})
+        profile = scraper_module.Player.normalize_profile(profile)
+        self.assertEqual((profile['height'], profile['weight'], profile['birth_date'], profile['draft_year'],
+                          profile['current_salary'], profile['hof_induction_year']),
+                         (76, 225, '1977-08-03', 2000, 14000000, 2021))
+        self.assertEqual(scraper_module.Player.normalize_profile(profile), profile)
+
+        game = scraper_module.Player.make_player_game_stats(1, '2017')
+        game.update({'game_id': '201709070nwe', 'age': '40-35', 'player_team_score': '27', 'opponent_score': '42'})
+        game = scraper_module.Player.normalize_game_stats(game)
+        self.assertEqual((game['year'], game['date'], game['age'], game['player_team_score']),
+                         (2017, '2017-09-07', 14645, 27))
+        self.assertEqual(scraper_module.Player.normalize_game_stats(game), game)
+
+
+class WorkQueueTest(ScratchDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.work_queue = scraper_module.WorkQueue(self.path('queue.sqlite3'), lease_seconds=60, max_attempts=2)
+        self.work_queue.enqueue([list_player('AaaaAa00'), list_player('BbbbBb00', 'B'), list_player('CcccCc00', 'C')],
+                                first_player_id=10)
+
+    def test_enqueue_gives_ids_in_order_and_skips_players_already_queued(self):
+        self.work_queue.enqueue([list_player('AaaaAa00'), list_player('DdddDd00', 'D')])
+        self.assertEqual(self.work_queue.get_player_ids(),
+                         {'AaaaAa00': 10, 'BbbbBb00': 11, 'CcccCc00': 12, 'DdddDd00': 13})
+
+    def test_claim_leases_each_player_once(self):
+        claimed = [self.work_queue.claim('worker') for _ in range(4)]
+        self.assertEqual([item['player_id'] for item in claimed[:3]], [10, 11, 12])
+        self.assertEqual(claimed[0]['slug'], 'AaaaAa00')
+        self.assertIsNone(claimed[3])
+        self.assertEqual(self.work_queue.count_remaining(), 3)
+
+    def test_complete_needs_the_lease(self):
+        item = self.work_queue.claim('worker')
+        self.assertFalse(self.work_queue.complete(item['player_id'], 'other worker'))
+        self.assertTrue(self.work_queue.complete(item['player_id'], 'worker'))
+        self.assertEqual(self.work_queue.count_remaining(), 2)
+
+    def test_expired_lease_is_claimed_again(self):
+        item = self.work_queue.claim('worker')
+        self.work_queue.connect().execute('UPDATE players SET lease_expires = ? WHERE player_id = ?',
+                                          (time.time() - 1, item['player_id']))
+        self.assertEqual(self.work_queue.claim('other worker')['player_id'], item['player_id'])
+        self.assertFalse(self.work_queue.complete(item['player_id'], 'worker'))
+        self.assertTrue(self.work_queue.complete(item['player_id'], 'other worker'))
+
+    def test_renew_keeps_the_lease(self):
+        item = self.work_queue.claim('worker')
+        self.work_queue.connect().execute('UPDATE players SET lease_expires = ? WHERE player_id = ?',
+                                          (time.time() + 1, item['player_id']))
+        self.work_queue.renew('worker')
+        lease_expires = self.work_queue.connect().execute(
+            'SELECT lease_expires FROM players WHERE player_id = ?', (item['player_id'],)).fetchone()[0]
+        self.assertGreater(lease_expires, time.time() + 30)
+
+    def test_failed_players_are_retried_until_out_of_attempts(self):
+        for attempt in range(2):
+            item = self.work_queue.claim('worker')
+            self.assertEqual(item['player_id'], 10)
+            self.work_queue.fail(item['player_id'], 'worker', 'error {}'.format(attempt))
+        self.assertEqual(self.work_queue.claim('worker')['player_id'], 11)
+        status, last_error = self.work_queue.connect().execute(
+            'SELECT status, last_error FROM players WHERE player_id = 10').fetchone()
+        self.assertEqual((status, last_error), ('failed', 'error 1'))
+
+    def test_release_puts_back_a_workers_leases(self):
+        self.work_queue.claim('worker')
+        self.work_queue.claim('other worker')
+        self.work_queue.release('worker')
+        self.assertEqual(self.work_queue.claim('third worker')['player_id'], 10)
+
+    def test_shards_split_the_queue(self):
+        self.work_queue.enqueue([list_player('{}Play{:02d}'.format(letter, number), letter)
+                                 for letter in 'ABC' for number in range(20)])
+        claimed = []
+        for shard in range(3):
+            while True:
+                item = self.work_queue.claim('worker', shard, 3)
+                if item is None:
+                    break
+                self.assertEqual(self.work_queue.shard_for(item['slug']) % 3, shard)
+                claimed.append(item['player_id'])
+        self.assertEqual(sorted(claimed), sorted(self.work_queue.get_player_ids().values()))
+
+    def test_worker_id_is_taken_until_unregistered(self):
+        self.work_queue.register_worker('worker')
+        self.work_queue.connect().execute("UPDATE workers SET host = 'other host' WHERE worker_id = 'worker'")
+        with self.assertRaises(ValueError):
+            self.work_queue.register_worker('worker')
+        self.work_queue.connect().execute("DELETE FROM workers")
+        self.work_queue.register_worker('worker')
+        self.work_queue.unregister_worker('worker')
+        self.work_queue.register_worker('worker')
+
+
+class RowIndexTest(ScratchDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.row_index = scraper_module.RowIndex(self.path('row_index.sqlite3'))
+        self.slugs = {7: 'AaaaAa00'}
+        self.profile = {'player_id': 7, 'name': 'A'}
+        self.games = [{'player_id': 7, 'game_id': 'g{}'.format(number), 'yards': number} for number in range(3)]
+        self.row_index.record(self.row_index.diff(self.profile, self.games, self.slugs))
+
+    def test_unchanged_rows_are_left_out(self):
+        row_diff = self.row_index.diff(self.profile, self.games, self.slugs)
+        self.assertEqual((row_diff.profile, row_diff.games, row_diff.num_unchanged, row_diff.num_removed),
+                         (None, [], 4, 0))
+        self.assertEqual(self.row_index.get_player_ids(), {'AaaaAa00': 7})
+
+    def test_changed_and_removed_games_are_found(self):
+        games = [dict(self.games[0], yards=10), self.games[1]]
+        row_diff = self.row_index.diff(self.profile, games, self.slugs)
+        self.assertEqual((row_diff.profile, row_diff.games, row_diff.num_unchanged, row_diff.num_removed),
+                         (None, [games[0]], 2, 1))
+        self.row_index.record(row_diff)
+        self.assertEqual(self.row_index.diff(self.profile, games, self.slugs).num_unchanged, 3)
+
+    def test_boxscore_lines_are_compared_with_their_own_games(self):
+        line = dict(self.games[2], yards=20)
+        row_diff = self.row_index.diff(None, [line, self.games[1]], self.slugs)
+        self.assertEqual((row_diff.games, row_diff.num_unchanged, row_diff.num_removed), ([line], 1, 0))
+
+
+class ChangeIndexTest(ScratchDirTestCase):
+
+    def condense(self, profiles, games):
+        """Stage a condense's records and get its changes, as write_changes does"""
+        change_index = scraper_module.ChangeIndex(self.path('change_index.sqlite3'))
+        for profile in profiles:
+            change_index.add('profile', profile)
+        for game in games:
+            change_index.add('game', game)
+        changes = [(change, record_type, record) for record_type in ('profile', 'game')
+                   for change, record in change_index.diff(record_type)]
+        change_index.commit()
+        return changes
+
+    def test_changes_since_the_last_condense(self):
+        profiles = [{'player_id': 1, 'name': 'A'}, {'player_id': 2, 'name': 'B'}]
+        games = [{'player_id': 1, 'game_id': 'g1', 'yards': 10}, {'player_id': 1, 'game_id': 'g2', 'yards': 20},
+                 {'player_id': 2, 'game_id': 'g1', 'yards': 30}]
+        self.assertEqual([change for change, _, _ in self.condense(profiles, games)], ['added'] * 5)
+        self.assertEqual(self.condense(profiles, games), [])
+
+        games = [{'player_id': 1, 'game_id': 'g1', 'yards': 15}, {'player_id': 1, 'game_id': 'g3', 'yards': 5},
+                 {'player_id': 2, 'game_id': 'g1', 'yards': 30}]
+        self.assertEqual(self.condense(profiles, games), [
+            ('changed', 'game', games[0]), ('added', 'game', games[1]),
+            ('removed', 'game', {'player_id': 1, 'game_id': 'g2'})])
+
+    def test_games_are_only_removed_for_players_condensed_again(self):
+        self.condense([{'player_id': 1}, {'player_id': 2}],
+                      [{'player_id': 1, 'game_id': 'g1'}, {'player_id': 2, 'game_id': 'g1'}])
+        self.assertEqual(self.condense([{'player_id': 1}], []),
+                         [('removed', 'game', {'player_id': 1, 'game_id': 'g1'})])
+
+
+class ScrapeSiteTest(MockSiteTestCase):
+
+    def test_scrape_condenses_every_player(self):
+        scraper = self.make_scraper(metrics_path='metrics')
+        scraper.scrape_site()
+        profiles = self.read_condensed('profiles')
+        games = self.read_condensed('games')
+        self.assertEqual([profile['player_id'] for profile in profiles], list(range(1, 5)))
+        self.assertEqual(profiles[0]['name'], 'Tom Brady')
+        # Each of the 8 seasons in the mock profile has 16 games
+        self.assertEqual(len(games), 4 * 8 * 16)
+        self.assertEqual(set(game['player_id'] for game in games), set(range(1, 5)))
+        self.assertEqual(scraper.work_queue.count_remaining(), 0)
+
+        with open(self.path('metrics.json'), 'r') as fin:
+            metrics = json.load(fin)
+        # A player list per letter, and a profile and 8 gamelogs per player
+        self.assertEqual(metrics['fetches']['player_list']['count'], 2)
+        self.assertEqual(metrics['fetches']['profile']['count'], 4)
+        self.assertEqual(metrics['fetches']['gamelog']['count'], 4 * 8)
+        self.assertEqual(metrics['parses']['gamelog']['rows'], 4 * 8 * 16)
+        self.assertEqual(metrics['errors'], [])
+        self.assertTrue(os.path.exists(self.path('metrics.prom')))
+
+    def test_condensed_files_go_to_the_output_dir(self):
+        output_dir = self.path('output')
+        self.make_scraper(output_dir=output_dir).scrape_site()
+        for name in ('profiles', 'games', 'changes'):
+            self.assertEqual(len(glob.glob(os.path.join(output_dir, '{}_*'.format(name)))),
+                             1 if name == 'changes' else 2)
+            self.assertEqual(glob.glob(self.path('{}_*'.format(name))), [])
+        with open(glob.glob(os.path.join(output_dir, 'changes_*.ndjson'))[0], 'r') as fin:
+            self.assertEqual(len(fin.readlines()), 4 + 4 * 8 * 16)
+
+    def test_parse_processes_give_the_same_records(self):
+        self.make_scraper(parse_jobs=0).scrape_site()
+        profiles, games = self.read_condensed('profiles'), self.read_condensed('games')
+        for path in glob.glob(self.path('*_*.json')):
+            os.remove(path)
+        scraper = self.make_scraper(parse_jobs=2)
+        scraper.scrape_site()
+        self.assertIsNone(scraper.parse_pool)
+        self.assertEqual(self.read_condensed('profiles'), profiles)
+        self.assertEqual(self.read_condensed('games'), games)
+
+
+class DedupTest(MockSiteTestCase):
+
+    def test_scraping_again_writes_nothing_unchanged(self):
+        output_dir = self.path('output')
+        self.make_scraper(dedup=True, output_dir=output_dir).crawl([scraper_module.MemorySink()])
+        self.assertTrue(os.path.exists(os.path.join(output_dir, scraper_module.ROW_INDEX_DB)))
+        self.assertFalse(os.path.exists(self.path(scraper_module.ROW_INDEX_DB)))
+
+        # A new queue gives the players their IDs again, from the row index
+        sink = RecordingSink()
+        scraper = self.make_scraper(dedup=True, output_dir=output_dir, clear_old_data=False,
+                                    queue_path=self.path('new_queue.sqlite3'))
+        scraper.crawl([sink])
+        self.assertEqual(sink.records, [])
+        self.assertEqual(sorted(scraper.work_queue.get_player_ids().values()), [1, 2, 3, 4])
+
+    def test_dedup_is_off_by_default(self):
+        scraper = self.make_scraper()
+        self.assertIsNone(scraper.row_index)
+        scraper.crawl([scraper_module.MemorySink()])
+        sink = scraper_module.MemorySink()
+        self.make_scraper(clear_old_data=False, queue_path=self.path('new_queue.sqlite3')).crawl([sink])
+        self.assertEqual(len(sink.profiles), 4)
+
+
+class IterRecordsTest(MockSiteTestCase):
+
+    site_options = {'latency': 0.05}
+
+    def wait_for_leases(self, work_queue):
+        """Wait for the fetching threads left behind by a closed iter_records to give up their players"""
+        for _ in range(200):
+            if not work_queue.connect().execute("SELECT COUNT(*) FROM players WHERE status = 'leased'").fetchone()[0]:
+                return
+            time.sleep(0.05)
+        self.fail('Players are still leased')
+
+    def test_profiles_come_before_their_games(self):
+        scraper = self.make_scraper()
+        scraper.discover_players()
+        records = list(scraper.iter_records())
+        player_ids = []
+        for record_type, record in records:
+            if record_type == 'profile':
+                player_ids.append(record['player_id'])
+            else:
+                self.assertEqual(record['player_id'], player_ids[-1])
+        self.assertEqual(sorted(player_ids), [1, 2, 3, 4])
+        self.assertEqual(len(records), 4 + 4 * 8 * 16)
+
+    def test_players_left_when_the_caller_stops_are_not_failed(self):
+        scraper = self.make_scraper(parse_jobs=1)
+        scraper.discover_players()
+        records = scraper.iter_records()
+        self.assertEqual(next(records)[0], 'profile')
+        records.close()
+        self.wait_for_leases(scraper.work_queue)
+        rows = scraper.work_queue.connect().execute('SELECT status, last_error FROM players').fetchall()
+        self.assertEqual([tuple(row) for row in rows if row['status'] != 'done'],
+                         [('pending', None)] * (4 - sum(row['status'] == 'done' for row in rows)))
+        self.assertEqual(scraper.metrics.snapshot()['errors'], [])
+
+
+class FlakySiteTest(MockSiteTestCase):
+
+    site_options = {'error_rate': 0.2, 'throttle_rate': 0.1, 'retry_after': 0, 'seed': 1}
+
+    def test_failed_and_throttled_requests_are_retried(self):
+        scraper = self.make_scraper(max_retries=10)
+        scraper.scrape_site()
+        self.assertEqual(len(self.read_condensed('profiles')), 4)
+        self.assertEqual(len(self.read_condensed('games')), 4 * 8 * 16)
+        metrics = scraper.metrics.snapshot()
+        retries = sum(fetch['retries'] for fetch in metrics['fetches'].values())
+        http_errors = {error['type']: error['count'] for error in metrics['errors'] if error['stage'] == 'fetch'}
+        self.assertGreater(http_errors['HTTP 500'], 0)
+        self.assertGreater(http_errors['HTTP 429'], 0)
+        self.assertEqual(retries, sum(http_errors.values()))
+
+
+class RecordingSink(scraper_module.MemorySink):
+    """A MemorySink that also keeps the order the records were written in"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def write(self, record_type, record):
+        super().write(record_type, record)
+        self.records.append((record_type, record))
+
+
+class BoxscoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.site = bench_scraper.MockSite(players_per_letter=2)
+        self.games = scraper_module.Boxscore.parse_schedule(self.site.page_for('/years/1955/games.htm').encode(), 1955)
+
+    def test_schedule_has_the_games_with_a_boxscore(self):
+        self.assertEqual([game['game_id'] for game in self.games],
+                         ['195509070nwe', '195509070nor', '195509140nor', '195509140tam'])
+        self.assertEqual(self.games[2]['game_numbers'], {'nwe': 2, 'nor': 2})
+        self.assertEqual([game['neutral'] for game in self.games], [False, False, False, True])
+
+    def test_boxscore_has_a_line_for_every_player_and_team(self):
+        game = self.games[0]
+        players, teams = scraper_module.Boxscore.parse_boxscore(
+            self.site.page_for('/boxscores/{}.htm'.format(game['game_id'])).encode(), game)
+        slug, stats = players[0]
+        self.assertEqual(slug, 'APlay00')
+        self.assertEqual((stats['team'], stats['opponent'], stats['game_location'], stats['game_won']),
+                         ('KAN', 'NWE', 'A', False))
+        self.assertEqual((stats['rushing_attempts'], stats['rushing_yards'], stats['receiving_yards']), (5, 10, 16))
+        visitors, home = teams
+        self.assertEqual((visitors['team'], visitors['team_score'], home['team'], home['game_won']),
+                         ('KAN', 10, 'NWE', True))
+        self.assertEqual((visitors['rushing_attempts'], visitors['rushing_yards'], visitors['rushing_touchdowns']),
+                         (18, -3, 0))
+        self.assertEqual((home['third_down_conversions'], home['third_down_attempts']), (7, 14))
+        self.assertEqual(home['time_of_possession'], 31 * 60 + 24)
+
+
+class BoxscoreCrawlTest(MockSiteTestCase):
+
+    def make_scraper(self, **options):
+        return super().make_scraper(**dict({'crawl_mode': 'boxscores', 'min_year': 1955, 'max_year': 1955},
+                                           **options))
+
+    def test_profiles_are_written_before_any_lines(self):
+        sink = RecordingSink()
+        self.make_scraper().crawl([sink])
+        record_types = [record_type for record_type, record in sink.records]
+        self.assertEqual(record_types[:4], ['profile'] * 4)
+        self.assertNotIn('profile', record_types[4:])
+        self.assertEqual(sorted(profile['player_id'] for profile in sink.profiles), [1, 2, 3, 4])
+        # Only the players of letters A and B have profiles, the others in the boxscores are skipped
+        self.assertEqual(len(sink.games), 8)
+        self.assertEqual(set(game['player_id'] for game in sink.games), {1, 2, 3, 4})
+        self.assertEqual(len(sink.team_games), 2 * 4)
+
+    def test_crawl_condenses_profiles_games_and_team_games(self):
+        scraper = self.make_scraper(metrics_path='metrics')
+        scraper.scrape_site()
+        self.assertEqual([profile['player_id'] for profile in self.read_condensed('profiles')], [1, 2, 3, 4])
+        games = self.read_condensed('games')
+        self.assertEqual(len(games), 8)
+        team_games = self.read_condensed('team_games')
+        self.assertEqual([(team_game['game_id'], team_game['team']) for team_game in team_games[:2]],
+                         [('195509070nor', 'NOR'), ('195509070nor', 'TAM')])
+        self.assertEqual(len(team_games), 2 * 4)
+
+        with open(self.path('metrics.json'), 'r') as fin:
+            metrics = json.load(fin)
+        # Each profile, the schedule and the boxscore of every game played are fetched once
+        self.assertEqual(metrics['fetches']['profile']['count'], 4)
+        self.assertEqual(metrics['fetches']['schedule']['count'], 1)
+        self.assertEqual(metrics['fetches']['boxscore']['count'], 4)
+        self.assertNotIn('gamelog', metrics['fetches'])
+        self.assertEqual(metrics['errors'], [])
+
+    def test_crawl_picks_up_where_it_left_off(self):
+        self.make_scraper().crawl([scraper_module.MemorySink()])
+        sink = RecordingSink()
+        self.make_scraper(clear_old_data=False).crawl([sink])
+        self.assertEqual(sink.records, [])
+
+
+if __name__ == '__main__':
+    unittest.main()